@@ -5,3 +5,12 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.accounts"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from apps.sqlite_tuning import configure_sqlite_connection
+
+        from . import signals  # noqa: F401
+
+        connection_created.connect(configure_sqlite_connection, dispatch_uid="configure_sqlite_connection")
@@ -0,0 +1,61 @@
+# apps/accounts/dashboard_cache.py
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Profile
+
+
+# Events without a course reach every dashboard, so they bump a shared generation instead of per-student keys.
+_GENERATION_KEY = "dashboard:generation"
+_VIEWER_ROLES = (Profile.Role.STUDENT, Profile.Role.PARENT)
+
+
+def _student_payload_key(student_id: int, viewer_role: str) -> str:
+    return f"dashboard:student:{student_id}:{viewer_role}"
+
+
+def _parent_children_key(parent_id: int) -> str:
+    return f"dashboard:parent-children:{parent_id}"
+
+
+def get_student_dashboard_payload(student, *, viewer_role: str, build):
+    """
+    Cached form of build(student, viewer_role=...): one cache read in the steady state.
+    Entries live DASHBOARD_CACHE_TIMEOUT seconds and are dropped earlier by the signals in .signals.
+    """
+    key = _student_payload_key(student.id, viewer_role)
+    cached = cache.get_many([key, _GENERATION_KEY])
+    generation = cached.get(_GENERATION_KEY, 0)
+    entry = cached.get(key)
+    if entry is not None and entry[0] == generation:
+        return entry[1]
+
+    payload = build(student, viewer_role=viewer_role)
+    cache.set(key, (generation, payload), settings.DASHBOARD_CACHE_TIMEOUT)
+    return payload
+
+
+def get_parent_children_links(parent, *, build):
+    key = _parent_children_key(parent.id)
+    links = cache.get(key)
+    if links is None:
+        links = build(parent)
+        cache.set(key, links, settings.DASHBOARD_CACHE_TIMEOUT)
+    return links
+
+
+def invalidate_student_dashboards(student_ids) -> None:
+    cache.delete_many(
+        [_student_payload_key(student_id, role) for student_id in set(student_ids) for role in _VIEWER_ROLES]
+    )
+
+
+def invalidate_parent_children(parent_ids) -> None:
+    cache.delete_many([_parent_children_key(parent_id) for parent_id in set(parent_ids)])
+
+
+def invalidate_all_dashboards() -> None:
+    # A fresh timestamp (not incr) so that an evicted counter can never restart at an old value.
+    cache.set(_GENERATION_KEY, time.time_ns(), timeout=None)
@@ -22,6 +22,17 @@ def validate_library_video_upload(video):
     return video
 
 
+def resolve_library_video_course(teacher, student):
+    """Course a teacher's library video for the student is filed under (None when they share no course)."""
+    return (
+        Course.objects.filter(teacher=teacher, enrollments__student=student)
+        .select_related("course_type")
+        .distinct()
+        .order_by("name", "id")
+        .first()
+    )
+
+
 class LoginForm(AuthenticationForm):
     username = forms.CharField(label="Логин", widget=forms.TextInput(attrs={"autofocus": True}))
     password = forms.CharField(label="Пароль", widget=forms.PasswordInput())
@@ -253,13 +264,7 @@ class LibraryVideoUploadForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.resolved_course = None
         if teacher_user is not None and student is not None:
-            self.resolved_course = (
-                Course.objects.filter(teacher=teacher_user, enrollments__student=student)
-                .select_related("course_type")
-                .distinct()
-                .order_by("name", "id")
-                .first()
-            )
+            self.resolved_course = resolve_library_video_course(teacher_user, student)
         self.fields["title"].required = False
 
     def clean_video(self):
@@ -1,16 +1,29 @@
 from __future__ import annotations
 
 import mimetypes
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
 from pathlib import Path
+from typing import NamedTuple
 
-from django.db.models import Q
+from django.db import connections, transaction
+from django.db.models import Count, F, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
 
 from apps.homework.models import AssignmentTarget
 from apps.lessons.models import LessonReport, LessonStudent
 
-from .models import LibraryVideo
+from .models import LibraryItem, LibraryVideo
 
 
+_FTS_TABLE = "accounts_libraryitem_fts"
+_FTS_AVAILABLE: dict[tuple[str, str], bool] = {}
+_SEARCH_SEPARATOR = "\n"
+_CURSOR_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+LIBRARY_PAGE_SIZE = 50
+
 CATEGORY_SHEET = "Ноты/табы"
 CATEGORY_VIDEO = "Видео"
 CATEGORY_AUDIO = "Аудио"
@@ -78,146 +91,298 @@ def categorize_library_item(raw_name: str, mime_type: str = "") -> str:
     return CATEGORY_DOCUMENT
 
 
-def build_library_items_for_student(student, *, teacher=None) -> list[dict]:
-    items = []
-    seen = set()
-
-    video_qs = (
-        LibraryVideo.objects.filter(student=student)
-        .select_related("course", "teacher", "assignment_target", "assignment_target__assignment")
-        .order_by("-created_at")
+def _library_item(
+    *,
+    student_id,
+    kind,
+    source_id,
+    course,
+    uploader,
+    title,
+    category,
+    source,
+    url,
+    is_external,
+    created_at,
+    date_label,
+    poster_url="",
+    details="",
+):
+    uploaded_by = _display_name(uploader) if uploader else ""
+    return LibraryItem(
+        student_id=student_id,
+        course=course,
+        uploader=uploader,
+        source_kind=kind,
+        source_id=source_id,
+        title=title[:255],
+        category=category,
+        source=source,
+        course_name=course.name,
+        uploaded_by=uploaded_by[:255],
+        url=url[:500],
+        is_external=is_external,
+        created_at=created_at,
+        date_label=date_label,
+        poster_url=poster_url[:500],
+        details=details,
+        search_text=_SEARCH_SEPARATOR.join([title, category, source, course.name, uploaded_by]).lower(),
     )
-    if teacher is not None:
-        video_qs = video_qs.filter(course__teacher=teacher)
 
+
+def _video_details(video: LibraryVideo) -> str:
+    """ "2:15 · 1920×1080 · 34.2 МБ" from the worker's metadata; "" until the video is processed."""
+    parts = []
+    if video.duration_seconds is not None:
+        parts.append(video.duration_label)
+    if video.width and video.height:
+        parts.append(f"{video.width}×{video.height}")
+    if video.file_size:
+        parts.append(f"{video.file_size / (1024 * 1024):.1f} МБ")
+    return " · ".join(parts)
+
+
+def _collect_library_items(student_ids=None) -> list[LibraryItem]:
+    """
+    Library rows for the given students (all students when None): uploaded videos,
+    assignment and lesson attachments and lesson report links, one query per source.
+    """
+    items = []
+
+    video_qs = LibraryVideo.objects.select_related(
+        "course",
+        "teacher",
+        "student",
+        "assignment_target",
+        "assignment_target__assignment",
+    ).exclude(video="")
+    if student_ids is not None:
+        video_qs = video_qs.filter(student_id__in=student_ids)
     for video in video_qs:
         if not video.video:
             continue
-        url = video.video.url
-        dedupe_key = ("library_video", video.id, url)
-        if dedupe_key in seen:
-            continue
-        seen.add(dedupe_key)
         if video.assignment_target_id and video.assignment_target and video.assignment_target.assignment:
             title = video.title.strip() or video.assignment_target.assignment.title
             source = "Домашнее задание / Ответ ученика"
-            uploaded_by = _display_name(video.student)
+            uploader = video.student
         else:
             title = video.title.strip() or Path(video.video.name).name
             source = "Библиотека"
-            uploaded_by = _display_name(video.teacher)
+            uploader = video.teacher
         items.append(
-            {
-                "title": title,
-                "category": CATEGORY_VIDEO,
-                "source": source,
-                "course_name": video.course.name,
-                "uploaded_by": uploaded_by,
-                "created_at": video.created_at,
-                "date_label": video.created_at.strftime("%d.%m.%Y"),
-                "url": url,
-                "is_external": False,
-            }
+            _library_item(
+                student_id=video.student_id,
+                kind=LibraryItem.SourceKind.VIDEO,
+                source_id=video.id,
+                course=video.course,
+                uploader=uploader,
+                title=title,
+                category=CATEGORY_VIDEO,
+                source=source,
+                url=video.video.url,
+                is_external=False,
+                created_at=video.created_at,
+                date_label=video.created_at.strftime("%d.%m.%Y"),
+                poster_url=video.thumbnail.url if video.thumbnail else "",
+                details=_video_details(video),
+            )
         )
 
     assignment_targets = (
-        AssignmentTarget.objects.filter(student=student)
-        .select_related("assignment", "assignment__course", "assignment__created_by")
+        AssignmentTarget.objects.select_related("assignment", "assignment__course", "assignment__created_by")
         .exclude(assignment__attachment="")
-        .order_by("-assignment__created_at")
+        .exclude(assignment__attachment__isnull=True)
     )
-    if teacher is not None:
-        assignment_targets = assignment_targets.filter(assignment__course__teacher=teacher)
-
+    if student_ids is not None:
+        assignment_targets = assignment_targets.filter(student_id__in=student_ids)
     for target in assignment_targets:
         assignment = target.assignment
-        if not assignment.attachment:
-            continue
-        url = assignment.attachment.url
-        dedupe_key = ("assignment", assignment.id, url)
-        if dedupe_key in seen:
-            continue
-        seen.add(dedupe_key)
         raw_name = assignment.attachment.name or assignment.title
         items.append(
-            {
-                "title": assignment.title,
-                "category": categorize_library_item(raw_name),
-                "source": "Домашнее задание",
-                "course_name": assignment.course.name,
-                "uploaded_by": _display_name(assignment.created_by),
-                "created_at": assignment.created_at,
-                "date_label": assignment.created_at.strftime("%d.%m.%Y"),
-                "url": url,
-                "is_external": False,
-            }
+            _library_item(
+                student_id=target.student_id,
+                kind=LibraryItem.SourceKind.ASSIGNMENT,
+                source_id=assignment.id,
+                course=assignment.course,
+                uploader=assignment.created_by,
+                title=assignment.title,
+                category=categorize_library_item(raw_name),
+                source="Домашнее задание",
+                url=assignment.attachment.url,
+                is_external=False,
+                created_at=assignment.created_at,
+                date_label=assignment.created_at.strftime("%d.%m.%Y"),
+            )
         )
 
     lesson_entries = (
-        LessonStudent.objects.filter(student=student)
-        .select_related("lesson", "lesson__course", "lesson__created_by")
+        LessonStudent.objects.select_related("lesson", "lesson__course", "lesson__created_by")
         .exclude(lesson__attachment="")
-        .order_by("-lesson__date", "-lesson_id")
+        .exclude(lesson__attachment__isnull=True)
     )
-    if teacher is not None:
-        lesson_entries = lesson_entries.filter(lesson__course__teacher=teacher)
-
+    if student_ids is not None:
+        lesson_entries = lesson_entries.filter(student_id__in=student_ids)
+    local_tz = timezone.get_current_timezone()
     for entry in lesson_entries:
         lesson = entry.lesson
-        if not lesson.attachment:
-            continue
-        url = lesson.attachment.url
-        dedupe_key = ("lesson", lesson.id, url)
-        if dedupe_key in seen:
-            continue
-        seen.add(dedupe_key)
         raw_name = lesson.attachment.name or lesson.topic
         items.append(
-            {
-                "title": lesson.topic or f"Урок {lesson.date:%d.%m.%Y}",
-                "category": categorize_library_item(raw_name),
-                "source": "Урок",
-                "course_name": lesson.course.name,
-                "uploaded_by": _display_name(lesson.created_by),
-                "created_at": lesson.date,
-                "date_label": lesson.date.strftime("%d.%m.%Y"),
-                "url": url,
-                "is_external": False,
-            }
+            _library_item(
+                student_id=entry.student_id,
+                kind=LibraryItem.SourceKind.LESSON,
+                source_id=lesson.id,
+                course=lesson.course,
+                uploader=lesson.created_by,
+                title=lesson.topic or f"Урок {lesson.date:%d.%m.%Y}",
+                category=categorize_library_item(raw_name),
+                source="Урок",
+                url=lesson.attachment.url,
+                is_external=False,
+                created_at=timezone.make_aware(datetime.combine(lesson.date, time.min), local_tz),
+                date_label=lesson.date.strftime("%d.%m.%Y"),
+            )
         )
 
-    report_qs = (
-        LessonReport.objects.filter(lesson__student_entries__student=student)
-        .filter(Q(student=student) | Q(student__isnull=True))
+    # A report is visible to every student of the lesson when it has no student, otherwise to that student only.
+    report_rows = (
+        LessonReport.objects.annotate(entry_student_id=F("lesson__student_entries__student_id"))
+        .filter(Q(student_id=F("entry_student_id")) | Q(student__isnull=True))
+        .filter(entry_student_id__isnull=False)
         .exclude(media_url="")
         .select_related("lesson", "lesson__course", "lesson__created_by")
-        .distinct()
-        .order_by("-created_at")
     )
-    if teacher is not None:
-        report_qs = report_qs.filter(lesson__course__teacher=teacher)
-
-    for report in report_qs:
+    if student_ids is not None:
+        report_rows = report_rows.filter(entry_student_id__in=student_ids)
+    for report in report_rows:
         url = (report.media_url or "").strip()
         if not url:
             continue
-        dedupe_key = ("report", report.id, url)
-        if dedupe_key in seen:
-            continue
-        seen.add(dedupe_key)
         items.append(
-            {
-                "title": report.lesson.topic or f"Урок {report.lesson.date:%d.%m.%Y}",
-                "category": categorize_library_item(url),
-                "source": "Отчёт урока",
-                "course_name": report.lesson.course.name,
-                "uploaded_by": _display_name(report.lesson.created_by),
-                "created_at": report.created_at,
-                "date_label": report.created_at.strftime("%d.%m.%Y"),
-                "url": url,
-                "is_external": True,
-            }
+            _library_item(
+                student_id=report.entry_student_id,
+                kind=LibraryItem.SourceKind.REPORT,
+                source_id=report.id,
+                course=report.lesson.course,
+                uploader=report.lesson.created_by,
+                title=report.lesson.topic or f"Урок {report.lesson.date:%d.%m.%Y}",
+                category=categorize_library_item(url),
+                source="Отчёт урока",
+                url=url,
+                is_external=True,
+                created_at=report.created_at,
+                date_label=report.created_at.strftime("%d.%m.%Y"),
+            )
         )
-
-    items.sort(key=lambda row: row["created_at"], reverse=True)
     return items
+
+
+def rebuild_library_index(student_ids=None) -> int:
+    """
+    Re-materializes LibraryItem rows for the given students (the whole index when None):
+    one read per source, one delete and one bulk insert. Returns the number of stored rows.
+    """
+    if student_ids is not None:
+        student_ids = set(student_ids)
+        if not student_ids:
+            return 0
+    items = _collect_library_items(student_ids)
+    stale = LibraryItem.objects.all()
+    if student_ids is not None:
+        stale = stale.filter(student_id__in=student_ids)
+    with transaction.atomic():
+        stale.delete()
+        LibraryItem.objects.bulk_create(items, batch_size=500, ignore_conflicts=True)
+    return len(items)
+
+
+class LibraryPage(NamedTuple):
+    items: list[LibraryItem]
+    # Opaque "<created_at µs>.<id>" keys for the ?after= / ?before= links, "" when there is no such page.
+    next_cursor: str
+    previous_cursor: str
+
+
+def _encode_cursor(item: LibraryItem) -> str:
+    return f"{(item.created_at - _CURSOR_EPOCH) // timedelta(microseconds=1)}.{item.id}"
+
+
+def _decode_cursor(cursor: str):
+    try:
+        micros, item_id = cursor.split(".")
+        return _CURSOR_EPOCH + timedelta(microseconds=int(micros)), int(item_id)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def paginate_library_items(items, *, after: str = "", before: str = "", size: int = LIBRARY_PAGE_SIZE) -> LibraryPage:
+    """
+    Keyset pagination over (created_at, id), newest first: every page is one indexed range read
+    of size + 1 rows, however deep the student scrolls. Invalid cursors fall back to the first page.
+    """
+    after_key = _decode_cursor(after) if after else None
+    before_key = _decode_cursor(before) if before and not after_key else None
+
+    if before_key:
+        created_at, item_id = before_key
+        rows = list(
+            items.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=item_id)).order_by(
+                "created_at", "id"
+            )[: size + 1]
+        )
+        has_previous = len(rows) > size
+        rows = rows[:size][::-1]
+        has_next = True
+    else:
+        if after_key:
+            created_at, item_id = after_key
+            items = items.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=item_id))
+        rows = list(items.order_by("-created_at", "-id")[: size + 1])
+        has_next = len(rows) > size
+        rows = rows[:size]
+        has_previous = after_key is not None
+
+    return LibraryPage(
+        items=rows,
+        next_cursor=_encode_cursor(rows[-1]) if rows and has_next else "",
+        previous_cursor=_encode_cursor(rows[0]) if rows and has_previous else "",
+    )
+
+
+def library_items_for_student(student, *, teacher=None):
+    items = LibraryItem.objects.filter(student=student)
+    if teacher is not None:
+        items = items.filter(course__teacher=teacher)
+    return items.order_by("-created_at", "-id")
+
+
+def _has_library_fts(connection) -> bool:
+    key = (connection.alias, str(connection.settings_dict["NAME"]))
+    if key not in _FTS_AVAILABLE:
+        _FTS_AVAILABLE[key] = connection.vendor == "sqlite" and _FTS_TABLE in connection.introspection.table_names()
+    return _FTS_AVAILABLE[key]
+
+
+def search_library_items(items, query: str):
+    """
+    Case-insensitive substring search over title, category, source, course and uploader.
+    SQLite uses the FTS5 trigram index (3+ characters); other backends and shorter
+    queries scan the lowercased search_text.
+    """
+    lowered = (query or "").strip().lower()
+    if not lowered:
+        return items
+    connection = connections[items.db]
+    if len(lowered) >= 3 and _has_library_fts(connection):
+        phrase = '"' + lowered.replace('"', '""') + '"'
+        return items.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {_FTS_TABLE} WHERE {_FTS_TABLE} MATCH %s", [phrase])
+        )
+    return items.filter(search_text__contains=lowered)
+
+
+def library_category_counts(items) -> dict[str, int]:
+    counts = {category: 0 for category in LIBRARY_CATEGORIES}
+    for category, total in items.order_by().values_list("category").annotate(total=Count("id")):
+        if category in counts:
+            counts[category] = total
+    return counts
@@ -0,0 +1,34 @@
+# apps/accounts/management/commands/process_videos.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.accounts.video_processing import enqueue_unprocessed_videos, process_pending_videos
+
+
+class Command(BaseCommand):
+    help = (
+        "Probe uploaded library videos (duration, resolution, size) and render poster thumbnails. "
+        "Run as a worker with --interval."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None, help="Process at most N jobs per pass.")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Poll the queue every N seconds instead of running once (worker mode).",
+        )
+
+    def handle(self, *args, **options):
+        queued = enqueue_unprocessed_videos()
+        if queued:
+            self.stdout.write(f"Queued earlier uploads: {queued}.")
+        while True:
+            processed, failed = process_pending_videos(limit=options["limit"])
+            if processed or failed or options["interval"] <= 0:
+                self.stdout.write(self.style.SUCCESS(f"Videos processed: {processed}, failed: {failed}."))
+            if options["interval"] <= 0:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,12 @@
+# apps/accounts/management/commands/purge_video_uploads.py
+from django.core.management.base import BaseCommand
+
+from apps.accounts.video_uploads import purge_stale_video_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete unfinished chunked video uploads that have not received a chunk for two days."
+
+    def handle(self, *args, **options):
+        count = purge_stale_video_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Stale uploads removed: {count}."))
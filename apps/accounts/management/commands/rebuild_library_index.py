@@ -0,0 +1,15 @@
+# apps/accounts/management/commands/rebuild_library_index.py
+from django.core.management.base import BaseCommand
+
+from apps.accounts.library_service import rebuild_library_index
+
+
+class Command(BaseCommand):
+    help = "Re-materialize the resource library index (LibraryItem) for all or selected students."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--student", type=int, action="append", dest="student_ids", help="Student user id.")
+
+    def handle(self, *args, **options):
+        count = rebuild_library_index(options["student_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Library index rebuilt: {count} items."))
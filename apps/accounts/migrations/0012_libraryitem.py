@@ -0,0 +1,84 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import DatabaseError, migrations, models, transaction
+
+
+FTS_STATEMENTS = [
+    "CREATE VIRTUAL TABLE accounts_libraryitem_fts USING fts5("
+    "search_text, content='accounts_libraryitem', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER accounts_libraryitem_fts_ai AFTER INSERT ON accounts_libraryitem BEGIN "
+    "INSERT INTO accounts_libraryitem_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER accounts_libraryitem_fts_ad AFTER DELETE ON accounts_libraryitem BEGIN "
+    "INSERT INTO accounts_libraryitem_fts(accounts_libraryitem_fts, rowid, search_text) "
+    "VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER accounts_libraryitem_fts_au AFTER UPDATE ON accounts_libraryitem BEGIN "
+    "INSERT INTO accounts_libraryitem_fts(accounts_libraryitem_fts, rowid, search_text) "
+    "VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO accounts_libraryitem_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+]
+
+
+def create_library_fts(apps, schema_editor):
+    # SQLite only, and only when it is built with FTS5 and the trigram tokenizer (3.34+);
+    # otherwise library search falls back to search_text__contains.
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                for statement in FTS_STATEMENTS:
+                    cursor.execute(statement)
+    except DatabaseError:
+        return
+
+
+def drop_library_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for trigger in ("ai", "ad", "au"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS accounts_libraryitem_fts_{trigger}")
+        cursor.execute("DROP TABLE IF EXISTS accounts_libraryitem_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_profile_teacher_mode'),
+        ('school', '0004_schoolstatssnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_kind', models.CharField(choices=[('VIDEO', 'Видео библиотеки'), ('ASSIGNMENT', 'Материалы задания'), ('LESSON', 'Материалы урока'), ('REPORT', 'Отчёт урока')], max_length=16)),
+                ('source_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('category', models.CharField(max_length=32)),
+                ('source', models.CharField(max_length=64)),
+                ('course_name', models.CharField(max_length=200)),
+                ('uploaded_by', models.CharField(max_length=255)),
+                ('url', models.CharField(max_length=500)),
+                ('is_external', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('date_label', models.CharField(max_length=10)),
+                ('search_text', models.TextField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='library_items', to='school.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='library_items', to=settings.AUTH_USER_MODEL)),
+                ('uploader', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-created_at', '-id'),
+                'indexes': [models.Index(fields=['student', '-created_at', '-id'], name='libraryitem_student_recent_idx'), models.Index(fields=['student', 'category'], name='libraryitem_student_cat_idx')],
+                'unique_together': {('student', 'source_kind', 'source_id')},
+            },
+        ),
+        migrations.RunPython(create_library_fts, drop_library_fts),
+    ]
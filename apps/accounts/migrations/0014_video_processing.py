@@ -0,0 +1,99 @@
+# Generated by Django 5.1.15 on 2026-10-17 01:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def restore_library_fts_triggers(apps, schema_editor):
+    # Adding columns makes SQLite rebuild accounts_libraryitem, which drops the FTS triggers of 0012.
+    # Any later migration that alters LibraryItem has to restore them the same way.
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'accounts_libraryitem_fts'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute(
+            "CREATE TRIGGER IF NOT EXISTS accounts_libraryitem_fts_ai AFTER INSERT ON accounts_libraryitem BEGIN "
+            "INSERT INTO accounts_libraryitem_fts(rowid, search_text) VALUES (new.id, new.search_text); END"
+        )
+        cursor.execute(
+            "CREATE TRIGGER IF NOT EXISTS accounts_libraryitem_fts_ad AFTER DELETE ON accounts_libraryitem BEGIN "
+            "INSERT INTO accounts_libraryitem_fts(accounts_libraryitem_fts, rowid, search_text) "
+            "VALUES ('delete', old.id, old.search_text); END"
+        )
+        cursor.execute(
+            "CREATE TRIGGER IF NOT EXISTS accounts_libraryitem_fts_au AFTER UPDATE ON accounts_libraryitem BEGIN "
+            "INSERT INTO accounts_libraryitem_fts(accounts_libraryitem_fts, rowid, search_text) "
+            "VALUES ('delete', old.id, old.search_text); "
+            "INSERT INTO accounts_libraryitem_fts(rowid, search_text) VALUES (new.id, new.search_text); END"
+        )
+        cursor.execute("INSERT INTO accounts_libraryitem_fts(accounts_libraryitem_fts) VALUES ('rebuild')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_videoupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libraryitem',
+            name='details',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='libraryitem',
+            name='poster_url',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='libraryvideo',
+            name='duration_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='libraryvideo',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='libraryvideo',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='libraryvideo',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='libraryvideo',
+            name='thumbnail',
+            field=models.FileField(blank=True, default='', upload_to='library/thumbnails/%Y/%m/'),
+        ),
+        migrations.AddField(
+            model_name='libraryvideo',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='VideoProcessingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'В очереди'), ('RUNNING', 'Обрабатывается'), ('DONE', 'Готово'), ('FAILED', 'Ошибка')], default='PENDING', max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='processing_job', to='accounts.libraryvideo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='videojob_status_created_idx')],
+            },
+        ),
+        migrations.RunPython(restore_library_fts_triggers, migrations.RunPython.noop),
+    ]
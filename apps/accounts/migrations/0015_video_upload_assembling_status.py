@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_video_processing'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='videoupload',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Загружается'), ('ASSEMBLING', 'Сохраняется'), ('COMPLETE', 'Загружено')], default='PENDING', max_length=16),
+        ),
+    ]
@@ -1,7 +1,9 @@
 # apps/accounts/models.py
 from datetime import timedelta
 import hashlib
+import math
 import secrets
+import uuid
 
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
@@ -169,6 +171,13 @@ class LibraryVideo(models.Model):
         upload_to="library/videos/%Y/%m/",
         validators=[FileExtensionValidator(allowed_extensions=LIBRARY_VIDEO_EXTENSIONS)],
     )
+    # Filled in by the background worker (apps.accounts.video_processing), never on the request path.
+    duration_seconds = models.FloatField(null=True, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    thumbnail = models.FileField(upload_to="library/thumbnails/%Y/%m/", blank=True, default="")
+    processed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -177,3 +186,139 @@ class LibraryVideo(models.Model):
     def __str__(self) -> str:
         title = self.title.strip() or self.video.name.rsplit("/", 1)[-1]
         return f"{title} -> {self.student_id}"
+
+    @property
+    def duration_label(self) -> str:
+        if self.duration_seconds is None:
+            return ""
+        minutes, seconds = divmod(int(round(self.duration_seconds)), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class VideoProcessingJob(models.Model):
+    """Queue row for the video worker: one per LibraryVideo, reset to PENDING whenever the file changes."""
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "В очереди"
+        RUNNING = "RUNNING", "Обрабатывается"
+        DONE = "DONE", "Готово"
+        FAILED = "FAILED", "Ошибка"
+
+    video = models.OneToOneField(LibraryVideo, on_delete=models.CASCADE, related_name="processing_job")
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=("status", "created_at"), name="videojob_status_created_idx")]
+
+    def __str__(self) -> str:
+        return f"{self.video_id}: {self.get_status_display()}"
+
+
+class VideoUpload(models.Model):
+    """
+    Resumable chunked upload of a video. Numbered chunks are staged under
+    VIDEO_UPLOAD_STAGING_ROOT/<token>/ until completion attaches the file to a LibraryVideo.
+    """
+
+    class Purpose(models.TextChoices):
+        LIBRARY = "LIBRARY", "Видео библиотеки"
+        SUBMISSION = "SUBMISSION", "Ответ на задание"
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Загружается"
+        ASSEMBLING = "ASSEMBLING", "Сохраняется"
+        COMPLETE = "COMPLETE", "Загружено"
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="video_uploads")
+    purpose = models.CharField(max_length=16, choices=Purpose.choices)
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="+")
+    assignment_target = models.ForeignKey(
+        "homework.AssignmentTarget",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    title = models.CharField(max_length=200, blank=True, default="")
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    # Optional sha256 of the whole file, checked on completion; every chunk carries its own checksum.
+    checksum = models.CharField(max_length=64, blank=True, default="")
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    library_video = models.ForeignKey(
+        LibraryVideo,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=("status", "updated_at"), name="videoupload_status_updated_idx")]
+
+    def __str__(self) -> str:
+        return f"{self.filename} ({self.get_status_display()})"
+
+    @property
+    def chunk_count(self) -> int:
+        return max(1, math.ceil(self.size / self.chunk_size))
+
+
+class LibraryItem(models.Model):
+    """
+    Library index: one row per resource visible to a student, with display fields precomputed.
+    Rows are rebuilt per student by apps.accounts.library_service.rebuild_library_index.
+    """
+
+    class SourceKind(models.TextChoices):
+        VIDEO = "VIDEO", "Видео библиотеки"
+        ASSIGNMENT = "ASSIGNMENT", "Материалы задания"
+        LESSON = "LESSON", "Материалы урока"
+        REPORT = "REPORT", "Отчёт урока"
+
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="library_items")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="library_items")
+    uploader = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    source_kind = models.CharField(max_length=16, choices=SourceKind.choices)
+    source_id = models.PositiveBigIntegerField()
+    title = models.CharField(max_length=255)
+    category = models.CharField(max_length=32)
+    source = models.CharField(max_length=64)
+    course_name = models.CharField(max_length=200)
+    uploaded_by = models.CharField(max_length=255)
+    url = models.CharField(max_length=500)
+    is_external = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    date_label = models.CharField(max_length=10)
+    poster_url = models.CharField(max_length=500, blank=True, default="")
+    details = models.CharField(max_length=64, blank=True, default="")
+    # Lowercased title/category/source/course/uploader, searched through FTS5 on SQLite.
+    search_text = models.TextField()
+
+    class Meta:
+        ordering = ("-created_at", "-id")
+        unique_together = ("student", "source_kind", "source_id")
+        indexes = [
+            models.Index(fields=("student", "-created_at", "-id"), name="libraryitem_student_recent_idx"),
+            models.Index(fields=("student", "category"), name="libraryitem_student_cat_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.title} -> {self.student_id}"
@@ -0,0 +1,309 @@
+# apps/accounts/signals.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.gradebook.models import Assessment, Grade
+from apps.homework.models import Assignment, AssignmentTarget
+from apps.lessons.models import Lesson, LessonReport, LessonSlot, LessonStudent, StudentSchedule
+from apps.schedule.models import Event
+from apps.school.models import Course, Enrollment, ParentChild
+from apps.school.access import reset_teacher_access
+from apps.school.services import (
+    TEACHER_COURSE_ACCESS_SOURCES,
+    grant_teacher_course_access,
+    revoke_unused_teacher_course_access,
+)
+
+from .dashboard_cache import invalidate_all_dashboards, invalidate_parent_children, invalidate_student_dashboards
+from .library_service import rebuild_library_index
+from .models import LibraryItem, LibraryVideo, Profile, StudentInvitation
+from .video_processing import enqueue_video_processing
+
+
+_DISPLAY_NAME_FIELDS = {"first_name", "last_name", "username"}
+_LIBRARY_TARGET_FIELDS = {"assignment", "assignment_id", "student", "student_id"}
+_PAIR_BEFORE_SAVE = "_teacher_course_pair_before_save"
+_REPORT_BEFORE_SAVE = "_lesson_report_audience_before_save"
+
+
+@receiver(post_save, sender=Grade)
+@receiver(post_delete, sender=Grade)
+@receiver(post_save, sender=AssignmentTarget)
+@receiver(post_delete, sender=AssignmentTarget)
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_dashboard_on_student_row(sender, instance, raw: bool = False, **kwargs):
+    if raw:
+        return
+    invalidate_student_dashboards([instance.student_id])
+
+
+def _invalidate_dashboards_of_user(user_id: int) -> None:
+    # Parents list their children by name and cycle.
+    invalidate_student_dashboards([user_id])
+    parent_ids = ParentChild.objects.filter(child_id=user_id).values_list("parent_id", flat=True)
+    invalidate_parent_children([user_id, *parent_ids])
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_dashboard_on_profile(sender, instance: Profile, raw: bool = False, **kwargs):
+    if raw:
+        return
+    _invalidate_dashboards_of_user(instance.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_dashboard_on_user_rename(
+    sender, instance, created: bool, raw: bool = False, update_fields=None, **kwargs
+):
+    if raw or created or (update_fields is not None and not _DISPLAY_NAME_FIELDS & set(update_fields)):
+        return
+    _invalidate_dashboards_of_user(instance.id)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_dashboard_on_lesson(sender, instance: Lesson, raw: bool = False, **kwargs):
+    if raw:
+        return
+    invalidate_student_dashboards(Enrollment.objects.filter(course_id=instance.course_id).values_list("student_id", flat=True))
+
+
+@receiver(post_save, sender=Assignment)
+def invalidate_dashboard_on_assignment(sender, instance: Assignment, created: bool, raw: bool = False, **kwargs):
+    # Title and due date make the homework hint; a new assignment has no targets yet.
+    if raw or created:
+        return
+    invalidate_student_dashboards(AssignmentTarget.objects.filter(assignment=instance).values_list("student_id", flat=True))
+
+
+@receiver(post_save, sender=Assessment)
+def invalidate_dashboard_on_assessment(sender, instance: Assessment, created: bool, raw: bool = False, **kwargs):
+    # The title labels the student's grades; a new assessment has no grades yet.
+    if raw or created:
+        return
+    invalidate_student_dashboards(Grade.objects.filter(assessment=instance).values_list("student_id", flat=True))
+
+
+@receiver(post_delete, sender=Assignment)
+@receiver(post_delete, sender=Assessment)
+def invalidate_dashboard_on_course_work_delete(sender, instance, **kwargs):
+    # The targets and grades are deleted first, so fall back to everyone enrolled in the course.
+    invalidate_student_dashboards(Enrollment.objects.filter(course_id=instance.course_id).values_list("student_id", flat=True))
+
+
+@receiver(post_save, sender=Course)
+def invalidate_dashboard_on_course(sender, instance: Course, created: bool, raw: bool = False, **kwargs):
+    if raw or created:
+        return
+    invalidate_student_dashboards(Enrollment.objects.filter(course=instance).values_list("student_id", flat=True))
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_dashboard_on_event(sender, instance: Event, raw: bool = False, **kwargs):
+    if raw:
+        return
+    invalidate_all_dashboards()
+
+
+@receiver(m2m_changed, sender=Event.participants.through)
+def invalidate_dashboard_on_event_participants(sender, action: str, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_all_dashboards()
+
+
+@receiver(post_save, sender=ParentChild)
+@receiver(post_delete, sender=ParentChild)
+def invalidate_dashboard_on_parent_link(sender, instance: ParentChild, raw: bool = False, **kwargs):
+    if raw:
+        return
+    invalidate_parent_children([instance.parent_id])
+
+
+# Library index: every change re-materializes the LibraryItem rows of the affected students.
+
+
+def _reindex_library_after_commit(student_ids) -> None:
+    # Deletes cascade (user, course, lesson): rebuilding mid-cascade would re-insert rows for parents
+    # that are about to disappear, so wait for the deletion to commit.
+    student_ids = list(student_ids)
+    transaction.on_commit(lambda: rebuild_library_index(student_ids))
+
+
+@receiver(post_save, sender=LibraryVideo)
+def reindex_library_on_student_row_save(sender, instance, raw: bool = False, **kwargs):
+    if raw:
+        return
+    rebuild_library_index([instance.student_id])
+
+
+@receiver(post_save, sender=AssignmentTarget)
+def reindex_library_on_assignment_target(
+    sender, instance: AssignmentTarget, created: bool, raw: bool = False, update_fields=None, **kwargs
+):
+    # The library lists the assignment's attachment; status and comment saves leave it as it is.
+    if raw or (not created and update_fields is not None and not _LIBRARY_TARGET_FIELDS & set(update_fields)):
+        return
+    rebuild_library_index([instance.student_id])
+
+
+@receiver(post_delete, sender=LibraryVideo)
+@receiver(post_delete, sender=AssignmentTarget)
+def reindex_library_on_student_row_delete(sender, instance, **kwargs):
+    _reindex_library_after_commit([instance.student_id])
+
+
+@receiver(post_save, sender=LessonStudent)
+def reindex_library_on_lesson_entry_save(sender, instance: LessonStudent, created: bool, raw: bool = False, **kwargs):
+    # Attendance edits do not change what the student sees in the library.
+    if raw or not created:
+        return
+    rebuild_library_index([instance.student_id])
+
+
+@receiver(post_delete, sender=LessonStudent)
+def reindex_library_on_lesson_entry_delete(sender, instance: LessonStudent, **kwargs):
+    _reindex_library_after_commit([instance.student_id])
+
+
+@receiver(post_save, sender=Assignment)
+def reindex_library_on_assignment(sender, instance: Assignment, created: bool, raw: bool = False, **kwargs):
+    if raw or created:
+        return
+    rebuild_library_index(AssignmentTarget.objects.filter(assignment=instance).values_list("student_id", flat=True))
+
+
+@receiver(post_save, sender=Lesson)
+def reindex_library_on_lesson(sender, instance: Lesson, created: bool, raw: bool = False, **kwargs):
+    if raw or created:
+        return
+    rebuild_library_index(LessonStudent.objects.filter(lesson=instance).values_list("student_id", flat=True))
+
+
+def _lesson_report_student_ids(report: LessonReport):
+    if report.student_id:
+        return [report.student_id]
+    return LessonStudent.objects.filter(lesson_id=report.lesson_id).values_list("student_id", flat=True)
+
+
+@receiver(pre_save, sender=LessonReport)
+def remember_lesson_report_audience(sender, instance: LessonReport, raw: bool = False, **kwargs):
+    # Moving a report to another student or lesson must drop it from the previous audience's library.
+    if raw or instance._state.adding:
+        return
+    instance.__dict__[_REPORT_BEFORE_SAVE] = (
+        LessonReport.objects.filter(pk=instance.pk).values_list("lesson_id", "student_id").first()
+    )
+
+
+@receiver(post_save, sender=LessonReport)
+def reindex_library_on_lesson_report_save(sender, instance: LessonReport, raw: bool = False, **kwargs):
+    if raw:
+        return
+    student_ids = set(_lesson_report_student_ids(instance))
+    previous = instance.__dict__.pop(_REPORT_BEFORE_SAVE, None)
+    if previous is not None and previous != (instance.lesson_id, instance.student_id):
+        lesson_id, student_id = previous
+        student_ids.update(_lesson_report_student_ids(LessonReport(lesson_id=lesson_id, student_id=student_id)))
+    rebuild_library_index(sorted(student_ids))
+
+
+@receiver(post_delete, sender=LessonReport)
+def reindex_library_on_lesson_report_delete(sender, instance: LessonReport, **kwargs):
+    _reindex_library_after_commit(_lesson_report_student_ids(instance))
+
+
+@receiver(post_save, sender=Course)
+def reindex_library_on_course(sender, instance: Course, created: bool, raw: bool = False, **kwargs):
+    if raw or created:
+        return
+    rebuild_library_index(LibraryItem.objects.filter(course=instance).values_list("student_id", flat=True))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reindex_library_on_user_rename(sender, instance, created: bool, raw: bool = False, update_fields=None, **kwargs):
+    # Logins save only last_login; the uploader label depends on the name fields.
+    if raw or created or (update_fields is not None and not _DISPLAY_NAME_FIELDS & set(update_fields)):
+        return
+    rebuild_library_index(LibraryItem.objects.filter(uploader=instance).values_list("student_id", flat=True))
+
+
+@receiver(post_save, sender=LibraryVideo)
+def queue_library_video_processing(
+    sender, instance: LibraryVideo, created: bool, raw: bool = False, update_fields=None, **kwargs
+):
+    # The worker saves its results with update_fields that never include "video".
+    if raw or not (created or update_fields is None or "video" in update_fields):
+        return
+    enqueue_video_processing([instance.id])
+
+
+# Teacher course access: every row of TEACHER_COURSE_ACCESS_SOURCES grants its (teacher, course) pair.
+
+
+def _teacher_course_pair(instance):
+    teacher_field, course_field = TEACHER_COURSE_ACCESS_SOURCES[type(instance)]
+    return getattr(instance, teacher_field), getattr(instance, course_field)
+
+
+@receiver(pre_save, sender=Course)
+@receiver(pre_save, sender=StudentSchedule)
+@receiver(pre_save, sender=StudentInvitation)
+@receiver(pre_save, sender=Assignment)
+@receiver(pre_save, sender=Lesson)
+@receiver(pre_save, sender=LessonSlot)
+def remember_teacher_course_pair(sender, instance, raw: bool = False, update_fields=None, **kwargs):
+    # Only saves that may move the row to another teacher or course need the stored pair.
+    if raw or instance._state.adding:
+        return
+    teacher_field, course_field = TEACHER_COURSE_ACCESS_SOURCES[sender]
+    pair_fields = {teacher_field.removesuffix("_id"), course_field.removesuffix("_id")}
+    if update_fields is not None and not pair_fields & set(update_fields):
+        return
+    instance.__dict__[_PAIR_BEFORE_SAVE] = (
+        sender.objects.filter(pk=instance.pk).values_list(teacher_field, course_field).first()
+    )
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=StudentSchedule)
+@receiver(post_save, sender=StudentInvitation)
+@receiver(post_save, sender=Assignment)
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=LessonSlot)
+def grant_teacher_course_access_on_save(sender, instance, created: bool, raw: bool = False, **kwargs):
+    pair = _teacher_course_pair(instance)
+    if created or raw:
+        grant_teacher_course_access([pair])
+        return
+    if _PAIR_BEFORE_SAVE not in instance.__dict__:
+        return
+    previous = instance.__dict__.pop(_PAIR_BEFORE_SAVE)
+    if previous == pair:
+        return
+    grant_teacher_course_access([pair])
+    if previous is not None:
+        revoke_unused_teacher_course_access([previous])
+
+
+@receiver(post_delete, sender=StudentSchedule)
+@receiver(post_delete, sender=StudentInvitation)
+@receiver(post_delete, sender=Assignment)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=LessonSlot)
+def revoke_teacher_course_access_on_delete(sender, instance, **kwargs):
+    # Only revokes, so a cascade from a course or user delete never inserts rows that are about to go.
+    # Deleting a course removes its access rows by cascade.
+    revoke_unused_teacher_course_access([_teacher_course_pair(instance)])
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+@receiver(post_save, sender=Profile)
+@receiver(post_save, sender=Course)
+def reset_teacher_access_on_change(sender, **kwargs):
+    # A write inside the request must not be hidden by the request's cached TeacherAccessContext.
+    reset_teacher_access()
@@ -1,15 +1,36 @@
+import hashlib
 import shutil
+import struct
 import tempfile
+from datetime import timedelta
 from pathlib import Path
+from unittest import mock
+from urllib.parse import quote
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
+from apps.gradebook.models import Assessment, Grade
+from apps.homework.models import Assignment, AssignmentTarget
+from apps.lessons.models import Lesson, LessonReport, LessonStudent
+from apps.schedule.models import Event
 from apps.school.models import Course, CourseType, Enrollment, ParentChild
 
-from .models import ActivationCode, LibraryVideo, Profile
+from .library_service import (
+    library_category_counts,
+    library_items_for_student,
+    paginate_library_items,
+    search_library_items,
+)
+from .models import ActivationCode, LibraryItem, LibraryVideo, Profile, VideoProcessingJob, VideoUpload
+from .video_processing import process_pending_videos
+from .views import _parent_threads, _student_threads, _teacher_threads
 
 
 class RegistrationAndActivationCodeTests(TestCase):
@@ -291,3 +312,621 @@ class LibraryAndStudentProfileTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(ParentChild.objects.filter(parent=self.parent, child=self.second_child).exists())
         self.assertContains(response, "student_second User")
+
+
+class LibraryIndexTests(TestCase):
+    def setUp(self):
+        self.user_model = get_user_model()
+        self.course_type = CourseType.objects.create(name="Гитара")
+        self.teacher = self._create_user("teacher_index", Profile.Role.TEACHER)
+        self.other_teacher = self._create_user("teacher_other", Profile.Role.TEACHER)
+        self.student = self._create_user("student_index", Profile.Role.STUDENT)
+        self.course = Course.objects.create(name="Гитара 1", course_type=self.course_type, teacher=self.teacher)
+        self.other_course = Course.objects.create(
+            name="Сольфеджио", course_type=self.course_type, teacher=self.other_teacher
+        )
+        Enrollment.objects.create(course=self.course, student=self.student)
+        Enrollment.objects.create(course=self.other_course, student=self.student)
+
+    def _create_user(self, username: str, role: str):
+        user = self.user_model.objects.create_user(username=username, password="pass12345", first_name=username)
+        Profile.objects.create(user=user, role=role)
+        return user
+
+    def _assign(self, course, title: str, attachment: str):
+        assignment = Assignment.objects.create(
+            course=course,
+            title=title,
+            due_date=timezone.localdate(),
+            attachment=attachment,
+            created_by=course.teacher,
+        )
+        AssignmentTarget.objects.create(assignment=assignment, student=self.student)
+        return assignment
+
+    def test_index_follows_source_rows(self):
+        assignment = self._assign(self.course, "Гаммы до мажор", "assignments/ab/scales.pdf")
+        self._assign(self.other_course, "Диктант", "assignments/cd/dictation.mp3")
+
+        items = library_items_for_student(self.student)
+        self.assertEqual(sorted(items.values_list("title", flat=True)), ["Гаммы до мажор", "Диктант"])
+        self.assertEqual(library_category_counts(items)["Документы"], 1)
+        self.assertEqual(library_category_counts(items)["Аудио"], 1)
+
+        assignment.title = "Гаммы ре мажор"
+        assignment.save()
+        self.assertTrue(LibraryItem.objects.filter(student=self.student, title="Гаммы ре мажор").exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            assignment.delete()
+        self.assertEqual(list(library_items_for_student(self.student).values_list("title", flat=True)), ["Диктант"])
+
+    def test_status_saves_skip_the_rebuild_and_moved_reports_leave_the_old_library(self):
+        assignment = self._assign(self.course, "Гаммы до мажор", "assignments/ab/scales.pdf")
+        target = AssignmentTarget.objects.get(assignment=assignment, student=self.student)
+        target.status = AssignmentTarget.Status.DONE
+        with mock.patch("apps.accounts.signals.rebuild_library_index") as rebuild:
+            target.save(update_fields=["status", "updated_at"])
+        rebuild.assert_not_called()
+
+        other_student = self._create_user("student_other", Profile.Role.STUDENT)
+        lesson = Lesson.objects.create(
+            course=self.course, date=timezone.localdate(), topic="Аккорды", created_by=self.teacher
+        )
+        LessonStudent.objects.create(lesson=lesson, student=self.student)
+        LessonStudent.objects.create(lesson=lesson, student=other_student)
+        report = LessonReport.objects.create(
+            lesson=lesson, student=self.student, text="", media_url="https://example.com/chords"
+        )
+        reports = LibraryItem.objects.filter(source_kind=LibraryItem.SourceKind.REPORT)
+        self.assertEqual(list(reports.values_list("student_id", flat=True)), [self.student.id])
+
+        report.student = other_student
+        report.save()
+        self.assertEqual(list(reports.values_list("student_id", flat=True)), [other_student.id])
+
+    def test_search_is_case_insensitive_substring_search(self):
+        self._assign(self.course, "Гаммы до мажор", "assignments/ab/scales.pdf")
+        self._assign(self.other_course, "Диктант", "assignments/cd/dictation.mp3")
+        items = library_items_for_student(self.student)
+
+        self.assertEqual(list(search_library_items(items, "АММЫ").values_list("title", flat=True)), ["Гаммы до мажор"])
+        self.assertEqual(list(search_library_items(items, "ди").values_list("title", flat=True)), ["Диктант"])
+        self.assertEqual(search_library_items(items, "сольфедж").count(), 1)
+        self.assertEqual(search_library_items(items, "teacher_index").count(), 1)
+        self.assertEqual(search_library_items(items, "аудио").count(), 1)
+        self.assertEqual(search_library_items(items, "скрипка").count(), 0)
+
+    def test_teacher_library_shows_only_own_courses_with_counts(self):
+        self._assign(self.course, "Гаммы до мажор", "assignments/ab/scales.pdf")
+        self._assign(self.other_course, "Диктант", "assignments/cd/dictation.mp3")
+
+        self.client.force_login(self.teacher)
+        response = self.client.get(f"/library/?student={self.student.id}&q=гаммы")
+
+        self.assertContains(response, "Гаммы до мажор")
+        self.assertNotContains(response, "Диктант")
+        self.assertEqual(response.context["page"].next_cursor, "")
+
+    def test_keyset_pages_walk_forward_and_back_without_gaps(self):
+        for index in range(5):
+            self._assign(self.course, f"Этюд {index}", f"assignments/ab/etude{index}.pdf")
+        # Same timestamp for every row: ties are broken by id.
+        LibraryItem.objects.update(created_at=timezone.now())
+        items = library_items_for_student(self.student)
+
+        first = paginate_library_items(items, size=2)
+        second = paginate_library_items(items, after=first.next_cursor, size=2)
+        third = paginate_library_items(items, after=second.next_cursor, size=2)
+        titles = [item.title for page in (first, second, third) for item in page.items]
+        self.assertEqual(titles, [f"Этюд {index}" for index in range(4, -1, -1)])
+        self.assertEqual((first.previous_cursor, third.next_cursor), ("", ""))
+
+        back = paginate_library_items(items, before=third.previous_cursor, size=2)
+        self.assertEqual([item.id for item in back.items], [item.id for item in second.items])
+        self.assertEqual(paginate_library_items(items, after="broken", size=2).items, first.items)
+
+
+class ChunkedVideoUploadTests(TestCase):
+    def setUp(self):
+        self.media_root_base = Path(__file__).resolve().parents[2] / "tmp_test_media"
+        self.media_root_base.mkdir(exist_ok=True)
+        self.media_root = tempfile.mkdtemp(dir=self.media_root_base)
+        self.addCleanup(lambda: shutil.rmtree(self.media_root, ignore_errors=True))
+        self.enterContext(
+            self.settings(
+                MEDIA_ROOT=self.media_root,
+                VIDEO_UPLOAD_STAGING_ROOT=Path(self.media_root) / "staging",
+                STORAGES={
+                    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                    "staticfiles": settings.STORAGES["staticfiles"],
+                },
+            )
+        )
+        self.enterContext(mock.patch("apps.accounts.video_uploads.VIDEO_UPLOAD_CHUNK_SIZE", 4))
+        self.user_model = get_user_model()
+        self.course_type = CourseType.objects.create(name="Вокал")
+        self.teacher = self._create_user("teacher_upload", Profile.Role.TEACHER)
+        self.student = self._create_user("student_upload", Profile.Role.STUDENT)
+        self.course = Course.objects.create(name="Вокал 1", course_type=self.course_type, teacher=self.teacher)
+        Enrollment.objects.create(course=self.course, student=self.student)
+
+    def _create_user(self, username: str, role: str):
+        user = self.user_model.objects.create_user(username=username, password="pass12345")
+        Profile.objects.create(user=user, role=role)
+        return user
+
+    def _start(self, **data):
+        return self.client.post("/uploads/videos/", data={"filename": "practice.mp4", "size": 10, **data})
+
+    def _put_chunk(self, upload_id, index: int, data: bytes, checksum: str = ""):
+        return self.client.put(
+            f"/uploads/videos/{upload_id}/chunks/{index}/",
+            data=data,
+            content_type="application/octet-stream",
+            headers={"X-Chunk-SHA256": checksum or hashlib.sha256(data).hexdigest()},
+        )
+
+    def test_teacher_library_upload_resumes_and_reassembles_chunks(self):
+        content = b"0123456789"
+        self.client.force_login(self.teacher)
+        start = self._start(
+            purpose="LIBRARY",
+            student=self.student.id,
+            title="Распевка",
+            checksum=hashlib.sha256(content).hexdigest(),
+        ).json()
+        self.assertEqual((start["chunk_count"], start["received_chunks"]), (3, []))
+
+        self.assertEqual(self._put_chunk(start["id"], 0, content[:4]).status_code, 200)
+        self.assertEqual(self._put_chunk(start["id"], 2, content[8:]).json()["received_bytes"], 6)
+
+        resumed = self._start(
+            purpose="LIBRARY",
+            student=self.student.id,
+            title="Распевка",
+            checksum=hashlib.sha256(content).hexdigest(),
+        )
+        self.assertEqual(resumed.json()["id"], start["id"])
+        self.assertEqual(resumed.json()["received_chunks"], [0, 2])
+        self.assertEqual(self.client.post(f"/uploads/videos/{start['id']}/complete/").status_code, 400)
+
+        self._put_chunk(start["id"], 1, content[4:8])
+        complete = self.client.post(f"/uploads/videos/{start['id']}/complete/")
+
+        self.assertEqual(complete.status_code, 200)
+        video = LibraryVideo.objects.get(student=self.student)
+        self.assertEqual((video.title, video.course, video.teacher), ("Распевка", self.course, self.teacher))
+        with video.video.open("rb") as stored:
+            self.assertEqual(stored.read(), content)
+        self.assertEqual(complete.json()["video_id"], video.id)
+        self.assertFalse((Path(self.media_root) / "staging" / start["id"]).exists())
+        self.assertTrue(LibraryItem.objects.filter(student=self.student, source_id=video.id).exists())
+
+    def test_chunks_with_wrong_checksum_or_size_are_rejected(self):
+        self.client.force_login(self.teacher)
+        upload_id = self._start(purpose="LIBRARY", student=self.student.id).json()["id"]
+
+        self.assertEqual(self._put_chunk(upload_id, 0, b"0123", checksum="0" * 64).status_code, 400)
+        self.assertEqual(self._put_chunk(upload_id, 0, b"012").status_code, 400)
+        self.assertEqual(self._put_chunk(upload_id, 0, b"01234").status_code, 413)
+        self.assertEqual(self._put_chunk(upload_id, 3, b"01").status_code, 400)
+        self.assertEqual(self.client.get(f"/uploads/videos/{upload_id}/").json()["received_chunks"], [])
+        self.assertEqual(self._start(purpose="LIBRARY", student=self.student.id, filename="notes.pdf").status_code, 400)
+
+    def test_student_answer_video_is_attached_to_assignment_target(self):
+        assignment = Assignment.objects.create(
+            course=self.course,
+            title="Вокализ",
+            due_date=timezone.localdate(),
+            created_by=self.teacher,
+        )
+        target = AssignmentTarget.objects.create(
+            assignment=assignment, student=self.student, student_comment="Первая попытка"
+        )
+        self.client.force_login(self.student)
+        upload_id = self._start(purpose="SUBMISSION", target=target.id, size=3).json()["id"]
+        self._put_chunk(upload_id, 0, b"abc")
+
+        response = self.client.post(f"/uploads/videos/{upload_id}/complete/")
+
+        self.assertEqual(response.json()["redirect_url"], "/assignments/")
+        target.refresh_from_db()
+        self.assertEqual((target.status, target.student_comment), (AssignmentTarget.Status.DONE, "Первая попытка"))
+        self.assertEqual(target.submission_video.student, self.student)
+        self.assertEqual(self._start(purpose="LIBRARY", student=self.student.id).status_code, 400)
+
+    def test_completion_is_claimed_before_assembling(self):
+        self.client.force_login(self.teacher)
+        upload_id = self._start(purpose="LIBRARY", student=self.student.id, size=3, checksum="0" * 64).json()["id"]
+        self._put_chunk(upload_id, 0, b"abc")
+
+        # A failed assembly releases the claim, so the client can retry.
+        self.assertEqual(self.client.post(f"/uploads/videos/{upload_id}/complete/").status_code, 400)
+        self.assertEqual(VideoUpload.objects.get().status, VideoUpload.Status.PENDING)
+
+        VideoUpload.objects.update(status=VideoUpload.Status.ASSEMBLING)
+        with mock.patch("apps.accounts.video_uploads._assemble") as assemble:
+            response = self.client.post(f"/uploads/videos/{upload_id}/complete/")
+        self.assertEqual(response.status_code, 400)
+        assemble.assert_not_called()
+        self.assertFalse(LibraryVideo.objects.exists())
+
+        # A claim left by a crashed worker expires.
+        VideoUpload.objects.update(checksum="", updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.client.post(f"/uploads/videos/{upload_id}/complete/").status_code, 200)
+        self.assertEqual(VideoUpload.objects.get().status, VideoUpload.Status.COMPLETE)
+
+    def test_uploads_are_private_to_their_owner(self):
+        other_student = self._create_user("student_other_upload", Profile.Role.STUDENT)
+        self.client.force_login(self.teacher)
+        upload_id = self._start(purpose="LIBRARY", student=self.student.id).json()["id"]
+        self.assertEqual(self._start(purpose="LIBRARY", student=other_student.id).status_code, 404)
+
+        self.client.force_login(other_student)
+        self.assertEqual(self.client.get(f"/uploads/videos/{upload_id}/").status_code, 404)
+        self.assertEqual(self._put_chunk(upload_id, 0, b"0123").status_code, 404)
+        self.assertEqual(VideoUpload.objects.get().status, VideoUpload.Status.PENDING)
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root_base = Path(__file__).resolve().parents[2] / "tmp_test_media"
+        self.media_root_base.mkdir(exist_ok=True)
+        self.media_root = tempfile.mkdtemp(dir=self.media_root_base)
+        self.addCleanup(lambda: shutil.rmtree(self.media_root, ignore_errors=True))
+        self.enterContext(self.settings(DEBUG=False, SERVE_MEDIA=True, MEDIA_ROOT=self.media_root, MEDIA_OFFLOAD=""))
+        self.user_model = get_user_model()
+        self.course_type = CourseType.objects.create(name="Флейта")
+        self.teacher = self._create_user("teacher_media", Profile.Role.TEACHER)
+        self.student = self._create_user("student_media", Profile.Role.STUDENT)
+        self.parent = self._create_user("parent_media", Profile.Role.PARENT)
+        self.stranger = self._create_user("student_stranger", Profile.Role.STUDENT)
+        self.course = Course.objects.create(name="Флейта 1", course_type=self.course_type, teacher=self.teacher)
+        Enrollment.objects.create(course=self.course, student=self.student)
+        ParentChild.objects.create(parent=self.parent, child=self.student)
+
+        self.content = b"0123456789"
+        self.video_name = "library/videos/2026/10/clip.mp4"
+        video_path = Path(self.media_root) / self.video_name
+        video_path.parent.mkdir(parents=True)
+        video_path.write_bytes(self.content)
+        LibraryVideo.objects.create(teacher=self.teacher, student=self.student, course=self.course, video=self.video_name)
+        self.url = f"/media/{self.video_name}"
+
+    def _create_user(self, username: str, role: str):
+        user = self.user_model.objects.create_user(username=username, password="pass12345")
+        Profile.objects.create(user=user, role=role)
+        return user
+
+    def test_full_range_and_conditional_responses(self):
+        self.client.force_login(self.student)
+        full = self.client.get(self.url)
+        self.assertEqual((full.status_code, full["Accept-Ranges"], full["Content-Length"]), (200, "bytes", "10"))
+        self.assertEqual(b"".join(full.streaming_content), self.content)
+
+        partial = self.client.get(self.url, headers={"Range": "bytes=2-5"})
+        self.assertEqual((partial.status_code, partial["Content-Range"]), (206, "bytes 2-5/10"))
+        self.assertEqual(b"".join(partial.streaming_content), b"2345")
+        suffix = self.client.get(self.url, headers={"Range": "bytes=-3"})
+        self.assertEqual(b"".join(suffix.streaming_content), b"789")
+        self.assertEqual(self.client.get(self.url, headers={"Range": "bytes=10-"}).status_code, 416)
+
+        self.assertEqual(self.client.get(self.url, headers={"If-None-Match": full["ETag"]}).status_code, 304)
+        stale = self.client.get(self.url, headers={"Range": "bytes=2-5", "If-Range": '"stale"'})
+        self.assertEqual(stale.status_code, 200)
+        fresh = self.client.get(self.url, headers={"Range": "bytes=2-5", "If-Range": full["ETag"]})
+        self.assertEqual(fresh.status_code, 206)
+
+    def test_media_follows_library_and_homework_permissions(self):
+        attachment_name = "assignments/ab/scales.pdf"
+        attachment_path = Path(self.media_root) / attachment_name
+        attachment_path.parent.mkdir(parents=True)
+        attachment_path.write_bytes(b"%PDF")
+        assignment = Assignment.objects.create(
+            course=self.course,
+            title="Гаммы",
+            due_date=timezone.localdate(),
+            attachment=attachment_name,
+            created_by=self.teacher,
+        )
+        AssignmentTarget.objects.create(assignment=assignment, student=self.student)
+
+        for user in (self.teacher, self.student, self.parent):
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            self.assertEqual(self.client.get(f"/media/{attachment_name}").status_code, 200)
+
+        self.client.force_login(self.stranger)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(f"/media/{attachment_name}").status_code, 404)
+        self.assertEqual(self.client.get("/media/../config/settings.py").status_code, 404)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_hashed_attachments_are_served_under_the_uploaded_name(self):
+        assignment = Assignment.objects.create(
+            course=self.course,
+            title="Гаммы",
+            due_date=timezone.localdate(),
+            attachment=SimpleUploadedFile("Гаммы до мажор.pdf", b"%PDF-1"),
+            created_by=self.teacher,
+        )
+        (copy,) = Assignment.objects.bulk_create(
+            [
+                Assignment(
+                    course=self.course,
+                    title="Гаммы 2",
+                    due_date=timezone.localdate(),
+                    attachment=SimpleUploadedFile("Гаммы до мажор.pdf", b"%PDF-1"),
+                    created_by=self.teacher,
+                )
+            ]
+        )
+        AssignmentTarget.objects.create(assignment=assignment, student=self.student)
+
+        self.assertEqual(assignment.attachment.name, copy.attachment.name)
+        self.assertRegex(assignment.attachment.name, r"^assignments/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$")
+        self.assertEqual(
+            list(Assignment.objects.order_by().values_list("attachment_name", flat=True).distinct()),
+            ["Гаммы до мажор.pdf"],
+        )
+        self.client.force_login(self.student)
+        response = self.client.get(assignment.attachment.url)
+        self.assertEqual(
+            response["Content-Disposition"],
+            "inline; filename*=utf-8''%D0%93%D0%B0%D0%BC%D0%BC%D1%8B%20%D0%B4%D0%BE%20%D0%BC%D0%B0%D0%B6%D0%BE%D1%80.pdf",
+        )
+
+    def test_offload_headers_leave_the_bytes_to_the_web_server(self):
+        self.client.force_login(self.student)
+        with self.settings(MEDIA_OFFLOAD="x-accel", MEDIA_ACCEL_REDIRECT_PREFIX="/protected-media/"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.video_name}")
+        self.assertEqual(response.content, b"")
+
+        with self.settings(MEDIA_OFFLOAD="x-sendfile"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Sendfile"], str(Path(self.media_root) / self.video_name))
+
+    def test_offload_headers_quote_non_ascii_names(self):
+        name = "library/videos/2026/10/Распевка 1.mp4"
+        path = Path(self.media_root) / name
+        path.write_bytes(self.content)
+        LibraryVideo.objects.create(teacher=self.teacher, student=self.student, course=self.course, video=name)
+        self.client.force_login(self.student)
+
+        with self.settings(MEDIA_OFFLOAD="x-accel", MEDIA_ACCEL_REDIRECT_PREFIX="/protected-media/"):
+            response = self.client.get(f"/media/{name}")
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            "/protected-media/library/videos/2026/10/%D0%A0%D0%B0%D1%81%D0%BF%D0%B5%D0%B2%D0%BA%D0%B0%201.mp4",
+        )
+
+        with self.settings(MEDIA_OFFLOAD="x-sendfile"):
+            response = self.client.get(f"/media/{name}")
+        self.assertEqual(response["X-Sendfile"], quote(str(path), safe="/"))
+
+
+def _mp4_box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def _minimal_mp4(*, duration_ms: int, width: int, height: int) -> bytes:
+    mvhd = _mp4_box(b"mvhd", bytes(4) + struct.pack(">IIII", 0, 0, 1000, duration_ms) + bytes(80))
+    tkhd = _mp4_box(b"tkhd", bytes(76) + struct.pack(">II", width << 16, height << 16))
+    moov = _mp4_box(b"moov", mvhd + _mp4_box(b"trak", tkhd))
+    return _mp4_box(b"ftyp", b"isom" + bytes(4)) + _mp4_box(b"mdat", bytes(64)) + moov
+
+
+class VideoProcessingTests(TestCase):
+    def setUp(self):
+        self.media_root_base = Path(__file__).resolve().parents[2] / "tmp_test_media"
+        self.media_root_base.mkdir(exist_ok=True)
+        self.media_root = tempfile.mkdtemp(dir=self.media_root_base)
+        self.addCleanup(lambda: shutil.rmtree(self.media_root, ignore_errors=True))
+        self.enterContext(self.settings(MEDIA_ROOT=self.media_root))
+        # The built-in MP4 reader is what runs without ffmpeg installed.
+        self.enterContext(mock.patch("apps.accounts.video_processing.shutil.which", return_value=None))
+        self.user_model = get_user_model()
+        self.course_type = CourseType.objects.create(name="Ударные")
+        self.teacher = self.user_model.objects.create_user(username="teacher_video", password="pass12345")
+        Profile.objects.create(user=self.teacher, role=Profile.Role.TEACHER)
+        self.student = self.user_model.objects.create_user(username="student_video", password="pass12345")
+        Profile.objects.create(user=self.student, role=Profile.Role.STUDENT)
+        self.course = Course.objects.create(name="Ударные 1", course_type=self.course_type, teacher=self.teacher)
+        Enrollment.objects.create(course=self.course, student=self.student)
+
+    def _upload(self, content: bytes) -> LibraryVideo:
+        return LibraryVideo.objects.create(
+            teacher=self.teacher,
+            student=self.student,
+            course=self.course,
+            title="Грув",
+            video=SimpleUploadedFile("groove.mp4", content, content_type="video/mp4"),
+        )
+
+    def test_worker_stores_metadata_and_updates_library_index(self):
+        video = self._upload(_minimal_mp4(duration_ms=135_000, width=1280, height=720))
+        self.assertEqual(video.processing_job.status, VideoProcessingJob.Status.PENDING)
+
+        self.assertEqual(process_pending_videos(), (1, 0))
+
+        video.refresh_from_db()
+        self.assertEqual((video.duration_seconds, video.width, video.height), (135.0, 1280, 720))
+        self.assertEqual(video.file_size, video.video.size)
+        self.assertEqual(video.processing_job.status, VideoProcessingJob.Status.DONE)
+        item = LibraryItem.objects.get(student=self.student, source_id=video.id)
+        self.assertTrue(item.details.startswith("2:15 · 1280×720 · "))
+        self.assertEqual(process_pending_videos(), (0, 0))
+
+        video.video = SimpleUploadedFile("groove-2.mp4", _minimal_mp4(duration_ms=1000, width=640, height=360))
+        video.save()
+        self.assertEqual(VideoProcessingJob.objects.get(video=video).status, VideoProcessingJob.Status.PENDING)
+
+    def test_failing_job_is_retried_then_marked_failed(self):
+        video = self._upload(b"not a video")
+        with mock.patch("apps.accounts.video_processing.process_video", side_effect=OSError("broken")):
+            for _attempt in range(3):
+                self.assertEqual(process_pending_videos(), (0, 1))
+            self.assertEqual(process_pending_videos(), (0, 0))
+
+        job = VideoProcessingJob.objects.get(video=video)
+        self.assertEqual((job.status, job.attempts), (VideoProcessingJob.Status.FAILED, 3))
+        self.assertIn("broken", job.last_error)
+
+
+class CommunicationThreadTests(TestCase):
+    def setUp(self):
+        self.user_model = get_user_model()
+        course_type = CourseType.objects.create(name="Фортепиано")
+        self.teacher = self._create_user("threads_teacher_a", Profile.Role.TEACHER)
+        self.other_teacher = self._create_user("threads_teacher_b", Profile.Role.TEACHER)
+        self.student = self._create_user("threads_student", Profile.Role.STUDENT)
+        self.parent = self._create_user("threads_parent", Profile.Role.PARENT)
+        self.course = Course.objects.create(name="Фортепиано A", course_type=course_type, teacher=self.teacher)
+        self.other_course = Course.objects.create(name="Сольфеджио", course_type=course_type, teacher=self.other_teacher)
+        Enrollment.objects.create(course=self.course, student=self.student)
+        Enrollment.objects.create(course=self.other_course, student=self.student)
+        ParentChild.objects.create(parent=self.parent, child=self.student)
+
+        today = timezone.localdate()
+        self._assign(self.course, "Гамма", today - timedelta(days=3), AssignmentTarget.Status.DONE)
+        self._assign(self.course, "Этюд", today - timedelta(days=1), AssignmentTarget.Status.TODO)
+        self._assign(self.course, "Пьеса", today - timedelta(days=2), AssignmentTarget.Status.TODO)
+        self._assign(self.other_course, "Диктант", today + timedelta(days=2), AssignmentTarget.Status.TODO)
+
+    def _create_user(self, username: str, role: str):
+        user = self.user_model.objects.create_user(username=username, password="pass12345", first_name=username)
+        Profile.objects.create(user=user, role=role)
+        return user
+
+    def _assign(self, course, title, due_date, status, student=None):
+        assignment = Assignment.objects.create(course=course, title=title, due_date=due_date, created_by=course.teacher)
+        AssignmentTarget.objects.create(assignment=assignment, student=student or self.student, status=status)
+
+    def test_thread_previews_match_nearest_assignment_and_overdue_counts(self):
+        teacher_thread = _teacher_threads(self.teacher)[1]
+        self.assertEqual((teacher_thread["preview"], teacher_thread["unread"]), ("Гамма", 2))
+
+        student_threads = {thread["id"]: thread for thread in _student_threads(self.student)}
+        self.assertEqual(student_threads[f"teacher-{self.teacher.id}"]["preview"], "Пьеса")
+        self.assertEqual(student_threads[f"teacher-{self.teacher.id}"]["unread"], 1)
+        self.assertEqual(student_threads[f"teacher-{self.other_teacher.id}"]["preview"], "Диктант")
+        self.assertEqual(student_threads[f"teacher-{self.other_teacher.id}"]["unread"], 0)
+
+        parent_threads = [thread["id"] for thread in _parent_threads(self.parent)]
+        self.assertEqual(
+            parent_threads,
+            ["admin", f"child-{self.student.id}-teacher-{self.teacher.id}", f"child-{self.student.id}-teacher-{self.other_teacher.id}"],
+        )
+
+    def test_thread_lists_use_fixed_number_of_queries(self):
+        for index in range(5):
+            student = self._create_user(f"threads_extra_{index}", Profile.Role.STUDENT)
+            Enrollment.objects.create(course=self.course, student=student)
+            Enrollment.objects.create(course=self.other_course, student=student)
+            ParentChild.objects.create(parent=self.parent, child=student)
+            self._assign(self.course, f"Этюд {index}", timezone.localdate(), AssignmentTarget.Status.TODO, student)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(len(_teacher_threads(self.teacher)), 7)
+        with self.assertNumQueries(2):
+            _student_threads(self.student)
+        with self.assertNumQueries(3):
+            self.assertEqual(len(_parent_threads(self.parent)), 13)
+
+        self.client.force_login(self.parent)
+        self.assertEqual(self.client.get("/communication/").status_code, 200)
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        user_model = get_user_model()
+        self.teacher = user_model.objects.create_user(username="cache_teacher", password="pass12345")
+        Profile.objects.create(user=self.teacher, role=Profile.Role.TEACHER)
+        self.student = user_model.objects.create_user(username="cache_student", password="pass12345")
+        Profile.objects.create(user=self.student, role=Profile.Role.STUDENT)
+        self.parent = user_model.objects.create_user(username="cache_parent", password="pass12345")
+        Profile.objects.create(user=self.parent, role=Profile.Role.PARENT)
+        ParentChild.objects.create(parent=self.parent, child=self.student)
+        self.course = Course.objects.create(
+            name="Фортепиано",
+            course_type=CourseType.objects.create(name="Фортепиано"),
+            teacher=self.teacher,
+        )
+        Enrollment.objects.create(course=self.course, student=self.student)
+
+    def _dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/dashboard")
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_student_dashboard_is_served_from_cache_until_rows_change(self):
+        self.client.force_login(self.student)
+        _response, cold_queries = self._dashboard_queries()
+        _response, warm_queries = self._dashboard_queries()
+        self.assertLess(warm_queries, cold_queries)
+
+        assessment = Assessment.objects.create(course=self.course, title="Зачёт по гаммам")
+        Grade.objects.create(assessment=assessment, student=self.student, score=90)
+        response, _queries = self._dashboard_queries()
+        self.assertContains(response, "Зачёт по гаммам")
+
+        starts = timezone.now() + timedelta(days=3)
+        Event.objects.create(
+            title="Весенний концерт",
+            event_type=Event.EventType.CONCERT,
+            start_datetime=starts,
+            end_datetime=starts + timedelta(hours=2),
+            created_by=self.teacher,
+        )
+        response, _queries = self._dashboard_queries()
+        self.assertContains(response, "Весенний концерт")
+
+    def test_assignment_and_assessment_edits_refresh_the_dashboard(self):
+        assignment = Assignment.objects.create(
+            course=self.course,
+            title="Этюд Черни",
+            due_date=timezone.localdate() - timedelta(days=1),
+            created_by=self.teacher,
+        )
+        AssignmentTarget.objects.create(assignment=assignment, student=self.student)
+        assessment = Assessment.objects.create(course=self.course, title="Зачёт по гаммам")
+        Grade.objects.create(assessment=assessment, student=self.student, score=90)
+        self.client.force_login(self.student)
+        response, _queries = self._dashboard_queries()
+        self.assertEqual(response.context["homework_status"], "Просрочено")
+        self.assertContains(response, "Зачёт по гаммам")
+
+        assignment.title = "Этюд Гедике"
+        assignment.due_date = timezone.localdate() + timedelta(days=7)
+        assignment.save()
+        assessment.title = "Технический зачёт"
+        assessment.save()
+
+        response, _queries = self._dashboard_queries()
+        self.assertEqual(response.context["homework_status"], "В работе")
+        self.assertTrue(response.context["homework_hint"].startswith("Этюд Гедике"))
+        self.assertContains(response, "Технический зачёт")
+
+    def test_parent_dashboard_warm_request_only_reads_cache(self):
+        self.client.force_login(self.parent)
+        self._dashboard_queries()
+        _response, warm_queries = self._dashboard_queries()
+        # session + user + profile; children and the child's payload come from the cache
+        self.assertEqual(warm_queries, 3)
+
+    def test_child_rename_refreshes_the_parent_dashboard(self):
+        self.client.force_login(self.parent)
+        self._dashboard_queries()
+
+        self.student.first_name = "Алиса"
+        self.student.save(update_fields=["first_name"])
+
+        response, _queries = self._dashboard_queries()
+        self.assertContains(response, "Алиса")
@@ -1,6 +1,7 @@
 # apps/accounts/urls.py
 from django.urls import path
 from .views import (
+    admin_analytics,
     communication_view,
     dashboard,
     library_view,
@@ -15,6 +16,10 @@ from .views import (
     register_view,
     school_life_view,
     teacher_activation_code_create,
+    video_upload_chunk,
+    video_upload_complete,
+    video_upload_start,
+    video_upload_status,
 )
 
 urlpatterns = [
@@ -24,7 +29,12 @@ urlpatterns = [
     path("dashboard", dashboard, name="dashboard"),
     path("communication/", communication_view, name="communication"),
     path("school-life/", school_life_view, name="school_life"),
+    path("analytics/", admin_analytics, name="admin_analytics"),
     path("library/", library_view, name="library"),
+    path("uploads/videos/", video_upload_start, name="video_upload_start"),
+    path("uploads/videos/<uuid:token>/", video_upload_status, name="video_upload_status"),
+    path("uploads/videos/<uuid:token>/chunks/<int:index>/", video_upload_chunk, name="video_upload_chunk"),
+    path("uploads/videos/<uuid:token>/complete/", video_upload_complete, name="video_upload_complete"),
     path("teacher/invite-code/create/", teacher_activation_code_create, name="teacher_activation_code_create"),
     path("profile/", profile_view, name="profile"),
     path("profile/add-course/", profile_add_course, name="profile_add_course"),
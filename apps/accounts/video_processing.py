@@ -0,0 +1,279 @@
+# apps/accounts/video_processing.py
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from django.core.files import File
+from django.utils import timezone
+
+from .models import LibraryVideo, VideoProcessingJob
+
+
+VIDEO_JOB_MAX_ATTEMPTS = 3
+# A RUNNING job older than this belongs to a worker that died and is picked up again.
+VIDEO_JOB_LOCK_TIMEOUT = timedelta(minutes=30)
+VIDEO_THUMBNAIL_WIDTH = 480
+_FFMPEG_TIMEOUT = 120
+_MP4_CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts"}
+
+
+class VideoMetadata(NamedTuple):
+    duration_seconds: Optional[float]
+    width: Optional[int]
+    height: Optional[int]
+    file_size: int
+
+
+def enqueue_video_processing(video_ids) -> None:
+    """(Re)queues the given LibraryVideo ids; a job already queued or running is reset to PENDING."""
+    video_ids = list(video_ids)
+    if not video_ids:
+        return
+    VideoProcessingJob.objects.bulk_create(
+        [VideoProcessingJob(video_id=video_id) for video_id in video_ids],
+        update_conflicts=True,
+        unique_fields=["video"],
+        update_fields=["status", "attempts", "last_error", "locked_at"],
+    )
+
+
+def enqueue_unprocessed_videos() -> int:
+    """Backfill for videos uploaded before the queue existed (or whose job row was lost)."""
+    video_ids = list(
+        LibraryVideo.objects.filter(processed_at__isnull=True, processing_job__isnull=True).values_list("id", flat=True)
+    )
+    enqueue_video_processing(video_ids)
+    return len(video_ids)
+
+
+def claim_next_video_job(*, exclude_ids=()) -> Optional[VideoProcessingJob]:
+    """
+    Moves the oldest runnable job to RUNNING with a conditional UPDATE, so several
+    workers can poll the same table without taking the same job twice.
+    """
+    now = timezone.now()
+    jobs = VideoProcessingJob.objects.exclude(id__in=exclude_ids)
+    while True:
+        job = (
+            jobs.filter(status=VideoProcessingJob.Status.PENDING).order_by("created_at", "id").first()
+        ) or (
+            jobs.filter(status=VideoProcessingJob.Status.RUNNING, locked_at__lt=now - VIDEO_JOB_LOCK_TIMEOUT)
+            .order_by("locked_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        claimed = VideoProcessingJob.objects.filter(id=job.id, status=job.status, locked_at=job.locked_at).update(
+            status=VideoProcessingJob.Status.RUNNING,
+            locked_at=now,
+            attempts=job.attempts + 1,
+            updated_at=now,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def _read_box_header(file, end: int):
+    start = file.tell()
+    if end - start < 8:
+        return None
+    header = file.read(8)
+    if len(header) < 8:
+        return None
+    size, box_type = struct.unpack(">I4s", header)
+    header_size = 8
+    if size == 1:
+        size = struct.unpack(">Q", file.read(8))[0]
+        header_size = 16
+    elif size == 0:
+        size = end - start
+    if size < header_size or start + size > end:
+        return None
+    return box_type, start, start + header_size, start + size
+
+
+def _probe_mp4(path: str) -> tuple[Optional[float], Optional[int], Optional[int]]:
+    """
+    Duration and frame size from the ISO-BMFF boxes (mp4/mov/m4v): mvhd for the duration,
+    the first tkhd with a non-zero size for the resolution. Only box headers are read.
+    """
+    duration = width = height = None
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as file:
+        stack = [file_size]
+        while stack:
+            end = stack[-1]
+            box = _read_box_header(file, end)
+            if box is None:
+                stack.pop()
+                if stack:
+                    file.seek(end)
+                continue
+            box_type, _start, payload, box_end = box
+            if box_type in _MP4_CONTAINER_BOXES:
+                stack.append(box_end)
+                continue
+            if box_type == b"mvhd":
+                version = file.read(1)[0]
+                file.seek(payload + (20 if version == 1 else 12))
+                if version == 1:
+                    timescale, length = struct.unpack(">IQ", file.read(12))
+                else:
+                    timescale, length = struct.unpack(">II", file.read(8))
+                if timescale:
+                    duration = length / timescale
+            elif box_type == b"tkhd" and width is None:
+                version = file.read(1)[0]
+                file.seek(payload + (88 if version == 1 else 76))
+                track_width, track_height = struct.unpack(">II", file.read(8))
+                if track_width and track_height:
+                    width, height = track_width >> 16, track_height >> 16
+            file.seek(box_end)
+    return duration, width, height
+
+
+def _probe_ffprobe(path: str) -> tuple[Optional[float], Optional[int], Optional[int]]:
+    output = subprocess.run(
+        ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+        capture_output=True,
+        check=True,
+        timeout=_FFMPEG_TIMEOUT,
+    ).stdout
+    data = json.loads(output or b"{}")
+    duration = data.get("format", {}).get("duration")
+    stream = next((item for item in data.get("streams", []) if item.get("codec_type") == "video"), {})
+    return (
+        float(duration) if duration else None,
+        stream.get("width") or None,
+        stream.get("height") or None,
+    )
+
+
+def probe_video(path: str) -> VideoMetadata:
+    """ffprobe when it is installed (every container format), the built-in MP4 box reader otherwise."""
+    duration = width = height = None
+    if shutil.which("ffprobe"):
+        duration, width, height = _probe_ffprobe(path)
+    elif Path(path).suffix.lower() in (".mp4", ".mov", ".m4v"):
+        duration, width, height = _probe_mp4(path)
+    return VideoMetadata(duration, width, height, os.path.getsize(path))
+
+
+def _render_thumbnail(path: str, metadata: VideoMetadata) -> Optional[str]:
+    """Poster frame as JPEG in a temp file, or None without ffmpeg."""
+    if not shutil.which("ffmpeg"):
+        return None
+    # One second in, or the middle of very short clips, avoids black fade-in frames.
+    offset = min(1.0, (metadata.duration_seconds or 0) / 2)
+    fd, thumbnail_path = tempfile.mkstemp(suffix=".jpg")
+    os.close(fd)
+    try:
+        command = ["ffmpeg", "-v", "error", "-y", "-ss", f"{offset:.2f}", "-i", path, "-frames:v", "1"]
+        command += ["-vf", f"scale={VIDEO_THUMBNAIL_WIDTH}:-2", thumbnail_path]
+        subprocess.run(
+            command,
+            capture_output=True,
+            check=True,
+            timeout=_FFMPEG_TIMEOUT,
+        )
+    except BaseException:
+        os.remove(thumbnail_path)
+        raise
+    return thumbnail_path
+
+
+def _video_local_path(video: LibraryVideo):
+    """Local path of the video, downloading it to a temp file for storages without one."""
+    try:
+        return video.video.path, False
+    except NotImplementedError:
+        suffix = Path(video.video.name).suffix
+        fd, temp_path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, "wb") as temp_file, video.video.open("rb") as source:
+            for chunk in source.chunks():
+                temp_file.write(chunk)
+        return temp_path, True
+
+
+def process_video(video: LibraryVideo) -> LibraryVideo:
+    """Probes the file, stores the metadata and a poster thumbnail on the row."""
+    path, is_temp = _video_local_path(video)
+    thumbnail_path = None
+    try:
+        metadata = probe_video(path)
+        thumbnail_path = _render_thumbnail(path, metadata)
+        video.duration_seconds = metadata.duration_seconds
+        video.width = metadata.width
+        video.height = metadata.height
+        video.file_size = metadata.file_size
+        video.processed_at = timezone.now()
+        update_fields = ["duration_seconds", "width", "height", "file_size", "processed_at"]
+        if thumbnail_path:
+            if video.thumbnail:
+                video.thumbnail.delete(save=False)
+            with open(thumbnail_path, "rb") as thumbnail:
+                video.thumbnail.save(f"{Path(video.video.name).stem}.jpg", File(thumbnail), save=False)
+            update_fields.append("thumbnail")
+        # update_fields without "video" keeps the save from queueing the job again.
+        video.save(update_fields=update_fields)
+    finally:
+        if is_temp:
+            os.remove(path)
+        if thumbnail_path and os.path.exists(thumbnail_path):
+            os.remove(thumbnail_path)
+    return video
+
+
+def run_video_job(job: VideoProcessingJob) -> bool:
+    """Runs a claimed job; failures go back to PENDING until VIDEO_JOB_MAX_ATTEMPTS, then FAILED."""
+    try:
+        process_video(LibraryVideo.objects.get(id=job.video_id))
+    except Exception as exc:
+        status = (
+            VideoProcessingJob.Status.FAILED
+            if job.attempts >= VIDEO_JOB_MAX_ATTEMPTS
+            else VideoProcessingJob.Status.PENDING
+        )
+        VideoProcessingJob.objects.filter(id=job.id, locked_at=job.locked_at).update(
+            status=status,
+            last_error=f"{type(exc).__name__}: {exc}"[:2000],
+            locked_at=None,
+            updated_at=timezone.now(),
+        )
+        return False
+    # A new file uploaded meanwhile has reset the job to PENDING; the locked_at guard keeps that.
+    VideoProcessingJob.objects.filter(id=job.id, locked_at=job.locked_at).update(
+        status=VideoProcessingJob.Status.DONE,
+        last_error="",
+        locked_at=None,
+        updated_at=timezone.now(),
+    )
+    return True
+
+
+def process_pending_videos(*, limit: Optional[int] = None) -> tuple[int, int]:
+    """
+    Drains the queue (up to limit jobs). A failed job is retried on the next pass,
+    not in the same one. Returns (processed, failed).
+    """
+    processed = failed = 0
+    seen_ids: set[int] = set()
+    while limit is None or processed + failed < limit:
+        job = claim_next_video_job(exclude_ids=seen_ids)
+        if job is None:
+            break
+        seen_ids.add(job.id)
+        if run_video_job(job):
+            processed += 1
+        else:
+            failed += 1
+    return processed, failed
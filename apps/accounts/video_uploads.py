@@ -0,0 +1,284 @@
+# apps/accounts/video_uploads.py
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.homework.models import AssignmentTarget
+from apps.homework.services import sync_submission_video
+
+from .models import LIBRARY_VIDEO_EXTENSIONS, LibraryVideo, VideoUpload
+
+
+VIDEO_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+VIDEO_UPLOAD_MAX_SIZE = 4 * 1024 * 1024 * 1024
+VIDEO_UPLOAD_STALE_AFTER = timedelta(days=2)
+VIDEO_UPLOAD_ASSEMBLY_TIMEOUT = timedelta(minutes=30)
+_STREAM_BLOCK_SIZE = 64 * 1024
+_CHECKSUM_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class VideoUploadError(Exception):
+    """Rejected upload step; the message is shown to the user as is."""
+
+
+class _StagedFile(File):
+    """Assembled staging file: FileSystemStorage moves it into MEDIA_ROOT instead of copying."""
+
+    def temporary_file_path(self) -> str:
+        return self.file.name
+
+
+def normalize_checksum(value: str) -> str:
+    value = (value or "").strip().lower()
+    if value and not _CHECKSUM_RE.match(value):
+        raise VideoUploadError("Некорректная контрольная сумма.")
+    return value
+
+
+def validate_video_upload_request(filename: str, size) -> tuple[str, int]:
+    """Same format rules as validate_library_video_upload, checked before the first chunk is sent."""
+    filename = os.path.basename((filename or "").replace("\\", "/")).strip()[:255]
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension not in LIBRARY_VIDEO_EXTENSIONS:
+        raise VideoUploadError("Загрузите видео в формате mp4, mov, webm или m4v.")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise VideoUploadError("Некорректный размер файла.") from None
+    if size <= 0:
+        raise VideoUploadError("Файл пустой.")
+    if size > VIDEO_UPLOAD_MAX_SIZE:
+        raise VideoUploadError("Файл слишком большой.")
+    return filename, size
+
+
+def start_video_upload(
+    *,
+    owner,
+    purpose,
+    student,
+    course,
+    filename,
+    size,
+    checksum="",
+    title="",
+    assignment_target=None,
+) -> VideoUpload:
+    """
+    Opens an upload session, or returns the unfinished one for the same file
+    so that an interrupted upload continues from the chunks already on disk.
+    """
+    filename, size = validate_video_upload_request(filename, size)
+    checksum = normalize_checksum(checksum)
+    fields = {
+        "owner": owner,
+        "purpose": purpose,
+        "student": student,
+        "course": course,
+        "assignment_target": assignment_target,
+        "filename": filename,
+        "size": size,
+        "checksum": checksum,
+    }
+    upload = VideoUpload.objects.filter(status=VideoUpload.Status.PENDING, **fields).order_by("-id").first()
+    if upload is None:
+        upload = VideoUpload.objects.create(title=title, chunk_size=VIDEO_UPLOAD_CHUNK_SIZE, **fields)
+    elif title and upload.title != title:
+        upload.title = title
+        upload.save(update_fields=["title", "updated_at"])
+    return upload
+
+
+def staging_dir(upload: VideoUpload) -> Path:
+    return Path(settings.VIDEO_UPLOAD_STAGING_ROOT) / str(upload.token)
+
+
+def _chunk_path(upload: VideoUpload, index: int) -> Path:
+    return staging_dir(upload) / f"{index:06d}.part"
+
+
+def expected_chunk_size(upload: VideoUpload, index: int) -> int:
+    if index == upload.chunk_count - 1:
+        return upload.size - index * upload.chunk_size
+    return upload.chunk_size
+
+
+def received_chunks(upload: VideoUpload) -> list[int]:
+    directory = staging_dir(upload)
+    if not directory.is_dir():
+        return []
+    return sorted(int(path.stem) for path in directory.glob("*.part"))
+
+
+def video_upload_progress(upload: VideoUpload) -> dict:
+    chunks = received_chunks(upload) if upload.status != VideoUpload.Status.COMPLETE else []
+    received_bytes = (
+        upload.size
+        if upload.status == VideoUpload.Status.COMPLETE
+        else sum(expected_chunk_size(upload, index) for index in chunks)
+    )
+    return {
+        "id": str(upload.token),
+        "status": upload.status,
+        "size": upload.size,
+        "chunk_size": upload.chunk_size,
+        "chunk_count": upload.chunk_count,
+        "received_chunks": chunks,
+        "received_bytes": received_bytes,
+        "percent": round(received_bytes * 100 / upload.size, 1),
+        "video_id": upload.library_video_id,
+    }
+
+
+def write_video_chunk(upload: VideoUpload, index: int, stream, *, checksum: str) -> None:
+    """
+    Streams one chunk from the request body to its staging file in fixed-size blocks.
+    The chunk must have exactly the expected length and sha256; re-sending a chunk replaces it.
+    """
+    if upload.status != VideoUpload.Status.PENDING:
+        raise VideoUploadError("Загрузка уже завершена.")
+    if not 0 <= index < upload.chunk_count:
+        raise VideoUploadError("Некорректный номер части.")
+    checksum = normalize_checksum(checksum)
+    if not checksum:
+        raise VideoUploadError("Не указана контрольная сумма части.")
+
+    expected = expected_chunk_size(upload, index)
+    directory = staging_dir(upload)
+    directory.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    written = 0
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".chunk-")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            while written <= expected:
+                block = stream.read(min(_STREAM_BLOCK_SIZE, expected + 1 - written))
+                if not block:
+                    break
+                written += len(block)
+                digest.update(block)
+                temp_file.write(block)
+        if written != expected:
+            raise VideoUploadError("Размер части не совпадает.")
+        if digest.hexdigest() != checksum:
+            raise VideoUploadError("Контрольная сумма части не совпадает.")
+        os.replace(temp_path, _chunk_path(upload, index))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    VideoUpload.objects.filter(pk=upload.pk).update(updated_at=timezone.now())
+
+
+def _assemble(upload: VideoUpload) -> str:
+    directory = staging_dir(upload)
+    digest = hashlib.sha256()
+    fd, assembled_path = tempfile.mkstemp(dir=directory, prefix=".assembled-")
+    try:
+        with os.fdopen(fd, "wb") as assembled:
+            for index in range(upload.chunk_count):
+                with open(_chunk_path(upload, index), "rb") as chunk:
+                    while block := chunk.read(_STREAM_BLOCK_SIZE):
+                        digest.update(block)
+                        assembled.write(block)
+        if upload.checksum and digest.hexdigest() != upload.checksum:
+            raise VideoUploadError("Контрольная сумма файла не совпадает, загрузите видео заново.")
+    except BaseException:
+        os.remove(assembled_path)
+        raise
+    return assembled_path
+
+
+def _claim_video_upload(upload: VideoUpload) -> bool:
+    """
+    Moves the upload to ASSEMBLING with a conditional UPDATE, so a repeated or concurrent completion
+    request never assembles into the same staging directory. An assembly left behind by a crashed
+    worker can be claimed again after VIDEO_UPLOAD_ASSEMBLY_TIMEOUT.
+    """
+    now = timezone.now()
+    claimable = Q(status=VideoUpload.Status.PENDING) | Q(
+        status=VideoUpload.Status.ASSEMBLING, updated_at__lt=now - VIDEO_UPLOAD_ASSEMBLY_TIMEOUT
+    )
+    claimed = VideoUpload.objects.filter(claimable, pk=upload.pk).update(
+        status=VideoUpload.Status.ASSEMBLING, updated_at=now
+    )
+    return bool(claimed)
+
+
+def complete_video_upload(upload: VideoUpload) -> LibraryVideo:
+    """
+    Reassembles the staged chunks in order, verifies the whole-file checksum
+    and attaches the result to a LibraryVideo (library upload or homework answer).
+    """
+    if upload.status == VideoUpload.Status.COMPLETE:
+        return upload.library_video
+    missing = upload.chunk_count - len(received_chunks(upload))
+    if missing:
+        raise VideoUploadError(f"Не загружено частей: {missing}.")
+    if not _claim_video_upload(upload):
+        upload.refresh_from_db()
+        if upload.status == VideoUpload.Status.COMPLETE:
+            return upload.library_video
+        raise VideoUploadError("Видео уже сохраняется, подождите.")
+
+    assembled_path = None
+    try:
+        assembled_path = _assemble(upload)
+        with transaction.atomic():
+            with open(assembled_path, "rb") as assembled:
+                video_file = _StagedFile(assembled, name=upload.filename)
+                if upload.purpose == VideoUpload.Purpose.SUBMISSION:
+                    target = AssignmentTarget.objects.select_related(
+                        "assignment", "assignment__course", "assignment__created_by", "student"
+                    ).get(pk=upload.assignment_target_id)
+                    video = sync_submission_video(target=target, video_file=video_file)
+                    # The comment stays as the student last submitted it: only submit_assignment writes it.
+                    target.status = AssignmentTarget.Status.DONE
+                    target.save(update_fields=["status", "updated_at"])
+                else:
+                    video = LibraryVideo(
+                        teacher=upload.owner,
+                        student=upload.student,
+                        course=upload.course,
+                        title=upload.title,
+                    )
+                    video.video.save(upload.filename, video_file, save=False)
+                    video.save()
+            upload.status = VideoUpload.Status.COMPLETE
+            upload.library_video = video
+            upload.save(update_fields=["status", "library_video", "updated_at"])
+    except BaseException:
+        # The chunks are still staged: let the client retry the completion.
+        VideoUpload.objects.filter(pk=upload.pk, status=VideoUpload.Status.ASSEMBLING).update(
+            status=VideoUpload.Status.PENDING, updated_at=timezone.now()
+        )
+        upload.status = VideoUpload.Status.PENDING
+        raise
+    finally:
+        if assembled_path and os.path.exists(assembled_path):
+            os.remove(assembled_path)
+    shutil.rmtree(staging_dir(upload), ignore_errors=True)
+    return video
+
+
+def purge_stale_video_uploads(*, now=None) -> int:
+    """Drops unfinished uploads untouched for VIDEO_UPLOAD_STALE_AFTER together with their chunks."""
+    cutoff = (now or timezone.now()) - VIDEO_UPLOAD_STALE_AFTER
+    unfinished = (VideoUpload.Status.PENDING, VideoUpload.Status.ASSEMBLING)
+    stale = list(VideoUpload.objects.filter(status__in=unfinished, updated_at__lt=cutoff))
+    for upload in stale:
+        shutil.rmtree(staging_dir(upload), ignore_errors=True)
+    VideoUpload.objects.filter(id__in=[upload.id for upload in stale]).delete()
+    return len(stale)
@@ -1,5 +1,6 @@
 # apps/accounts/views.py
-from datetime import datetime, time, timedelta
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple
 from urllib.parse import urlencode
 
 from django.contrib import messages
@@ -7,19 +8,23 @@ from django.contrib.auth import get_user_model, login, logout, update_session_au
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.db import IntegrityError, transaction
-from django.db.models import Q
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, JsonResponse
 from django.shortcuts import redirect, render
 from django.utils import timezone
 from django.views.decorators.cache import never_cache
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
 
 from apps.gradebook.models import Grade
 from apps.homework.models import AssignmentTarget
 from apps.lessons.models import Lesson
 from apps.schedule.models import Event
 from apps.school.models import ParentChild, Course, Enrollment
+from apps.school.services import get_school_stats_snapshot, refresh_school_stats_snapshot
 from apps.school.utils import get_teacher_students
 
+from .dashboard_cache import get_parent_children_links, get_student_dashboard_payload
 from .decorators import role_required
 from .forms import (
     ActivationCodeApplyForm,
@@ -30,10 +35,25 @@ from .forms import (
     RegistrationForm,
     StudentProfileDetailsForm,
     UsernameChangeForm,
+    resolve_library_video_course,
 )
-from .library_service import CATEGORY_VIDEO, LIBRARY_CATEGORIES, build_library_items_for_student
-from .models import ActivationCode, Profile
+from .library_service import (
+    CATEGORY_VIDEO,
+    LIBRARY_CATEGORIES,
+    library_category_counts,
+    library_items_for_student,
+    paginate_library_items,
+    search_library_items,
+)
+from .models import ActivationCode, LibraryItem, Profile, VideoUpload
 from .utils import get_user_display_name
+from .video_uploads import (
+    VideoUploadError,
+    complete_video_upload,
+    start_video_upload,
+    video_upload_progress,
+    write_video_chunk,
+)
 
 
 DEFAULT_SCHOOL_LIFE_ITEMS = [
@@ -309,7 +329,6 @@ def _student_dashboard_payload(student, *, viewer_role: str = Profile.Role.STUDE
 
     return {
         "next_lesson": next_lesson,
-        "next_lesson_countdown": _countdown_parts(next_lesson["starts_at"]) if next_lesson else {"days": 0, "hours": 0, "minutes": 0},
         "homework_status": homework_status,
         "homework_hint": homework_hint,
         "progress_points": progress_points,
@@ -318,37 +337,107 @@ def _student_dashboard_payload(student, *, viewer_role: str = Profile.Role.STUDE
     }
 
 
-def _teacher_threads(user):
+def _student_dashboard_context(student, *, viewer_role: str) -> dict:
+    payload = get_student_dashboard_payload(student, viewer_role=viewer_role, build=_student_dashboard_payload)
+    next_lesson = payload["next_lesson"]
+    # The countdown is derived on every request, so the cached payload never shows a stale timer.
+    return {
+        **payload,
+        "next_lesson_countdown": _countdown_parts(next_lesson["starts_at"]) if next_lesson else {"days": 0, "hours": 0, "minutes": 0},
+    }
+
+
+def _dashboard_children_links(parent) -> list:
+    return list(
+        ParentChild.objects.filter(parent=parent)
+        .select_related("child", "child__profile")
+        .order_by("child__first_name", "child__last_name", "child__username")
+    )
+
+
+class _ThreadSummary(NamedTuple):
+    title: str
+    due_date: date
+    overdue: int
+
+
+def _assignment_thread_summaries(*, student_ids, teacher_ids=None, todo_only: bool = False) -> dict:
+    """
+    {(student_id, teacher_id): _ThreadSummary} for all pairs at once: the assignment with the
+    nearest due date and the number of overdue TODO targets, computed with window functions
+    in a single query instead of two lookups per thread.
+    """
     today = timezone.localdate()
+    targets = AssignmentTarget.objects.filter(student_id__in=student_ids)
+    if teacher_ids is not None:
+        targets = targets.filter(assignment__course__teacher_id__in=teacher_ids)
+    if todo_only:
+        targets = targets.filter(status=AssignmentTarget.Status.TODO)
+    partition = [F("student_id"), F("assignment__course__teacher_id")]
+    rows = (
+        targets.annotate(
+            thread_teacher_id=F("assignment__course__teacher_id"),
+            thread_row=Window(
+                RowNumber(),
+                partition_by=partition,
+                order_by=[F("assignment__due_date").asc(), F("id").asc()],
+            ),
+            thread_overdue=Window(
+                Sum(
+                    Case(
+                        When(status=AssignmentTarget.Status.TODO, assignment__due_date__lt=today, then=Value(1)),
+                        default=Value(0),
+                        output_field=IntegerField(),
+                    )
+                ),
+                partition_by=partition,
+            ),
+        )
+        .filter(thread_row=1)
+        .values_list("student_id", "thread_teacher_id", "assignment__title", "assignment__due_date", "thread_overdue")
+    )
+    return {
+        (student_id, teacher_id): _ThreadSummary(title, due_date, overdue or 0)
+        for student_id, teacher_id, title, due_date, overdue in rows
+    }
+
+
+def _student_teacher_pairs(student_ids) -> dict:
+    """{student_id: [teacher, ...]} ordered by teacher name, from one enrollment query."""
+    teachers_by_student = {}
+    enrollments = (
+        Enrollment.objects.filter(student_id__in=student_ids, course__teacher__profile__role=Profile.Role.TEACHER)
+        .select_related("course__teacher")
+        .order_by("course__teacher__first_name", "course__teacher__last_name", "course__teacher__username", "course__teacher_id")
+    )
+    for enrollment in enrollments:
+        teachers = teachers_by_student.setdefault(enrollment.student_id, [])
+        teacher = enrollment.course.teacher
+        if all(existing.id != teacher.id for existing in teachers):
+            teachers.append(teacher)
+    return teachers_by_student
+
+
+def _teacher_threads(user):
     threads = []
-    students = (
+    students = list(
         get_user_model()
         .objects.filter(enrollments__course__teacher=user, profile__role=Profile.Role.STUDENT)
         .select_related("profile")
         .distinct()
         .order_by("first_name", "last_name", "username")[:20]
     )
+    summaries = _assignment_thread_summaries(student_ids=[student.id for student in students], teacher_ids=[user.id])
     for student in students:
-        next_target = (
-            AssignmentTarget.objects.filter(student=student, assignment__course__teacher=user)
-            .select_related("assignment")
-            .order_by("assignment__due_date")
-            .first()
-        )
-        overdue = AssignmentTarget.objects.filter(
-            student=student,
-            assignment__course__teacher=user,
-            status=AssignmentTarget.Status.TODO,
-            assignment__due_date__lt=today,
-        ).count()
-        preview = next_target.assignment.title if next_target else "Учебных обновлений пока нет."
+        summary = summaries.get((student.id, user.id))
+        preview = summary.title if summary else "Учебных обновлений пока нет."
         threads.append(
             {
                 "id": f"student-{student.id}",
                 "title": _display_name(student),
                 "subtitle": student.profile.get_cycle_display(),
                 "preview": preview,
-                "unread": overdue,
+                "unread": summary.overdue if summary else 0,
                 "time_label": "Сегодня",
             }
         )
@@ -368,30 +457,20 @@ def _teacher_threads(user):
 
 
 def _student_threads(user):
-    today = timezone.localdate()
     threads = []
-    teachers = (
-        get_user_model()
-        .objects.filter(teaching_courses__enrollments__student=user, profile__role=Profile.Role.TEACHER)
-        .distinct()
-        .order_by("first_name", "last_name", "username")
-    )
+    teachers = _student_teacher_pairs([user.id]).get(user.id, [])
+    summaries = _assignment_thread_summaries(student_ids=[user.id], todo_only=True)
     for teacher in teachers:
-        due = (
-            AssignmentTarget.objects.filter(student=user, assignment__course__teacher=teacher, status=AssignmentTarget.Status.TODO)
-            .select_related("assignment")
-            .order_by("assignment__due_date")
-            .first()
-        )
-        preview = due.assignment.title if due else "Новых заданий нет."
-        is_overdue = bool(due and due.assignment.due_date < today)
+        due = summaries.get((user.id, teacher.id))
+        preview = due.title if due else "Новых заданий нет."
         threads.append(
             {
                 "id": f"teacher-{teacher.id}",
                 "title": _display_name(teacher),
                 "subtitle": "Преподаватель",
                 "preview": preview,
-                "unread": 1 if is_overdue else 0,
+                # The nearest TODO is overdue exactly when any TODO of the thread is.
+                "unread": 1 if due and due.overdue else 0,
                 "time_label": "Сегодня",
             }
         )
@@ -410,36 +489,21 @@ def _student_threads(user):
 
 
 def _parent_threads(user):
-    today = timezone.localdate()
     threads = []
-    children_links = ParentChild.objects.filter(parent=user).select_related("child")
-    for link in children_links:
-        child = link.child
-        teachers = (
-            get_user_model()
-            .objects.filter(teaching_courses__enrollments__student=child, profile__role=Profile.Role.TEACHER)
-            .distinct()
-            .order_by("first_name", "last_name", "username")
-        )
-        for teacher in teachers:
-            due = (
-                AssignmentTarget.objects.filter(
-                    student=child,
-                    assignment__course__teacher=teacher,
-                    status=AssignmentTarget.Status.TODO,
-                )
-                .select_related("assignment")
-                .order_by("assignment__due_date")
-                .first()
-            )
-            overdue = 1 if due and due.assignment.due_date < today else 0
+    children = [link.child for link in ParentChild.objects.filter(parent=user).select_related("child")]
+    child_ids = [child.id for child in children]
+    teachers_by_child = _student_teacher_pairs(child_ids)
+    summaries = _assignment_thread_summaries(student_ids=child_ids, todo_only=True)
+    for child in children:
+        for teacher in teachers_by_child.get(child.id, []):
+            due = summaries.get((child.id, teacher.id))
             threads.append(
                 {
                     "id": f"child-{child.id}-teacher-{teacher.id}",
                     "title": f"{_display_name(teacher)} / {_display_name(child)}",
                     "subtitle": "Преподаватель и родитель",
-                    "preview": due.assignment.title if due else "Новых задач нет.",
-                    "unread": overdue,
+                    "preview": due.title if due else "Новых задач нет.",
+                    "unread": 1 if due and due.overdue else 0,
                     "time_label": "Сегодня",
                 }
             )
@@ -574,15 +638,15 @@ def dashboard(request):
     today = timezone.localdate()
 
     if profile.role == Profile.Role.ADMIN:
-        user_model = get_user_model()
+        snapshot = get_school_stats_snapshot()
         ctx.update(
             {
                 "dashboard_mode": "admin",
                 "dashboard_stats": [
-                    {"label": "Педагоги", "value": user_model.objects.filter(profile__role=Profile.Role.TEACHER).count()},
-                    {"label": "Ученики", "value": user_model.objects.filter(profile__role=Profile.Role.STUDENT).count()},
-                    {"label": "Курсы", "value": Course.objects.count()},
-                    {"label": "События (месяц)", "value": Event.objects.filter(start_datetime__month=today.month).count()},
+                    {"label": "Педагоги", "value": snapshot.teachers_count},
+                    {"label": "Ученики", "value": snapshot.students_count},
+                    {"label": "Курсы", "value": snapshot.courses_count},
+                    {"label": "События (месяц)", "value": snapshot.events_this_month},
                 ],
                 "announcements": _announcements_for_events(
                     Event.objects.exclude(event_type=Event.EventType.LESSON),
@@ -622,15 +686,11 @@ def dashboard(request):
         return render(request, "accounts/dashboard.html", ctx)
 
     if profile.role == Profile.Role.STUDENT:
-        ctx.update({"dashboard_mode": "student", **_student_dashboard_payload(request.user, viewer_role=Profile.Role.STUDENT)})
+        ctx.update({"dashboard_mode": "student", **_student_dashboard_context(request.user, viewer_role=Profile.Role.STUDENT)})
         return render(request, "accounts/dashboard.html", ctx)
 
     if profile.role == Profile.Role.PARENT:
-        children_links = list(
-            ParentChild.objects.filter(parent=request.user)
-            .select_related("child", "child__profile")
-            .order_by("child__first_name", "child__last_name", "child__username")
-        )
+        children_links = get_parent_children_links(request.user, build=_dashboard_children_links)
         selected_child = None
         selected_child_param = request.GET.get("student")
         if selected_child_param:
@@ -649,7 +709,7 @@ def dashboard(request):
             }
         )
         if selected_child:
-            ctx.update(_student_dashboard_payload(selected_child, viewer_role=Profile.Role.PARENT))
+            ctx.update(_student_dashboard_context(selected_child, viewer_role=Profile.Role.PARENT))
         else:
             ctx.update(_empty_student_dashboard_payload())
         return render(request, "accounts/dashboard.html", ctx)
@@ -657,6 +717,32 @@ def dashboard(request):
     return render(request, "accounts/dashboard.html", ctx)
 
 
+@role_required(Profile.Role.ADMIN)
+def admin_analytics(request):
+    if request.method == "POST":
+        refresh_school_stats_snapshot()
+        messages.success(request, "Статистика пересчитана.")
+        return redirect("/analytics/")
+
+    snapshot = get_school_stats_snapshot()
+    attendance_rate = snapshot.attendance_rate
+    return render(
+        request,
+        "accounts/analytics.html",
+        {
+            "snapshot": snapshot,
+            "stats": [
+                {"label": "Педагоги", "value": snapshot.teachers_count},
+                {"label": "Ученики", "value": snapshot.students_count},
+                {"label": "Курсы", "value": snapshot.courses_count},
+                {"label": "События (месяц)", "value": snapshot.events_this_month},
+                {"label": "Домашние задания к сроку", "value": snapshot.pending_homework},
+                {"label": "Посещаемость (месяц)", "value": f"{attendance_rate}%" if attendance_rate is not None else "—"},
+            ],
+        },
+    )
+
+
 @login_required
 def communication_view(request):
     role = request.user.profile.role
@@ -721,7 +807,7 @@ def library_view(request):
     selected_category = (request.GET.get("category") or "").strip()
     selected_student = None
     student_choices = []
-    resources = []
+    resources = LibraryItem.objects.none()
     show_upload_form = False
     upload_toggle_url = ""
     upload_cancel_url = ""
@@ -746,7 +832,7 @@ def library_view(request):
                 .order_by("parent__first_name", "parent__last_name", "parent__username")
                 .values_list("parent__first_name", "parent__last_name", "parent__username")
             )
-            resources = build_library_items_for_student(selected_student, teacher=request.user)
+            resources = library_items_for_student(selected_student, teacher=request.user)
             upload_requested = request.GET.get("upload") == "1"
             is_upload_submission = request.method == "POST" and request.POST.get("upload_video") == "1"
             show_upload_form = upload_requested or is_upload_submission
@@ -784,7 +870,7 @@ def library_view(request):
 
     elif role == Profile.Role.STUDENT:
         selected_student = request.user
-        resources = build_library_items_for_student(selected_student)
+        resources = library_items_for_student(selected_student)
 
     elif role == Profile.Role.PARENT:
         children_links = list(
@@ -802,7 +888,7 @@ def library_view(request):
                 (child for child in children if str(child.id) == str(selected_student_id)),
                 children[0],
             )
-            resources = build_library_items_for_student(selected_student)
+            resources = library_items_for_student(selected_student)
 
     elif role == Profile.Role.ADMIN:
         user_model = get_user_model()
@@ -820,30 +906,21 @@ def library_view(request):
                 (student for student in all_students if str(student.id) == str(selected_student_id)),
                 all_students[0],
             )
-            resources = build_library_items_for_student(selected_student)
+            resources = library_items_for_student(selected_student)
 
-    if search_query:
-        lowered = search_query.lower()
-        resources = [
-            row
-            for row in resources
-            if lowered in row["title"].lower()
-            or lowered in row["category"].lower()
-            or lowered in row["course_name"].lower()
-            or lowered in row["source"].lower()
-            or lowered in row["uploaded_by"].lower()
-        ]
-
-    category_counts = {category: 0 for category in LIBRARY_CATEGORIES}
-    for row in resources:
-        if row["category"] in category_counts:
-            category_counts[row["category"]] += 1
-    all_count = len(resources)
+    resources = search_library_items(resources, search_query)
+    category_counts = library_category_counts(resources)
+    all_count = sum(category_counts.values())
 
     if selected_category and selected_category in LIBRARY_CATEGORIES:
-        resources = [row for row in resources if row["category"] == selected_category]
+        resources = resources.filter(category=selected_category)
     else:
         selected_category = ""
+    page = paginate_library_items(
+        resources,
+        after=request.GET.get("after") or "",
+        before=request.GET.get("before") or "",
+    )
 
     base_params = {}
     if search_query:
@@ -876,12 +953,18 @@ def library_view(request):
             }
         )
 
+    page_params = dict(base_params)
+    if selected_category:
+        page_params["category"] = selected_category
+
     return render(
         request,
         "accounts/library.html",
         {
             "search_query": search_query,
-            "resources": resources,
+            "resources": page.items,
+            "page": page,
+            "page_query": urlencode(page_params),
             "student_choices": student_choices,
             "selected_student": selected_student,
             "selected_category": selected_category,
@@ -899,6 +982,108 @@ def library_view(request):
     )
 
 
+def _video_upload_error(message: str, status: int = 400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def _get_video_upload_or_404(request, token) -> VideoUpload:
+    upload = VideoUpload.objects.filter(token=token, owner=request.user).first()
+    if upload is None:
+        raise Http404()
+    return upload
+
+
+@require_POST
+@role_required(Profile.Role.TEACHER, Profile.Role.STUDENT)
+def video_upload_start(request):
+    """
+    Opens (or resumes) a chunked video upload: a teacher's library video for one of their students,
+    or a student's answer to an assignment. Responds with the chunk layout and the chunks already received.
+    """
+    purpose = request.POST.get("purpose")
+    title = (request.POST.get("title") or "").strip()[:200]
+    assignment_target = None
+    if purpose == VideoUpload.Purpose.LIBRARY and request.user.profile.role == Profile.Role.TEACHER:
+        student = get_teacher_students(request.user).filter(id=request.POST.get("student") or 0).first()
+        if student is None:
+            return _video_upload_error("Ученик не найден.", status=404)
+        course = resolve_library_video_course(request.user, student)
+        if course is None:
+            return _video_upload_error("Не удалось определить курс для выбранного ученика.")
+    elif purpose == VideoUpload.Purpose.SUBMISSION and request.user.profile.role == Profile.Role.STUDENT:
+        assignment_target = (
+            AssignmentTarget.objects.select_related("assignment", "assignment__course")
+            .filter(id=request.POST.get("target") or 0, student=request.user)
+            .first()
+        )
+        if assignment_target is None:
+            return _video_upload_error("Задание не найдено.", status=404)
+        student = request.user
+        course = assignment_target.assignment.course
+    else:
+        return _video_upload_error("Некорректный запрос.")
+
+    try:
+        upload = start_video_upload(
+            owner=request.user,
+            purpose=purpose,
+            student=student,
+            course=course,
+            assignment_target=assignment_target,
+            filename=request.POST.get("filename"),
+            size=request.POST.get("size"),
+            checksum=request.POST.get("checksum") or "",
+            title=title,
+        )
+    except VideoUploadError as exc:
+        return _video_upload_error(str(exc))
+    return JsonResponse(video_upload_progress(upload))
+
+
+@require_GET
+@role_required(Profile.Role.TEACHER, Profile.Role.STUDENT)
+def video_upload_status(request, token):
+    return JsonResponse(video_upload_progress(_get_video_upload_or_404(request, token)))
+
+
+@require_http_methods(["PUT"])
+@role_required(Profile.Role.TEACHER, Profile.Role.STUDENT)
+def video_upload_chunk(request, token, index: int):
+    """Raw chunk body with its sha256 in X-Chunk-SHA256; streamed to disk, never read into memory whole."""
+    upload = _get_video_upload_or_404(request, token)
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > upload.chunk_size:
+        return _video_upload_error("Часть слишком большая.", status=413)
+    try:
+        write_video_chunk(upload, index, request, checksum=request.headers.get("X-Chunk-SHA256", ""))
+    except VideoUploadError as exc:
+        return _video_upload_error(str(exc))
+    return JsonResponse(video_upload_progress(upload))
+
+
+@require_POST
+@role_required(Profile.Role.TEACHER, Profile.Role.STUDENT)
+def video_upload_complete(request, token):
+    upload = _get_video_upload_or_404(request, token)
+    try:
+        video = complete_video_upload(upload)
+    except VideoUploadError as exc:
+        return _video_upload_error(str(exc))
+    upload.refresh_from_db()
+
+    if upload.purpose == VideoUpload.Purpose.SUBMISSION:
+        messages.success(request, "Ответ по заданию сохранён.")
+        redirect_url = "/assignments/"
+    else:
+        uploaded_title = video.title.strip() or video.video.name.rsplit("/", 1)[-1]
+        messages.success(request, f"Видео «{uploaded_title}» загружено для ученика и его родителя.")
+        redirect_url = _build_library_url(student=upload.student_id, category=CATEGORY_VIDEO)
+    return JsonResponse({**video_upload_progress(upload), "redirect_url": redirect_url})
+
+
 @role_required(Profile.Role.TEACHER)
 def teacher_activation_code_create(request):
     form = ActivationCodeCreateForm(request.POST or None, teacher_user=request.user)
@@ -980,8 +1165,9 @@ def profile_add_course(request):
     if request.method == "POST" and form.is_valid():
         try:
             with transaction.atomic():
+                # of=("self",): PostgreSQL cannot lock the nullable side of the target_student outer join.
                 activation_code = (
-                    ActivationCode.objects.select_for_update()
+                    ActivationCode.objects.select_for_update(of=("self",))
                     .select_related("course", "target_student", "course__course_type", "course__teacher")
                     .get(code=form.cleaned_data["code"])
                 )
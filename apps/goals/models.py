@@ -22,6 +22,7 @@ class Goal(models.Model):
 
     class Meta:
         ordering = ["month", "student__username"]
+        indexes = [models.Index(fields=["student", "month"], name="goal_student_month_idx")]
 
     def __str__(self) -> str:
         student_name = (self.student.get_full_name() or "").strip() or "Без имени"
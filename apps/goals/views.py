@@ -9,10 +9,11 @@ from django.views.decorators.http import require_POST
 from urllib.parse import urlencode
 
 from apps.accounts.models import Profile
-from apps.school.models import Course, ParentChild
+from apps.school.models import ParentChild
 from apps.text_limits import TEXT_CHAR_LIMIT, char_limit_error, exceeds_char_limit
 from .forms import GoalForm
 from .models import Goal
+from apps.school.access import get_teacher_access
 from apps.school.utils import get_teacher_student_or_404
 
 User = get_user_model()
@@ -24,12 +25,7 @@ GOAL_STATUS_PREFIX = "__status__:"
 
 
 def _teacher_student_ids(user):
-    teacher_courses = Course.objects.filter(teacher=user)
-    return set(
-        User.objects.filter(enrollments__course__in=teacher_courses)
-        .values_list("id", flat=True)
-        .distinct()
-    )
+    return get_teacher_access(user).taught_student_ids
 
 
 def _can_delete_goal(user, role: str, goal: Goal, teacher_student_ids: set[int]) -> bool:
@@ -154,15 +150,8 @@ def goal_list(request):
         students = User.objects.filter(id__in=child_ids).select_related("profile")
         goals = Goal.objects.filter(student__in=child_ids).select_related("student", "teacher")
     elif profile.role == Profile.Role.TEACHER:
-        teacher_courses = Course.objects.filter(teacher=request.user)
-        teacher_students = set(
-            User.objects.filter(enrollments__course__in=teacher_courses).values_list("id", flat=True).distinct()
-        )
-        students = (
-            User.objects.filter(enrollments__course__in=teacher_courses)
-            .select_related("profile")
-            .distinct()
-        )
+        teacher_students = _teacher_student_ids(request.user)
+        students = User.objects.filter(id__in=teacher_students).select_related("profile")
         goals = Goal.objects.filter(student__in=students).select_related("student", "teacher")
     elif profile.role == Profile.Role.ADMIN:
         students = User.objects.filter(profile__role=Profile.Role.STUDENT).select_related("profile")
@@ -368,12 +357,7 @@ def goal_create(request):
     students = User.objects.none()
 
     if profile.role == Profile.Role.TEACHER:
-        teacher_courses = Course.objects.filter(teacher=request.user)
-        students = (
-            User.objects.filter(enrollments__course__in=teacher_courses)
-            .select_related("profile")
-            .distinct()
-        )
+        students = User.objects.filter(id__in=_teacher_student_ids(request.user)).select_related("profile")
     elif profile.role == Profile.Role.ADMIN:
         students = User.objects.filter(profile__role=Profile.Role.STUDENT).select_related("profile")
 
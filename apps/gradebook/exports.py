@@ -0,0 +1,220 @@
+# apps/gradebook/exports.py
+from __future__ import annotations
+
+import csv
+import re
+import zipfile
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable, Iterator
+from xml.sax.saxutils import escape
+
+from apps.accounts.utils import get_user_display_name
+from apps.school.models import Course, Enrollment
+
+from .models import Assessment, Grade
+from .services import compute_course_average_percents
+
+
+EXPORT_FORMATS = ("csv", "xlsx")
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_ITERATOR_CHUNK_SIZE = 500
+_XLSX_ROWS_PER_CHUNK = 200
+_XML_ILLEGAL_CHARS_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+_XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+
+class _EchoBuffer:
+    """csv.writer target that hands each formatted line back instead of storing it."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+class _ChunkSink:
+    """Unseekable file object for zipfile; written bytes are drained into the response."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        return None
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def format_export_score(score) -> str:
+    if score is None:
+        return ""
+    return format(Decimal(score).normalize(), "f")
+
+
+def format_export_percent(percent) -> str:
+    if percent is None:
+        return ""
+    return str(Decimal(percent).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP))
+
+
+def _csv_cell(value):
+    # Spreadsheet apps run a CSV cell starting with one of these as a formula; XLSX cells are inline strings.
+    if isinstance(value, str) and value.startswith(_CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_csv(rows: Iterable[list]) -> Iterator[str]:
+    writer = csv.writer(_EchoBuffer())
+    # BOM so that spreadsheet apps detect UTF-8 for Cyrillic names.
+    yield "\ufeff"
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+def _xlsx_cell(value) -> str:
+    if isinstance(value, (int, Decimal)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = _XML_ILLEGAL_CHARS_RE.sub("", str(value if value is not None else ""))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def iter_xlsx(rows: Iterable[list], *, sheet_name: str = "Оценки") -> Iterator[bytes]:
+    """
+    Minimal single-sheet XLSX written straight into the response: the zip is produced
+    on an unseekable sink (data descriptors), so only a few hundred rows are ever buffered.
+    """
+    sink = _ChunkSink()
+    safe_sheet_name = escape(re.sub(r"[\[\]:*?/\\]", " ", sheet_name)[:31] or "Sheet1", {'"': "&quot;"})
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr(
+            "xl/workbook.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{safe_sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+            "</workbook>",
+        )
+        yield sink.drain()
+
+        with archive.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for index, row in enumerate(rows, start=1):
+                sheet.write(("<row>" + "".join(_xlsx_cell(value) for value in row) + "</row>").encode("utf-8"))
+                if index % _XLSX_ROWS_PER_CHUNK == 0:
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+def _numeric_or_text(value: str, *, numeric: bool):
+    if numeric and value:
+        return Decimal(value)
+    return value
+
+
+def iter_course_grade_rows(course: Course, *, cycle: str = "", numeric: bool = False) -> Iterator[list]:
+    """
+    Student × assessment matrix of a course. Enrollments and grades are read through two
+    server-side cursors with the same ordering and merged row by row.
+    """
+    assessments = list(Assessment.objects.filter(course=course).order_by("id"))
+    column_index = {assessment.id: index for index, assessment in enumerate(assessments)}
+    yield ["Ученик", "Логин", "Цикл"] + [assessment.title for assessment in assessments] + ["Средний %"]
+
+    averages = compute_course_average_percents(course)
+    student_order = ("student__first_name", "student__last_name", "student__username", "student_id")
+    enrollments = Enrollment.objects.filter(course=course).select_related("student", "student__profile")
+    grades = Grade.objects.filter(assessment__course=course, student__enrollments__course=course)
+    if cycle:
+        enrollments = enrollments.filter(student__profile__cycle=cycle)
+        grades = grades.filter(student__profile__cycle=cycle)
+    grade_rows = iter(
+        grades.order_by(*student_order, "assessment_id")
+        .values_list("student_id", "assessment_id", "score")
+        .iterator(chunk_size=EXPORT_ITERATOR_CHUNK_SIZE)
+    )
+    pending = next(grade_rows, None)
+
+    for enrollment in enrollments.order_by(*student_order).iterator(chunk_size=EXPORT_ITERATOR_CHUNK_SIZE):
+        student = enrollment.student
+        scores = [""] * len(assessments)
+        while pending is not None and pending[0] == student.id:
+            _student_id, assessment_id, score = pending
+            scores[column_index[assessment_id]] = _numeric_or_text(format_export_score(score), numeric=numeric)
+            pending = next(grade_rows, None)
+        profile = getattr(student, "profile", None)
+        yield [
+            get_user_display_name(student),
+            student.username,
+            profile.get_cycle_display() if profile and profile.cycle else "",
+            *scores,
+            _numeric_or_text(format_export_percent(averages.get(student.id)), numeric=numeric),
+        ]
+
+
+def iter_school_grade_rows(*, numeric: bool = False) -> Iterator[list]:
+    """Long-format export of every grade in the school, one row per grade."""
+    yield ["Курс", "Ученик", "Логин", "Цикл", "Контрольная точка", "Тип", "Макс.", "Вес", "Результат", "Комментарий"]
+    grades = (
+        Grade.objects.select_related("assessment", "assessment__course", "student", "student__profile")
+        .order_by("assessment__course__name", "assessment__course_id", "student__username", "assessment_id")
+        .iterator(chunk_size=EXPORT_ITERATOR_CHUNK_SIZE)
+    )
+    for grade in grades:
+        assessment = grade.assessment
+        profile = getattr(grade.student, "profile", None)
+        yield [
+            assessment.course.name,
+            get_user_display_name(grade.student),
+            grade.student.username,
+            profile.get_cycle_display() if profile and profile.cycle else "",
+            assessment.title,
+            assessment.get_assessment_type_display(),
+            _numeric_or_text(format_export_score(assessment.max_score), numeric=numeric),
+            _numeric_or_text(format_export_score(assessment.weight), numeric=numeric),
+            _numeric_or_text(format_export_score(grade.score), numeric=numeric),
+            grade.comment,
+        ]
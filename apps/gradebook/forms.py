@@ -2,7 +2,22 @@
 # Minimal demo: we do simple POST parsing on the teacher page (no ModelForm needed).
 from django import forms
 
+from .models import Assessment
+
 
 class DummyGradeEntryForm(forms.Form):
     """Placeholder to keep structure; not used directly."""
     pass
+
+
+class GradeImportForm(forms.Form):
+    file = forms.FileField(
+        label="CSV-файл",
+        help_text="Столбцы: username (Логин), assessment (Контрольная точка), score (Результат), comment (Комментарий).",
+    )
+    create_missing = forms.BooleanField(label="Создать недостающие контрольные точки", required=False)
+    assessment_type = forms.ChoiceField(
+        label="Тип новых контрольных точек",
+        choices=Assessment.AssessmentType.choices,
+        initial=Assessment.AssessmentType.JURY,
+    )
@@ -0,0 +1,303 @@
+# apps/gradebook/imports.py
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import re
+import secrets
+import time
+from collections import Counter
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+
+from apps.school.models import Course, Enrollment
+from apps.sqlite_tuning import immediate_atomic
+
+from .models import Assessment, Grade
+from .services import GradeCell, GradeCellError, GradeWriteReport, parse_grade_cell, save_grade_cells
+
+
+IMPORT_MAX_ROWS = 5000
+IMPORT_MAX_FILE_SIZE = 5 * 1024 * 1024
+IMPORT_PREVIEW_MAX_AGE = 60 * 60
+NOT_ENROLLED_ERROR = "Ученик больше не записан на курс"
+_PREVIEW_TOKEN_RE = re.compile(r"^[A-Za-z0-9_-]{32}$")
+_SNIFF_SIZE = 4096
+# Accepts both the English column names and the headers of the school-wide export.
+_HEADER_ALIASES = {
+    "username": "username",
+    "логин": "username",
+    "assessment": "assessment",
+    "контрольная точка": "assessment",
+    "score": "score",
+    "результат": "score",
+    "comment": "comment",
+    "комментарий": "comment",
+}
+_REQUIRED_COLUMNS = ("username", "assessment", "score")
+
+
+class GradeImportChange(NamedTuple):
+    line: int
+    student: object
+    assessment_title: str
+    old_score: Optional[object]
+    old_comment: str
+    new_score: Optional[object]
+    new_comment: str
+    is_new: bool
+
+
+class GradeImportPlan(NamedTuple):
+    changes: list[GradeImportChange]
+    unchanged: int
+    errors: list[tuple[int, str]]
+    new_titles: list[str]
+    # [student_id, assessment_id (0 for a new title), assessment_title, raw_score, raw_comment, version] rows,
+    # JSON-safe for stash_import_preview.
+    payload: list[list]
+
+
+def _title_key(title: str) -> str:
+    return " ".join(title.split()).casefold()
+
+
+def _open_text(upload):
+    upload.seek(0)
+    stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    sample = stream.read(_SNIFF_SIZE)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return stream, dialect
+
+
+def build_grade_import_plan(upload, *, course: Course, create_missing: bool = False) -> GradeImportPlan:
+    """
+    Validates an uploaded CSV (username, assessment, score[, comment]) row by row with the grid rules
+    and diffs it against the stored grades. Nothing is written; apply_grade_import does that.
+    """
+    errors: list[tuple[int, str]] = []
+    if upload.size and upload.size > IMPORT_MAX_FILE_SIZE:
+        return GradeImportPlan([], 0, [(0, "Файл слишком большой.")], [], [])
+
+    students = {
+        enrollment.student.username.casefold(): enrollment.student
+        for enrollment in Enrollment.objects.filter(course=course).select_related("student")
+    }
+    course_assessments = list(Assessment.objects.filter(course=course))
+    title_counts = Counter(_title_key(assessment.title) for assessment in course_assessments)
+    # Titles are unique per course only as typed: "Зачёт" and "зачёт " cannot say which one a row means.
+    ambiguous_titles = {key for key, count in title_counts.items() if count > 1}
+    assessments = {
+        _title_key(assessment.title): assessment
+        for assessment in course_assessments
+        if _title_key(assessment.title) not in ambiguous_titles
+    }
+    grade_map = {
+        (grade.student_id, grade.assessment_id): grade for grade in Grade.objects.filter(assessment__course=course)
+    }
+
+    changes: list[GradeImportChange] = []
+    payload: list[list] = []
+    new_titles: list[str] = []
+    new_title_spellings: dict[str, str] = {}
+    seen: set[tuple[int, str]] = set()
+    unchanged = 0
+
+    stream = None
+    try:
+        stream, dialect = _open_text(upload)
+        reader = csv.reader(stream, dialect)
+        header = next(reader, None)
+        columns = {}
+        for index, name in enumerate(header or []):
+            key = _HEADER_ALIASES.get(name.strip().casefold())
+            if key and key not in columns:
+                columns[key] = index
+        missing = [name for name in _REQUIRED_COLUMNS if name not in columns]
+        if missing:
+            return GradeImportPlan([], 0, [(1, f"Нет столбцов: {', '.join(missing)}.")], [], [])
+
+        for line, row in enumerate(reader, start=2):
+            if line - 1 > IMPORT_MAX_ROWS:
+                errors.append((line, f"Слишком много строк (максимум {IMPORT_MAX_ROWS})."))
+                break
+            if not any(value.strip() for value in row):
+                continue
+            values = {key: (row[index] if index < len(row) else "").strip() for key, index in columns.items()}
+            student = students.get(values["username"].casefold())
+            if student is None:
+                errors.append((line, f"Ученик не найден на курсе: {values['username']}"))
+                continue
+            title = values["assessment"]
+            if not title:
+                errors.append((line, "Не указана контрольная точка."))
+                continue
+            title_key = _title_key(title)
+            if title_key in ambiguous_titles:
+                errors.append(
+                    (line, f"Несколько контрольных точек называются «{title}»: переименуйте их перед импортом.")
+                )
+                continue
+            assessment = assessments.get(title_key)
+            if assessment is None and not (create_missing and len(title) <= 200):
+                errors.append((line, f"Контрольная точка не найдена: {title}"))
+                continue
+            # Rows spell a title as they like; the stored one (or the first spelling of a new one) is used.
+            title = assessment.title if assessment else new_title_spellings.setdefault(title_key, title)
+            if (student.id, title_key) in seen:
+                errors.append((line, f"Повтор: {values['username']} / {title}"))
+                continue
+            seen.add((student.id, title_key))
+
+            grade = grade_map.get((student.id, assessment.id)) if assessment else None
+            old_score = grade.score if grade else None
+            old_comment = grade.comment if grade else ""
+            # Without a comment column the stored comments are kept as they are.
+            score, comment, error = parse_grade_cell(values["score"], values.get("comment", old_comment))
+            if error:
+                errors.append((line, f"{error}: {values['username']} / {title}"))
+                continue
+
+            if old_score == score and old_comment == comment:
+                unchanged += 1
+                continue
+            if assessment is None and title not in new_titles:
+                new_titles.append(title)
+            changes.append(
+                GradeImportChange(line, student, title, old_score, old_comment, score, comment, grade is None)
+            )
+            payload.append(
+                [
+                    student.id,
+                    assessment.id if assessment else 0,
+                    title,
+                    values["score"],
+                    comment,
+                    grade.version if grade else 0,
+                ]
+            )
+    except UnicodeDecodeError:
+        return GradeImportPlan([], 0, [(0, "Файл должен быть в кодировке UTF-8.")], [], [])
+    except csv.Error as exc:
+        errors.append((reader.line_num, f"Некорректный CSV: {exc}"))
+    finally:
+        if stream is not None:
+            # Leave the uploaded file open for Django to clean up.
+            stream.detach()
+
+    return GradeImportPlan(changes, unchanged, errors, new_titles, payload)
+
+
+def apply_grade_import(
+    payload: list[list],
+    *,
+    course: Course,
+    assessment_type: str = Assessment.AssessmentType.JURY,
+) -> GradeWriteReport:
+    """
+    Writes a previewed import in one transaction with a fixed number of queries: missing assessments are
+    bulk-created, then every cell goes through save_grade_cells. Cells changed since the preview are reported,
+    not overwritten, and so are the rows of students who left the course since the preview.
+    Rows keep the id of the assessment they were previewed against; titles only name the new ones.
+    """
+    with immediate_atomic():
+        enrolled_ids = set(
+            Enrollment.objects.filter(
+                course=course, student_id__in={student_id for student_id, *_rest in payload}
+            ).values_list("student_id", flat=True)
+        )
+        unenrolled_errors = [
+            GradeCellError(student_id, assessment_id, NOT_ENROLLED_ERROR)
+            for student_id, assessment_id, *_rest in payload
+            if student_id not in enrolled_ids
+        ]
+        payload = [row for row in payload if row[0] in enrolled_ids]
+
+        new_titles = {title for _student_id, assessment_id, title, *_rest in payload if not assessment_id}
+        if new_titles:
+            existing = set(
+                Assessment.objects.filter(course=course, title__in=new_titles).values_list("title", flat=True)
+            )
+            Assessment.objects.bulk_create(
+                [
+                    Assessment(course=course, title=title, assessment_type=assessment_type)
+                    for title in new_titles - existing
+                ],
+                ignore_conflicts=True,
+            )
+        course_assessment_ids = dict(Assessment.objects.filter(course=course).order_by("id").values_list("title", "id"))
+        grade_map = {
+            (grade.student_id, grade.assessment_id): grade
+            for grade in Grade.objects.filter(assessment__course=course, student_id__in=enrolled_ids)
+        }
+        valid_assessment_ids = set(course_assessment_ids.values())
+        cells = [
+            GradeCell(student_id, assessment_id or course_assessment_ids[title], raw_score, raw_comment, version)
+            for student_id, assessment_id, title, raw_score, raw_comment, version in payload
+            # An assessment deleted since the preview takes its rows with it.
+            if (assessment_id or course_assessment_ids.get(title)) in valid_assessment_ids
+        ]
+        report = save_grade_cells(cells, grade_map=grade_map)
+    return report._replace(errors=unenrolled_errors + report.errors)
+
+
+def _preview_path(token: str, suffix: str = ".json") -> Optional[Path]:
+    if not isinstance(token, str) or not _PREVIEW_TOKEN_RE.match(token):
+        return None
+    return Path(settings.GRADE_IMPORT_STAGING_ROOT) / f"{token}{suffix}"
+
+
+def stash_import_preview(data: dict) -> str:
+    """
+    Keeps a previewed import (up to IMPORT_MAX_ROWS rows) in a staging file until it is confirmed
+    and returns its token; only the token goes into the session.
+    """
+    root = Path(settings.GRADE_IMPORT_STAGING_ROOT)
+    root.mkdir(parents=True, exist_ok=True)
+    cutoff = time.time() - IMPORT_PREVIEW_MAX_AGE
+    for stale in root.glob("*.json"):
+        try:
+            if stale.stat().st_mtime < cutoff:
+                stale.unlink()
+        except OSError:
+            continue
+    token = secrets.token_urlsafe(24)
+    temporary = _preview_path(token, ".tmp")
+    temporary.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(temporary, _preview_path(token))
+    return token
+
+
+def pop_import_preview(token: str) -> Optional[dict]:
+    """The stashed preview, removed so it is applied once; None when unknown or older than IMPORT_PREVIEW_MAX_AGE."""
+    path = _preview_path(token)
+    if path is None:
+        return None
+    claimed = _preview_path(token, ".applying")
+    try:
+        # Rename first: of two confirmations of one preview only one gets the file.
+        os.replace(path, claimed)
+    except OSError:
+        return None
+    try:
+        if claimed.stat().st_mtime < time.time() - IMPORT_PREVIEW_MAX_AGE:
+            return None
+        return json.loads(claimed.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    finally:
+        claimed.unlink(missing_ok=True)
+
+
+def discard_import_preview(token: str) -> None:
+    path = _preview_path(token)
+    if path is not None:
+        path.unlink(missing_ok=True)
@@ -0,0 +1,17 @@
+# apps/gradebook/management/commands/rebuild_course_stats.py
+from django.core.management.base import BaseCommand
+
+from apps.gradebook.services import refresh_course_student_stats
+from apps.school.models import Course
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized per-student course averages (CourseStudentStats)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course", type=int, action="append", dest="course_ids", help="Only rebuild this course id.")
+
+    def handle(self, *args, **options):
+        course_ids = options["course_ids"] or Course.objects.values("id")
+        stored = refresh_course_student_stats(course_ids=course_ids)
+        self.stdout.write(self.style.SUCCESS(f"Course stats rebuilt: {stored} rows."))
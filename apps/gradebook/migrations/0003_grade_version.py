@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gradebook', '0002_assessment_source_assignment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grade',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
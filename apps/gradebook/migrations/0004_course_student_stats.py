@@ -0,0 +1,71 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:14
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_course_student_stats(apps, schema_editor):
+    Grade = apps.get_model("gradebook", "Grade")
+    CourseStudentStats = apps.get_model("gradebook", "CourseStudentStats")
+    rows = {}
+    for course_id, student_id, score, max_score, weight in Grade.objects.filter(score__isnull=False).values_list(
+        "assessment__course_id",
+        "student_id",
+        "score",
+        "assessment__max_score",
+        "assessment__weight",
+    ):
+        row = rows.get((course_id, student_id))
+        if row is None:
+            row = rows[(course_id, student_id)] = CourseStudentStats(
+                course_id=course_id,
+                student_id=student_id,
+                weighted_sum=Decimal("0"),
+                weight_total=Decimal("0"),
+                score_sum=Decimal("0"),
+            )
+        if max_score != 0:
+            row.weighted_sum += (Decimal(score) / Decimal(max_score)) * Decimal(weight)
+            row.weight_total += Decimal(weight)
+        row.score_sum += Decimal(score)
+        row.graded_count += 1
+    for row in rows.values():
+        row.weighted_sum = row.weighted_sum.quantize(Decimal("0.00000001"))
+    CourseStudentStats.objects.bulk_create(rows.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gradebook', '0003_grade_version'),
+        ('school', '0003_courseinternalgroup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grade',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CourseStudentStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weighted_sum', models.DecimalField(decimal_places=8, default=0, max_digits=20)),
+                ('weight_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('score_sum', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('graded_count', models.PositiveIntegerField(default=0)),
+                ('last_graded_at', models.DateTimeField(blank=True, null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_stats', to='school.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('course', 'student')},
+            },
+        ),
+        migrations.RunPython(backfill_course_student_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-17 01:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gradebook', '0004_course_student_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['student', 'assessment'], name='grade_student_assessment_idx'),
+        ),
+    ]
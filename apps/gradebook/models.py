@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django.conf import settings
 from django.db import models
 from apps.school.models import Course
@@ -38,10 +40,49 @@ class Grade(models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="grades")
     score = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
     comment = models.TextField(blank=True, default="")
+    # Bumped on every write through the grade services; autosave clients send it back to detect lost updates.
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
 
     class Meta:
         unique_together = ("assessment", "student")
+        # A student's grades newest assessment first (workspace, portfolio) without a sort.
+        indexes = [models.Index(fields=("student", "assessment"), name="grade_student_assessment_idx")]
 
     def __str__(self) -> str:
         student_name = (self.student.get_full_name() or "").strip() or "Без имени"
         return f"{student_name} - {self.assessment.title}: {self.score}"
+
+
+class CourseStudentStats(models.Model):
+    """
+    Материализованные итоги ученика по курсу (только оценённые результаты).
+    Поддерживается services.refresh_course_student_stats; пересобирается командой rebuild_course_stats.
+    """
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="student_stats")
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="course_stats")
+    # sum(score / max_score * weight) and sum(weight) over assessments with max_score > 0
+    weighted_sum = models.DecimalField(max_digits=20, decimal_places=8, default=0)
+    weight_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    score_sum = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    graded_count = models.PositiveIntegerField(default=0)
+    last_graded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("course", "student")
+
+    def __str__(self) -> str:
+        return f"{self.course_id}/{self.student_id}: {self.graded_count}"
+
+    @property
+    def average_percent(self) -> Decimal | None:
+        if not self.weight_total:
+            return None
+        return (Decimal(self.weighted_sum) / Decimal(self.weight_total)) * Decimal("100")
+
+    @property
+    def average_score(self) -> Decimal | None:
+        if not self.graded_count:
+            return None
+        return Decimal(self.score_sum) / self.graded_count
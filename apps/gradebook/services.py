@@ -1,7 +1,42 @@
 # apps/gradebook/services.py
 from decimal import Decimal
-from typing import Iterable, Optional, Tuple
-from .models import Assessment, Grade
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.accounts.dashboard_cache import invalidate_student_dashboards
+from apps.text_limits import TEXT_CHAR_LIMIT, char_limit_error, exceeds_char_limit
+from .models import Assessment, CourseStudentStats, Grade
+
+
+GRADE_SCORE_MIN = 0
+GRADE_SCORE_MAX = 100
+INVALID_SCORE_ERROR = "Некорректный результат"
+OUT_OF_RANGE_SCORE_ERROR = f"Результат вне диапазона {GRADE_SCORE_MIN}–{GRADE_SCORE_MAX}"
+STALE_VERSION_ERROR = "Результат уже изменён в другой вкладке или другим пользователем"
+
+
+class GradeCell(NamedTuple):
+    student_id: int
+    assessment_id: int
+    raw_score: str
+    raw_comment: str
+    # Grade.version the client last saw (0 for an empty cell); None skips the check.
+    version: Optional[int] = None
+
+
+class GradeCellError(NamedTuple):
+    student_id: int
+    assessment_id: int
+    message: str
+
+
+class GradeWriteReport(NamedTuple):
+    created: int
+    updated: int
+    errors: list[GradeCellError]
 
 
 def compute_average_percent(assessments: Iterable[Assessment], grades_by_assessment_id: dict) -> Optional[Decimal]:
@@ -9,6 +44,8 @@ def compute_average_percent(assessments: Iterable[Assessment], grades_by_assessm
     Weighted average in percent:
     sum((score/max_score)*weight) / sum(weight) * 100
     Only counts assessments where score is not None.
+    Exact Decimal result; CourseStudentStats.average_percent is the same formula over a sum
+    stored with 8 decimal places, for pages that list many students at once.
     """
     total_weight = Decimal("0")
     total = Decimal("0")
@@ -27,3 +64,239 @@ def compute_average_percent(assessments: Iterable[Assessment], grades_by_assessm
         return None
 
     return (total / total_weight) * Decimal("100")
+
+
+def compute_course_average_percents(course, *, student_ids=None) -> dict[int, Optional[Decimal]]:
+    """
+    Batch form of compute_average_percent for a whole course: one flat values_list read,
+    then per-student accumulation with the same Decimal operations in the same
+    assessment order, so every result is identical to the per-student path.
+    Students without graded assessments map to None (only when listed in student_ids).
+    """
+    grades = Grade.objects.filter(assessment__course=course, score__isnull=False)
+    if student_ids is not None:
+        grades = grades.filter(student_id__in=student_ids)
+    rows = grades.order_by("assessment_id").values_list(
+        "student_id",
+        "score",
+        "assessment__max_score",
+        "assessment__weight",
+    )
+
+    totals: dict[int, list[Decimal]] = {}
+    for student_id, score, max_score, weight in rows:
+        if max_score == 0:
+            continue
+        acc = totals.get(student_id)
+        if acc is None:
+            acc = totals[student_id] = [Decimal("0"), Decimal("0")]
+        acc[0] += (Decimal(score) / Decimal(max_score)) * Decimal(weight)
+        acc[1] += Decimal(weight)
+
+    result: dict[int, Optional[Decimal]] = {student_id: None for student_id in (student_ids or ())}
+    for student_id, (total, total_weight) in totals.items():
+        result[student_id] = None if total_weight == 0 else (total / total_weight) * Decimal("100")
+    return result
+
+
+def parse_grade_cell(raw_score: str, raw_comment: str) -> Tuple[Optional[Decimal], str, str]:
+    """
+    Validates one grid cell the same way for every grade entry point.
+    Returns (score, comment, error); error is "" when the cell is valid.
+    """
+    raw_score = (raw_score or "").strip()
+    comment = (raw_comment or "").strip()
+    if comment and exceeds_char_limit(comment, TEXT_CHAR_LIMIT):
+        return None, comment, char_limit_error(TEXT_CHAR_LIMIT)
+
+    if raw_score == "":
+        return None, comment, ""
+    if not raw_score.isdigit():
+        return None, comment, INVALID_SCORE_ERROR
+    try:
+        score_int = int(raw_score)
+    except ValueError:
+        return None, comment, INVALID_SCORE_ERROR
+    if score_int < GRADE_SCORE_MIN or score_int > GRADE_SCORE_MAX:
+        return None, comment, OUT_OF_RANGE_SCORE_ERROR
+    return Decimal(score_int), comment, ""
+
+
+def save_grade_cells(cells: Iterable[GradeCell], *, grade_map: dict) -> GradeWriteReport:
+    """
+    Diffs submitted cells against the already loaded grade_map
+    ({(student_id, assessment_id): Grade}) and writes only the changed ones:
+    one bulk insert for new grades and one bulk update for edited grades.
+    Blank cells without an existing Grade are not materialized.
+    Cells carrying a version are rejected when it no longer matches the stored one: the stored versions
+    of those cells are re-read in one query right before the bulk writes, so a competing write between
+    reading grade_map and writing is reported instead of overwritten. Call it inside immediate_atomic()
+    so that nothing can be written between that check and the writes.
+    grade_map is updated in place with the created rows, bumped versions and the current rows of conflicts.
+    """
+    to_create: list[Grade] = []
+    to_update: list[Grade] = []
+    checked_versions: dict[tuple[int, int], int] = {}
+    errors: list[GradeCellError] = []
+
+    for cell in cells:
+        score, comment, error = parse_grade_cell(cell.raw_score, cell.raw_comment)
+        if error:
+            errors.append(GradeCellError(cell.student_id, cell.assessment_id, error))
+            continue
+
+        key = (cell.student_id, cell.assessment_id)
+        grade = grade_map.get(key)
+        if cell.version is not None and cell.version != (grade.version if grade else 0):
+            errors.append(GradeCellError(cell.student_id, cell.assessment_id, STALE_VERSION_ERROR))
+            continue
+        if cell.version is not None:
+            checked_versions[key] = cell.version
+        if grade is None:
+            if score is None and not comment:
+                continue
+            grade = Grade(
+                student_id=cell.student_id,
+                assessment_id=cell.assessment_id,
+                score=score,
+                comment=comment,
+                version=1,
+            )
+            grade_map[key] = grade
+            to_create.append(grade)
+            continue
+
+        if grade.score == score and grade.comment == comment:
+            continue
+        grade.score = score
+        grade.comment = comment
+        if grade.pk is None:
+            # Same cell submitted twice in one batch: the pending insert already carries the last value.
+            continue
+        grade.version += 1
+        to_update.append(grade)
+
+    if not to_create and not to_update:
+        return GradeWriteReport(created=0, updated=0, errors=errors)
+
+    now = timezone.now()
+    for grade in to_update:
+        grade.updated_at = now
+    with transaction.atomic():
+        conflicts = _stale_version_conflicts(
+            {(grade.student_id, grade.assessment_id) for grade in to_create + to_update} & checked_versions.keys(),
+            checked_versions,
+            grade_map,
+        )
+        if conflicts:
+            errors.extend(
+                GradeCellError(student_id, assessment_id, STALE_VERSION_ERROR)
+                for student_id, assessment_id in sorted(conflicts)
+            )
+            to_create = [grade for grade in to_create if (grade.student_id, grade.assessment_id) not in conflicts]
+            to_update = [grade for grade in to_update if (grade.student_id, grade.assessment_id) not in conflicts]
+
+        if to_create:
+            # Upsert guards against a row created concurrently after grade_map was loaded.
+            Grade.objects.bulk_create(
+                to_create,
+                update_conflicts=True,
+                unique_fields=["assessment", "student"],
+                update_fields=["score", "comment", "version", "updated_at"],
+            )
+        if to_update:
+            # The stored version is bumped in SQL, so a grade_map read outside the lock cannot roll it back.
+            versions = [grade.version for grade in to_update]
+            for grade in to_update:
+                grade.version = F("version") + 1
+            Grade.objects.bulk_update(to_update, ["score", "comment", "version", "updated_at"])
+            for grade, version in zip(to_update, versions):
+                grade.version = version
+
+        changed = to_create + to_update
+        if changed:
+            refresh_course_student_stats(
+                course_ids=Assessment.objects.filter(id__in={grade.assessment_id for grade in changed}).values("course_id"),
+                student_ids={grade.student_id for grade in changed},
+            )
+    # bulk writes bypass the Grade signals
+    invalidate_student_dashboards({grade.student_id for grade in changed})
+
+    return GradeWriteReport(created=len(to_create), updated=len(to_update), errors=errors)
+
+
+def _stale_version_conflicts(keys: set[tuple[int, int]], checked_versions: dict, grade_map: dict) -> set:
+    """
+    Keys whose stored version no longer matches checked_versions, from one read of the stored rows.
+    grade_map entries of the conflicts are replaced with the rows another writer stored.
+    """
+    if not keys:
+        return set()
+    stored = {
+        (grade.student_id, grade.assessment_id): grade
+        for grade in Grade.objects.select_for_update().filter(
+            student_id__in={student_id for student_id, _assessment_id in keys},
+            assessment_id__in={assessment_id for _student_id, assessment_id in keys},
+        )
+    }
+    conflicts = set()
+    for key in keys:
+        current = stored.get(key)
+        if (current.version if current else 0) == checked_versions[key]:
+            continue
+        conflicts.add(key)
+        if current is None:
+            grade_map.pop(key, None)
+        else:
+            grade_map[key] = current
+    return conflicts
+
+
+def refresh_course_student_stats(*, course_ids, student_ids=None) -> int:
+    """
+    Re-materializes CourseStudentStats for the given courses (optionally only for some students)
+    from their grades: one read, one delete and one bulk insert regardless of the scope size.
+    course_ids may be a list or a values() subquery. Returns the number of stored rows.
+    """
+    grades = Grade.objects.filter(assessment__course_id__in=course_ids, score__isnull=False)
+    stats = CourseStudentStats.objects.filter(course_id__in=course_ids)
+    if student_ids is not None:
+        grades = grades.filter(student_id__in=student_ids)
+        stats = stats.filter(student_id__in=student_ids)
+
+    rows: dict[tuple[int, int], CourseStudentStats] = {}
+    for course_id, student_id, score, max_score, weight, updated_at in grades.values_list(
+        "assessment__course_id",
+        "student_id",
+        "score",
+        "assessment__max_score",
+        "assessment__weight",
+        "updated_at",
+    ):
+        row = rows.get((course_id, student_id))
+        if row is None:
+            row = rows[(course_id, student_id)] = CourseStudentStats(
+                course_id=course_id,
+                student_id=student_id,
+                weighted_sum=Decimal("0"),
+                weight_total=Decimal("0"),
+                score_sum=Decimal("0"),
+            )
+        # Same rules as compute_average_percent.
+        if max_score != 0:
+            row.weighted_sum += (Decimal(score) / Decimal(max_score)) * Decimal(weight)
+            row.weight_total += Decimal(weight)
+        row.score_sum += Decimal(score)
+        row.graded_count += 1
+        if updated_at and (row.last_graded_at is None or updated_at > row.last_graded_at):
+            row.last_graded_at = updated_at
+
+    for row in rows.values():
+        # The column keeps 8 decimal places, so average_percent differs from compute_average_percent
+        # by at most 5e-7 / weight_total percent (under 1e-6 for weight totals >= 1).
+        row.weighted_sum = row.weighted_sum.quantize(Decimal("0.00000001"))
+
+    with transaction.atomic():
+        stats.delete()
+        CourseStudentStats.objects.bulk_create(rows.values())
+    return len(rows)
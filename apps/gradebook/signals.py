@@ -0,0 +1,76 @@
+# apps/gradebook/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Assessment, Grade
+from .services import refresh_course_student_stats
+
+
+_STATS_ASSESSMENT_FIELDS = {"course", "max_score", "weight"}
+_STATS_GRADE_KEY_FIELDS = {"assessment", "assessment_id", "student", "student_id"}
+
+
+def _is_direct_grade_delete(origin) -> bool:
+    # Cascades from Assessment/Course/User are handled by the Assessment hook or by the stats FK cascade.
+    return isinstance(origin, Grade) or getattr(origin, "model", None) is Grade
+
+
+@receiver(pre_save, sender=Grade)
+def remember_grade_stats_key(sender, instance: Grade, raw: bool = False, update_fields=None, **kwargs):
+    # A grade moved to another student or assessment must also leave the old (course, student) stats.
+    if raw or instance.pk is None or (update_fields is not None and not _STATS_GRADE_KEY_FIELDS & set(update_fields)):
+        return
+    instance._stats_previous_key = (
+        Grade.objects.filter(pk=instance.pk).values_list("assessment_id", "assessment__course_id", "student_id").first()
+    )
+
+
+@receiver(post_save, sender=Grade)
+def refresh_stats_on_grade_save(sender, instance: Grade, created: bool, raw: bool = False, **kwargs):
+    previous = instance.__dict__.pop("_stats_previous_key", None)
+    if raw or (created and instance.score is None):
+        return
+    refresh_course_student_stats(
+        course_ids=Assessment.objects.filter(id=instance.assessment_id).values("course_id"),
+        student_ids=[instance.student_id],
+    )
+    if previous is None:
+        return
+    assessment_id, course_id, student_id = previous
+    if (assessment_id, student_id) != (instance.assessment_id, instance.student_id):
+        refresh_course_student_stats(course_ids=[course_id], student_ids=[student_id])
+
+
+@receiver(post_delete, sender=Grade)
+def refresh_stats_on_grade_delete(sender, instance: Grade, origin=None, **kwargs):
+    if not _is_direct_grade_delete(origin):
+        return
+    refresh_course_student_stats(
+        course_ids=Assessment.objects.filter(id=instance.assessment_id).values("course_id"),
+        student_ids=[instance.student_id],
+    )
+
+
+@receiver(pre_save, sender=Assessment)
+def remember_assessment_course(sender, instance: Assessment, raw: bool = False, update_fields=None, **kwargs):
+    # A moved assessment must also leave the old course's stats.
+    if raw or instance.pk is None or (update_fields is not None and "course" not in update_fields):
+        return
+    instance._stats_previous_course_id = (
+        Assessment.objects.filter(pk=instance.pk).values_list("course_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Assessment)
+def refresh_stats_on_assessment_save(sender, instance: Assessment, created: bool, raw: bool = False, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if raw or created or (update_fields is not None and not _STATS_ASSESSMENT_FIELDS & set(update_fields)):
+        return
+    course_ids = {instance.course_id, instance.__dict__.pop("_stats_previous_course_id", None)} - {None}
+    refresh_course_student_stats(course_ids=sorted(course_ids))
+
+
+@receiver(post_delete, sender=Assessment)
+def refresh_stats_on_assessment_delete(sender, instance: Assessment, origin=None, **kwargs):
+    if isinstance(origin, Assessment) or getattr(origin, "model", None) is Assessment:
+        refresh_course_student_stats(course_ids=[instance.course_id])
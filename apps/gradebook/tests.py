@@ -1,15 +1,40 @@
+import csv
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import zipfile
 from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import skipUnless
+from xml.etree import ElementTree
 
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.management import call_command
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from apps.accounts.models import Profile
 from apps.homework.services import create_assignment_with_targets_and_gradebook
 from apps.school.models import Course, CourseType, Enrollment
+from apps.sqlite_tuning import apply_sqlite_pragmas
 
-from .models import Grade
+from .imports import NOT_ENROLLED_ERROR, apply_grade_import, pop_import_preview
+from .models import Assessment, CourseStudentStats, Grade
+from .services import (
+    STALE_VERSION_ERROR,
+    GradeCell,
+    compute_average_percent,
+    compute_course_average_percents,
+    save_grade_cells,
+)
 
 
 class TeacherGroupGradesTests(TestCase):
@@ -66,6 +91,521 @@ class TeacherGroupGradesTests(TestCase):
         self.assertEqual(grade.comment, "Хорошо")
 
 
+class TeacherCourseGradesAutosaveTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        course_type = CourseType.objects.create(name="Гитара")
+        self.teacher = user_model.objects.create_user(username="autosave_teacher", password="pass12345")
+        Profile.objects.create(user=self.teacher, role=Profile.Role.TEACHER)
+        self.student = user_model.objects.create_user(username="autosave_student", password="pass12345")
+        Profile.objects.create(user=self.student, role=Profile.Role.STUDENT)
+        self.course = Course.objects.create(name="Гитара 1", course_type=course_type, teacher=self.teacher)
+        Enrollment.objects.create(course=self.course, student=self.student)
+        self.assessment = Assessment.objects.create(
+            course=self.course,
+            title="Этюд",
+            assessment_type=Assessment.AssessmentType.PERFORMANCE,
+        )
+        self.url = reverse("teacher_course_grades_autosave", args=[self.course.id])
+        self.client.force_login(self.teacher)
+
+    def _patch(self, *cells):
+        return self.client.patch(self.url, data=json.dumps({"cells": list(cells)}), content_type="application/json")
+
+    def _cell(self, score, version, comment=""):
+        return {
+            "student_id": self.student.id,
+            "assessment_id": self.assessment.id,
+            "score": score,
+            "comment": comment,
+            "version": version,
+        }
+
+    def test_autosave_creates_and_updates_cell_with_version_check(self):
+        page = self.client.get(reverse("teacher_course_grades", args=[self.course.id]))
+        self.assertContains(page, f'data-autosave-url="{self.url}"')
+
+        response = self._patch(self._cell("70", 0, "Темп"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["saved"][0]["version"], 1)
+
+        response = self._patch(self._cell("85", 1))
+        self.assertEqual(response.json()["saved"][0]["version"], 2)
+        grade = Grade.objects.get(student=self.student, assessment=self.assessment)
+        self.assertEqual((grade.score, grade.comment, grade.version), (85, "", 2))
+
+        stale = self._patch(self._cell("10", 1)).json()
+        self.assertEqual(stale["saved"], [])
+        self.assertEqual(stale["errors"][0]["score"], "85")
+        self.assertEqual(stale["errors"][0]["version"], 2)
+        grade.refresh_from_db()
+        self.assertEqual(grade.score, 85)
+
+    def test_autosave_rejects_cells_outside_course(self):
+        other_assessment = Assessment.objects.create(
+            course=Course.objects.create(name="Чужой курс", course_type=self.course.course_type),
+            title="Чужое",
+            assessment_type=Assessment.AssessmentType.PERFORMANCE,
+        )
+        cell = {**self._cell("50", 0), "assessment_id": other_assessment.id}
+
+        self.assertEqual(self._patch(cell).status_code, 403)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+        self.assertFalse(Grade.objects.exists())
+
+
+class SaveGradeCellsTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        course_type = CourseType.objects.create(name="Сольфеджио")
+        self.course = Course.objects.create(name="Сольфеджио 2", course_type=course_type)
+        self.students = [
+            user_model.objects.create_user(username=f"grid_student_{index}", password="pass12345")
+            for index in range(4)
+        ]
+        self.assessments = [
+            Assessment.objects.create(
+                course=self.course,
+                title=f"Диктант {index}",
+                assessment_type=Assessment.AssessmentType.THEORY_TEST,
+            )
+            for index in range(3)
+        ]
+
+    def _cells(self, score: str, comment: str = ""):
+        return [
+            GradeCell(student.id, assessment.id, score, comment)
+            for student in self.students
+            for assessment in self.assessments
+        ]
+
+    def test_full_grid_save_uses_fixed_number_of_queries(self):
+        with self.assertNumQueries(8):
+            report = save_grade_cells(self._cells("90"), grade_map={})
+        self.assertEqual((report.created, report.updated, report.errors), (12, 0, []))
+
+        grade_map = {(grade.student_id, grade.assessment_id): grade for grade in Grade.objects.all()}
+        with self.assertNumQueries(8):
+            report = save_grade_cells(self._cells("75", "Ровно"), grade_map=grade_map)
+        self.assertEqual((report.created, report.updated), (0, 12))
+        self.assertEqual(Grade.objects.filter(score=75, comment="Ровно").count(), 12)
+
+    def test_versioned_cells_are_checked_in_one_query(self):
+        # The stored versions are re-read once, whatever the number of cells.
+        with self.assertNumQueries(9):
+            report = save_grade_cells([cell._replace(version=0) for cell in self._cells("90")], grade_map={})
+        self.assertEqual((report.created, report.errors), (12, []))
+
+        grade_map = {(grade.student_id, grade.assessment_id): grade for grade in Grade.objects.all()}
+        with self.assertNumQueries(9):
+            report = save_grade_cells([cell._replace(version=1) for cell in self._cells("75")], grade_map=grade_map)
+        self.assertEqual((report.updated, report.errors), (12, []))
+        self.assertEqual(set(Grade.objects.values_list("score", "version")), {(75, 2)})
+        self.assertEqual({grade.version for grade in grade_map.values()}, {2})
+
+    def test_unchanged_and_blank_cells_are_not_written(self):
+        grade = Grade.objects.create(student=self.students[0], assessment=self.assessments[0], score=80)
+        cells = [
+            GradeCell(self.students[0].id, self.assessments[0].id, "80", ""),
+            GradeCell(self.students[1].id, self.assessments[0].id, "", ""),
+        ]
+
+        with self.assertNumQueries(0):
+            report = save_grade_cells(cells, grade_map={(grade.student_id, grade.assessment_id): grade})
+
+        self.assertEqual((report.created, report.updated), (0, 0))
+        self.assertEqual(Grade.objects.count(), 1)
+
+    def test_invalid_cells_are_reported_and_skipped(self):
+        cells = [
+            GradeCell(self.students[0].id, self.assessments[0].id, "abc", ""),
+            GradeCell(self.students[0].id, self.assessments[1].id, "101", ""),
+            GradeCell(self.students[0].id, self.assessments[2].id, "", "x" * 101),
+            GradeCell(self.students[1].id, self.assessments[0].id, "55", ""),
+        ]
+
+        report = save_grade_cells(cells, grade_map={})
+
+        self.assertEqual(report.created, 1)
+        self.assertEqual(
+            [(error.student_id, error.assessment_id) for error in report.errors],
+            [
+                (self.students[0].id, self.assessments[0].id),
+                (self.students[0].id, self.assessments[1].id),
+                (self.students[0].id, self.assessments[2].id),
+            ],
+        )
+        self.assertEqual(Grade.objects.get().student_id, self.students[1].id)
+
+    def test_stale_version_is_rejected_after_a_competing_write(self):
+        student, assessment = self.students[0], self.assessments[0]
+        grade = Grade.objects.create(student=student, assessment=assessment, score=80, version=1)
+        grade_map = {(student.id, assessment.id): grade}
+        # Another autosave lands between reading grade_map and writing.
+        Grade.objects.filter(pk=grade.pk).update(score=50, version=2)
+        Grade.objects.create(student=student, assessment=self.assessments[1], score=60, version=1)
+
+        report = save_grade_cells(
+            [
+                GradeCell(student.id, assessment.id, "95", "", version=1),
+                GradeCell(student.id, self.assessments[1].id, "70", "", version=0),
+            ],
+            grade_map=grade_map,
+        )
+
+        self.assertEqual((report.created, report.updated), (0, 0))
+        self.assertEqual(
+            [(error.assessment_id, error.message) for error in report.errors],
+            [(assessment.id, STALE_VERSION_ERROR), (self.assessments[1].id, STALE_VERSION_ERROR)],
+        )
+        self.assertEqual(
+            list(Grade.objects.filter(student=student).order_by("assessment_id").values_list("score", "version")),
+            [(50, 2), (60, 1)],
+        )
+        self.assertEqual(grade_map[(student.id, assessment.id)].version, 2)
+        self.assertEqual(grade_map[(student.id, self.assessments[1].id)].score, 60)
+
+
+class CourseStudentStatsTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        course_type = CourseType.objects.create(name="Вокал")
+        self.teacher = user_model.objects.create_user(username="stats_teacher", password="pass12345")
+        Profile.objects.create(user=self.teacher, role=Profile.Role.TEACHER)
+        self.student = user_model.objects.create_user(username="stats_student", password="pass12345")
+        self.course = Course.objects.create(name="Вокал 1", course_type=course_type, teacher=self.teacher)
+        Enrollment.objects.create(course=self.course, student=self.student)
+        self.first = Assessment.objects.create(
+            course=self.course,
+            title="Распевка",
+            assessment_type=Assessment.AssessmentType.PERFORMANCE,
+            max_score=50,
+            weight=2,
+        )
+        self.second = Assessment.objects.create(
+            course=self.course,
+            title="Зачёт",
+            assessment_type=Assessment.AssessmentType.JURY,
+        )
+
+    def _stats(self):
+        return CourseStudentStats.objects.get(course=self.course, student=self.student)
+
+    def _expected_percent(self):
+        assessments = [self.first, self.second]
+        grades = {grade.assessment_id: grade for grade in Grade.objects.filter(student=self.student)}
+        return compute_average_percent(assessments, grades)
+
+    def test_grid_save_and_single_grade_writes_keep_stats_in_sync(self):
+        save_grade_cells(
+            [
+                GradeCell(self.student.id, self.first.id, "40", ""),
+                GradeCell(self.student.id, self.second.id, "70", ""),
+            ],
+            grade_map={},
+        )
+        stats = self._stats()
+        self.assertEqual(stats.graded_count, 2)
+        self.assertEqual(stats.average_score, 55)
+        self.assertAlmostEqual(stats.average_percent, self._expected_percent(), places=6)
+        self.assertIsNotNone(stats.last_graded_at)
+
+        grade = Grade.objects.get(assessment=self.second)
+        grade.score = 100
+        grade.save()
+        self.assertAlmostEqual(self._stats().average_percent, self._expected_percent(), places=6)
+
+        self.first.weight = 1
+        self.first.save()
+        self.assertAlmostEqual(self._stats().average_percent, self._expected_percent(), places=6)
+
+        grade.delete()
+        self.assertEqual(self._stats().graded_count, 1)
+
+    def test_bulk_clear_and_rebuild_command(self):
+        Grade.objects.create(assessment=self.first, student=self.student, score=25)
+        self.client.force_login(self.teacher)
+
+        self.client.post(
+            reverse("teacher_course_grades_bulk_clear", args=[self.course.id]),
+            data={"selected_ids": [self.first.id]},
+        )
+        self.assertFalse(CourseStudentStats.objects.exists())
+
+        Grade.objects.filter(assessment=self.first).update(score=30)
+        call_command("rebuild_course_stats", stdout=StringIO())
+        self.assertEqual(self._stats().score_sum, 30)
+
+    def test_student_page_shows_the_exact_average(self):
+        Profile.objects.create(user=self.student, role=Profile.Role.STUDENT)
+        sevenths = Assessment.objects.create(course=self.course, title="Этюд", max_score=7, weight=3)
+        grades = {
+            assessment.id: Grade.objects.create(assessment=assessment, student=self.student, score=1)
+            for assessment in (self.first, sevenths)
+        }
+        expected = compute_average_percent([self.first, self.second, sevenths], grades)
+        self.client.force_login(self.student)
+
+        response = self.client.get(reverse("student_course_grades", args=[self.course.id]))
+
+        self.assertEqual(response.context["avg_percent"], expected)
+        # The stats row keeps a rounded weighted sum.
+        self.assertNotEqual(self._stats().average_percent, expected)
+
+    def test_moving_a_grade_refreshes_the_old_student_and_course(self):
+        other_student = get_user_model().objects.create_user(username="stats_student_2", password="pass12345")
+        other_course = Course.objects.create(name="Вокал 2", course_type=self.course.course_type, teacher=self.teacher)
+        other_assessment = Assessment.objects.create(course=other_course, title="Распевка")
+        grade = Grade.objects.create(assessment=self.first, student=self.student, score=25)
+        Grade.objects.create(assessment=self.second, student=self.student, score=70)
+
+        grade.student = other_student
+        grade.save()
+        self.assertEqual((self._stats().graded_count, self._stats().score_sum), (1, 70))
+        self.assertEqual(CourseStudentStats.objects.get(course=self.course, student=other_student).score_sum, 25)
+
+        grade.assessment = other_assessment
+        grade.save(update_fields=["assessment"])
+        self.assertFalse(CourseStudentStats.objects.filter(course=self.course, student=other_student).exists())
+        self.assertEqual(CourseStudentStats.objects.get(course=other_course, student=other_student).score_sum, 25)
+
+    def test_moving_an_assessment_refreshes_both_courses(self):
+        Grade.objects.create(assessment=self.first, student=self.student, score=25)
+        Grade.objects.create(assessment=self.second, student=self.student, score=70)
+        other_course = Course.objects.create(name="Вокал 2", course_type=self.course.course_type, teacher=self.teacher)
+
+        self.first.course = other_course
+        self.first.save()
+
+        self.assertEqual((self._stats().graded_count, self._stats().score_sum), (1, 70))
+        moved = CourseStudentStats.objects.get(course=other_course, student=self.student)
+        self.assertEqual((moved.graded_count, moved.score_sum), (1, 25))
+
+
+class CourseAveragePercentsTests(TestCase):
+    def test_batch_matches_per_student_decimal_path(self):
+        user_model = get_user_model()
+        course = Course.objects.create(name="Флейта", course_type=CourseType.objects.create(name="Духовые"))
+        rng = random.Random(4)
+        assessments = [
+            Assessment.objects.create(
+                course=course,
+                title=f"Точка {index}",
+                assessment_type=Assessment.AssessmentType.PERFORMANCE,
+                max_score=rng.choice([0, 7, 30, 100, Decimal("12.5")]),
+                weight=rng.choice([0, 1, 3, Decimal("0.75")]),
+            )
+            for index in range(12)
+        ]
+        students = [user_model.objects.create_user(username=f"avg_student_{index}") for index in range(15)]
+        Grade.objects.bulk_create(
+            Grade(assessment=assessment, student=student, score=rng.choice([None, 0, 3, 17, 58, 99, 100]))
+            for student in students
+            for assessment in assessments
+            if rng.random() < 0.8
+        )
+
+        ungraded = user_model.objects.create_user(username="avg_student_ungraded")
+
+        with self.assertNumQueries(1):
+            batch = compute_course_average_percents(course, student_ids=[student.id for student in [*students, ungraded]])
+
+        self.assertIsNone(batch[ungraded.id])
+        for student in students:
+            grades = {grade.assessment_id: grade for grade in Grade.objects.filter(student=student)}
+            self.assertEqual(batch[student.id], compute_average_percent(assessments, grades))
+
+
+class GradebookExportTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        course_type = CourseType.objects.create(name="Скрипка")
+        self.teacher = user_model.objects.create_user(username="export_teacher", password="pass12345")
+        Profile.objects.create(user=self.teacher, role=Profile.Role.TEACHER)
+        self.admin = user_model.objects.create_user(username="export_admin", password="pass12345")
+        Profile.objects.create(user=self.admin, role=Profile.Role.ADMIN)
+        self.course = Course.objects.create(name="Скрипка 3", course_type=course_type, teacher=self.teacher)
+        self.students = []
+        for name in ("Борис", "Анна"):
+            student = user_model.objects.create_user(username=f"export_{len(self.students)}", first_name=name)
+            Profile.objects.create(user=student, role=Profile.Role.STUDENT)
+            Enrollment.objects.create(course=self.course, student=student)
+            self.students.append(student)
+        self.assessments = [
+            Assessment.objects.create(course=self.course, title=title, assessment_type=Assessment.AssessmentType.JURY)
+            for title in ("Гаммы", "Пьеса")
+        ]
+        Grade.objects.create(assessment=self.assessments[1], student=self.students[0], score=90)
+        Grade.objects.create(assessment=self.assessments[0], student=self.students[1], score=Decimal("72.5"))
+
+    def test_course_export_streams_csv_matrix_in_grid_order(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse("teacher_course_grades_export", args=[self.course.id]), {"format": "csv"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode("utf-8-sig")
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0], ["Ученик", "Логин", "Цикл", "Гаммы", "Пьеса", "Средний %"])
+        self.assertEqual(rows[1][0], "Анна")
+        self.assertEqual(rows[1][3:], ["72.5", "", "72.5"])
+        self.assertEqual(rows[2][3:], ["", "90", "90.0"])
+
+    def test_csv_cells_that_look_like_formulas_are_quoted(self):
+        self.students[0].first_name = "=HYPERLINK(\"http://example.com\")"
+        self.students[0].save(update_fields=["first_name"])
+        Grade.objects.filter(student=self.students[1]).update(comment="-1+2")
+        self.client.force_login(self.admin)
+
+        response = self.client.get(reverse("admin_grades_export"), {"format": "csv"})
+
+        rows = list(csv.reader(StringIO(b"".join(response.streaming_content).decode("utf-8-sig"))))
+        by_login = {row[2]: row for row in rows[1:]}
+        self.assertEqual(by_login["export_0"][1], "'=HYPERLINK(\"http://example.com\")")
+        self.assertEqual(by_login["export_1"][-1], "'-1+2")
+        self.assertEqual(by_login["export_1"][-2], "72.5")
+
+    def test_xlsx_exports_are_valid_workbooks(self):
+        self.client.force_login(self.admin)
+        for url in (reverse("teacher_course_grades_export", args=[self.course.id]), reverse("admin_grades_export")):
+            response = self.client.get(url, {"format": "xlsx"})
+            archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+            self.assertIsNone(archive.testzip())
+            sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+            self.assertEqual(len(sheet.findall(".//{*}row")), 3)
+
+        self.assertEqual(self.client.get(reverse("admin_grades_export"), {"format": "pdf"}).status_code, 404)
+
+
+class GradebookImportTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.teacher = user_model.objects.create_user(username="import_teacher", password="pass12345")
+        Profile.objects.create(user=self.teacher, role=Profile.Role.TEACHER)
+        self.course = Course.objects.create(
+            name="Домра 2",
+            course_type=CourseType.objects.create(name="Домра"),
+            teacher=self.teacher,
+        )
+        self.student = user_model.objects.create_user(username="import_student")
+        Enrollment.objects.create(course=self.course, student=self.student)
+        self.assessment = Assessment.objects.create(
+            course=self.course,
+            title="Зачёт",
+            assessment_type=Assessment.AssessmentType.JURY,
+        )
+        self.grade = Grade.objects.create(assessment=self.assessment, student=self.student, score=60, comment="Старый")
+        self.url = reverse("teacher_course_grades_import", args=[self.course.id])
+        self.client.force_login(self.teacher)
+        staging = tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        self.staging_root = Path(staging.name)
+        settings_override = override_settings(GRADE_IMPORT_STAGING_ROOT=self.staging_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _upload(self, content: str, **extra):
+        upload = SimpleUploadedFile("grades.csv", content.encode("utf-8"), content_type="text/csv")
+        return self.client.post(self.url, data={"file": upload, "assessment_type": "JURY", **extra})
+
+    def test_preview_then_apply_writes_changes_in_one_step(self):
+        response = self._upload(
+            "Логин;Контрольная точка;Результат\n"
+            "import_student;Зачёт;95\n"
+            "import_student;Экзамен;88\n"
+            "ghost;Зачёт;50\n"
+            "import_student;Гаммы;101\n",
+            create_missing="on",
+        )
+
+        plan = response.context["plan"]
+        self.assertEqual([change.assessment_title for change in plan.changes], ["Зачёт", "Экзамен"])
+        self.assertEqual([line for line, _message in plan.errors], [4, 5])
+        self.assertEqual(plan.new_titles, ["Экзамен"])
+        self.grade.refresh_from_db()
+        self.assertEqual(self.grade.score, 60)
+
+        apply_response = self.client.post(self.url, data={"apply": "1"})
+
+        self.assertEqual(apply_response.status_code, 302)
+        self.grade.refresh_from_db()
+        self.assertEqual((self.grade.score, self.grade.comment), (95, "Старый"))
+        exam = Assessment.objects.get(course=self.course, title="Экзамен")
+        self.assertEqual(Grade.objects.get(assessment=exam).score, 88)
+
+    def test_apply_reports_cells_changed_after_preview(self):
+        self._upload("username,assessment,score,comment\nimport_student,Зачёт,70,Ровно\n")
+        Grade.objects.filter(pk=self.grade.pk).update(score=65, version=5)
+
+        self.client.post(self.url, data={"apply": "1"})
+
+        self.grade.refresh_from_db()
+        self.assertEqual(self.grade.score, 65)
+
+    def test_apply_runs_a_fixed_number_of_queries(self):
+        user_model = get_user_model()
+        students = [self.student] + [user_model.objects.create_user(username=f"import_{index}") for index in range(29)]
+        Enrollment.objects.bulk_create(Enrollment(course=self.course, student=student) for student in students[1:])
+        lines = [
+            f"{student.username};{title};{(index * 7) % 100}"
+            for title in ("Зачёт", "Гаммы", "Этюд", "Пьеса", "Экзамен")
+            for index, student in enumerate(students)
+        ]
+        response = self._upload("Логин;Контрольная точка;Результат\n" + "\n".join(lines), create_missing="on")
+        payload = pop_import_preview(self.client.session[f"grades_import:{self.course.id}"])["payload"]
+        self.assertEqual(len(payload), 150)
+        self.assertEqual(len(response.context["plan"].new_titles), 4)
+
+        # Reads, one grade INSERT and one UPDATE, the stats refresh and savepoints: nothing per cell.
+        with self.assertNumQueries(17):
+            report = apply_grade_import(payload, course=self.course)
+
+        self.assertEqual((report.created, report.updated, report.errors), (149, 1, []))
+        self.assertEqual(Grade.objects.filter(assessment__course=self.course).count(), 150)
+
+    def test_apply_skips_students_who_left_the_course_after_preview(self):
+        self._upload("username,assessment,score\nimport_student,Зачёт,70\n")
+        Enrollment.objects.filter(course=self.course, student=self.student).delete()
+
+        report = apply_grade_import(
+            pop_import_preview(self.client.session[f"grades_import:{self.course.id}"])["payload"], course=self.course
+        )
+
+        self.assertEqual([error.message for error in report.errors], [NOT_ENROLLED_ERROR])
+        self.grade.refresh_from_db()
+        self.assertEqual(self.grade.score, 60)
+
+    def test_preview_is_staged_on_disk_and_applied_once(self):
+        self._upload("username,assessment,score\nimport_student,Зачёт,70\n")
+
+        token = self.client.session[f"grades_import:{self.course.id}"]
+        self.assertIsInstance(token, str)
+        self.assertEqual([path.name for path in self.staging_root.iterdir()], [f"{token}.json"])
+
+        self.client.post(self.url, data={"apply": "1"})
+        self.assertEqual(list(self.staging_root.iterdir()), [])
+        self.assertEqual(pop_import_preview(token), None)
+        self.grade.refresh_from_db()
+        self.assertEqual(self.grade.score, 70)
+
+    def test_ambiguous_assessment_titles_are_rejected(self):
+        response = self._upload("username,assessment,score\nimport_student, зачёт ,70\n")
+        self.assertEqual([change.assessment_title for change in response.context["plan"].changes], ["Зачёт"])
+
+        duplicate = Assessment.objects.create(
+            course=self.course,
+            title="ЗАЧЁТ",
+            assessment_type=Assessment.AssessmentType.JURY,
+        )
+        response = self._upload("username,assessment,score\nimport_student,Зачёт,70\n")
+
+        plan = response.context["plan"]
+        self.assertEqual(plan.changes, [])
+        self.assertEqual(len(plan.errors), 1)
+        self.assertIn("Несколько контрольных точек", plan.errors[0][1])
+        self.assertFalse(Grade.objects.filter(assessment=duplicate).exists())
+
+
 class SeedDemoCommandTests(TestCase):
     def test_seed_demo_sets_teacher_mode_and_group_ready_data(self):
         call_command("seed_demo")
@@ -76,3 +616,116 @@ class SeedDemoCommandTests(TestCase):
 
         self.assertEqual(teacher.profile.teacher_mode, Profile.TeacherMode.BOTH)
         self.assertTrue(Enrollment.objects.filter(course=theory_course, student=student_two).exists())
+
+
+@skipUnless(connection.vendor == "sqlite", "BEGIN IMMEDIATE is SQLite-specific")
+class GradeWriteLockTests(TransactionTestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.teacher = user_model.objects.create_user(username="lock_teacher", password="pass12345")
+        Profile.objects.create(user=self.teacher, role=Profile.Role.TEACHER)
+        self.student = user_model.objects.create_user(username="lock_student", password="pass12345")
+        Profile.objects.create(user=self.student, role=Profile.Role.STUDENT)
+        self.course = Course.objects.create(
+            name="Домра", course_type=CourseType.objects.create(name="Домра"), teacher=self.teacher
+        )
+        Enrollment.objects.create(course=self.course, student=self.student)
+        self.assessment = Assessment.objects.create(course=self.course, title="Гамма")
+        self.client.force_login(self.teacher)
+
+    def test_autosave_takes_the_write_lock_at_begin(self):
+        cell = {"student_id": self.student.id, "assessment_id": self.assessment.id, "score": "90", "version": 0}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                reverse("teacher_course_grades_autosave", args=[self.course.id]),
+                data=json.dumps({"cells": [cell]}),
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("BEGIN IMMEDIATE", [query["sql"] for query in queries.captured_queries])
+        self.assertEqual(Grade.objects.get().score, 90)
+
+    def test_student_results_post_takes_the_write_lock_at_begin(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f"/teacher/students/{self.student.id}/results/", {f"grade-{self.assessment.id}": "75"}
+            )
+
+        self.assertEqual(response.status_code, 302)
+        sql = [query["sql"] for query in queries.captured_queries]
+        self.assertIn("BEGIN IMMEDIATE", sql)
+        # The grades are read after the lock is taken.
+        grade_reads = [index for index, statement in enumerate(sql) if statement.startswith('SELECT "gradebook_grade"')]
+        self.assertLess(sql.index("BEGIN IMMEDIATE"), grade_reads[0])
+        self.assertEqual(Grade.objects.get().score, 75)
+
+
+class SqliteConcurrencyStressTests(SimpleTestCase):
+    WRITERS = 4
+    READERS = 4
+    WRITES_PER_WRITER = 50
+
+    def test_concurrent_readers_and_writers_do_not_hit_database_is_locked(self):
+        # Same PRAGMAs as production connections, on a file database (WAL needs one).
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "stress.sqlite3")
+
+        def connect():
+            conn = sqlite3.connect(path, timeout=0, isolation_level=None, check_same_thread=False)
+            apply_sqlite_pragmas(conn)
+            return conn
+
+        setup = connect()
+        self.assertEqual(setup.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        setup.execute("CREATE TABLE grade (student INTEGER, score INTEGER, version INTEGER)")
+        setup.close()
+
+        errors = []
+        writers_done = threading.Event()
+        start = threading.Barrier(self.WRITERS + self.READERS)
+
+        def writer(student):
+            conn = connect()
+            start.wait()
+            try:
+                for score in range(self.WRITES_PER_WRITER):
+                    # Read-then-write, like save_grade_cells after loading grade_map.
+                    conn.execute("BEGIN IMMEDIATE")
+                    version = conn.execute("SELECT count(*) FROM grade WHERE student = ?", (student,)).fetchone()[0]
+                    conn.execute("INSERT INTO grade VALUES (?, ?, ?)", (student, score, version + 1))
+                    conn.execute("COMMIT")
+            except sqlite3.OperationalError as exc:
+                errors.append(exc)
+            finally:
+                conn.close()
+
+        def reader():
+            conn = connect()
+            start.wait()
+            try:
+                while not writers_done.is_set():
+                    conn.execute("SELECT student, max(version) FROM grade GROUP BY student").fetchall()
+            except sqlite3.OperationalError as exc:
+                errors.append(exc)
+            finally:
+                conn.close()
+
+        readers = [threading.Thread(target=reader) for _ in range(self.READERS)]
+        writers = [threading.Thread(target=writer, args=(student,)) for student in range(self.WRITERS)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        writers_done.set()
+        for thread in readers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        check = sqlite3.connect(path)
+        self.addCleanup(check.close)
+        self.assertEqual(
+            check.execute("SELECT count(*), count(DISTINCT student || '-' || version) FROM grade").fetchone(),
+            (self.WRITERS * self.WRITES_PER_WRITER, self.WRITERS * self.WRITES_PER_WRITER),
+        )
@@ -1,16 +1,38 @@
 # apps/gradebook/urls.py
 from django.urls import path
 from .views import (
+    admin_grades_export,
     teacher_course_grades,
     student_course_grades,
+    teacher_course_grades_autosave,
     teacher_course_grades_bulk_clear,
+    teacher_course_grades_export,
+    teacher_course_grades_import,
     teacher_group_grades,
+    teacher_group_grades_export,
     teacher_student_results,
 )
 
 urlpatterns = [
     path("teacher/courses/<int:course_id>/grades/", teacher_course_grades, name="teacher_course_grades"),
     path("teacher/groups/<int:group_id>/grades/", teacher_group_grades, name="teacher_group_grades"),
+    path(
+        "teacher/courses/<int:course_id>/grades/export/",
+        teacher_course_grades_export,
+        name="teacher_course_grades_export",
+    ),
+    path(
+        "teacher/courses/<int:course_id>/grades/import/",
+        teacher_course_grades_import,
+        name="teacher_course_grades_import",
+    ),
+    path("teacher/groups/<int:group_id>/grades/export/", teacher_group_grades_export, name="teacher_group_grades_export"),
+    path("grades/export/", admin_grades_export, name="admin_grades_export"),
+    path(
+        "teacher/courses/<int:course_id>/grades/cells/",
+        teacher_course_grades_autosave,
+        name="teacher_course_grades_autosave",
+    ),
     path(
         "teacher/courses/<int:course_id>/grades/bulk-clear/",
         teacher_course_grades_bulk_clear,
@@ -1,21 +1,129 @@
 # apps/gradebook/views.py
+import json
 from decimal import Decimal
 from django.contrib import messages
+from django.db.models import F
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponseForbidden
-from django.db import transaction
-from django.views.decorators.http import require_POST
+from django.http import Http404, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods, require_POST
 from urllib.parse import urlencode
 
+from apps.accounts.dashboard_cache import invalidate_student_dashboards
 from apps.accounts.decorators import role_required
 from apps.accounts.models import Profile
 from apps.accounts.utils import get_user_display_name
 from apps.homework.models import AssignmentTarget
 from apps.school.models import Course, Enrollment, ParentChild
 from apps.school.utils import get_teacher_group_or_404, get_teacher_student_or_404, resolve_teacher_course_for_student
-from apps.text_limits import TEXT_CHAR_LIMIT, char_limit_error, exceeds_char_limit
-from .models import Assessment, Grade
-from .services import compute_average_percent
+from apps.sqlite_tuning import immediate_atomic
+from .forms import GradeImportForm
+from .imports import (
+    apply_grade_import,
+    build_grade_import_plan,
+    discard_import_preview,
+    pop_import_preview,
+    stash_import_preview,
+)
+from .exports import (
+    CSV_CONTENT_TYPE,
+    EXPORT_FORMATS,
+    XLSX_CONTENT_TYPE,
+    iter_course_grade_rows,
+    iter_csv,
+    iter_school_grade_rows,
+    iter_xlsx,
+)
+from .models import Assessment, CourseStudentStats, Grade
+from .services import (
+    GradeCell,
+    GradeWriteReport,
+    compute_average_percent,
+    refresh_course_student_stats,
+    save_grade_cells,
+)
+
+
+AUTOSAVE_MAX_CELLS = 500
+
+
+def _grid_cells_from_post(post, students, assessments) -> list[GradeCell]:
+    return [
+        GradeCell(
+            student_id=student.id,
+            assessment_id=assessment.id,
+            raw_score=post.get(f"grade-{student.id}-{assessment.id}") or "",
+            raw_comment=post.get(f"comment-{student.id}-{assessment.id}") or "",
+        )
+        for student in students
+        for assessment in assessments
+    ]
+
+
+def _report_grid_errors(request, report: GradeWriteReport, students, assessments) -> None:
+    names = {student.id: get_user_display_name(student) for student in students}
+    titles = {assessment.id: assessment.title for assessment in assessments}
+    for error in report.errors:
+        messages.error(request, f"{error.message}: {names[error.student_id]} / {titles[error.assessment_id]}")
+
+
+def _get_grades_course_or_404(request, course_id: int) -> Course:
+    if request.user.profile.role == Profile.Role.ADMIN:
+        return get_object_or_404(Course, id=course_id)
+    return get_object_or_404(Course, id=course_id, teacher=request.user)
+
+
+def _parse_autosave_cells(body: bytes) -> list[GradeCell] | None:
+    try:
+        payload = json.loads(body or b"{}")
+    except (TypeError, ValueError):
+        return None
+    raw_cells = payload.get("cells") if isinstance(payload, dict) else None
+    if not isinstance(raw_cells, list) or len(raw_cells) > AUTOSAVE_MAX_CELLS:
+        return None
+
+    # The last edit of a cell wins when the client sends it twice in one batch.
+    cells: dict[tuple[int, int], GradeCell] = {}
+    for raw in raw_cells:
+        if not isinstance(raw, dict):
+            return None
+        try:
+            student_id = int(raw["student_id"])
+            assessment_id = int(raw["assessment_id"])
+            version = int(raw.get("version") or 0)
+        except (KeyError, TypeError, ValueError):
+            return None
+        score = raw.get("score")
+        cells[(student_id, assessment_id)] = GradeCell(
+            student_id=student_id,
+            assessment_id=assessment_id,
+            raw_score="" if score is None else str(score),
+            raw_comment=str(raw.get("comment") or ""),
+            version=version,
+        )
+    return list(cells.values())
+
+
+def _grade_cell_payload(student_id: int, assessment_id: int, grade: Grade | None) -> dict:
+    return {
+        "student_id": student_id,
+        "assessment_id": assessment_id,
+        "score": None if grade is None or grade.score is None else format(grade.score.normalize(), "f"),
+        "comment": grade.comment if grade else "",
+        "version": grade.version if grade else 0,
+    }
+
+
+def _grades_export_response(request, rows_factory, filename: str) -> StreamingHttpResponse:
+    export_format = request.GET.get("format") or "csv"
+    if export_format not in EXPORT_FORMATS:
+        raise Http404
+    if export_format == "xlsx":
+        response = StreamingHttpResponse(iter_xlsx(rows_factory(numeric=True)), content_type=XLSX_CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(iter_csv(rows_factory(numeric=False)), content_type=CSV_CONTENT_TYPE)
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{export_format}"'
+    return response
 
 
 def _build_teacher_grades_url(course_id: int, cycle: str) -> str:
@@ -26,13 +134,14 @@ def _build_teacher_grades_url(course_id: int, cycle: str) -> str:
     return f"{base}?{urlencode(params)}" if params else base
 
 
+def _course_grade_map(course, students) -> dict[tuple[int, int], Grade]:
+    grades = Grade.objects.filter(assessment__course=course, student__in=students).select_related("assessment", "student")
+    return {(grade.student_id, grade.assessment_id): grade for grade in grades}
+
+
 @role_required(Profile.Role.TEACHER, Profile.Role.ADMIN)
 def teacher_course_grades(request, course_id: int):
-    profile = request.user.profile
-    if profile.role == Profile.Role.ADMIN:
-        course = get_object_or_404(Course, id=course_id)
-    else:
-        course = get_object_or_404(Course, id=course_id, teacher=request.user)
+    course = _get_grades_course_or_404(request, course_id)
     cycle = request.GET.get("cycle") or ""
     select_mode = request.GET.get("select") == "1"
     assessments = list(Assessment.objects.filter(course=course).order_by("id"))
@@ -42,49 +151,19 @@ def teacher_course_grades(request, course_id: int):
     enrollments = list(enrollments_qs.order_by("student__first_name", "student__last_name", "student__username"))
     students = [e.student for e in enrollments]
 
-    grades = Grade.objects.filter(assessment__course=course, student__in=students).select_related("assessment", "student")
-    grade_map: dict[tuple[int, int], Grade] = {(g.student_id, g.assessment_id): g for g in grades}
-
     if request.method == "POST":
-        with transaction.atomic():
-            for student in students:
-                for a in assessments:
-                    score_key = f"grade-{student.id}-{a.id}"
-                    comment_key = f"comment-{student.id}-{a.id}"
-                    raw_score = (request.POST.get(score_key) or "").strip()
-                    raw_comment = (request.POST.get(comment_key) or "").strip()
-                    if raw_comment and exceeds_char_limit(raw_comment, TEXT_CHAR_LIMIT):
-                        student_name = get_user_display_name(student)
-                        messages.error(
-                            request,
-                            f"{char_limit_error(TEXT_CHAR_LIMIT)}: {student_name} / {a.title}",
-                        )
-                        continue
-
-                    score_val = None
-                    if raw_score != "":
-                        student_name = get_user_display_name(student)
-                        if not raw_score.isdigit():
-                            messages.error(request, f"Некорректный результат: {student_name} / {a.title}")
-                            continue
-                        try:
-                            score_int = int(raw_score)
-                        except ValueError:
-                            messages.error(request, f"Некорректный результат: {student_name} / {a.title}")
-                            continue
-                        if score_int < 0 or score_int > 100:
-                            messages.error(request, f"Результат вне диапазона 0–100: {student_name} / {a.title}")
-                            continue
-                        score_val = Decimal(score_int)
-
-                    obj, _created = Grade.objects.get_or_create(assessment=a, student=student)
-                    obj.score = score_val
-                    obj.comment = raw_comment
-                    obj.save()
-
+        # The version check compares against grade_map, so read and write it under one write lock.
+        with immediate_atomic():
+            report = save_grade_cells(
+                _grid_cells_from_post(request.POST, students, assessments),
+                grade_map=_course_grade_map(course, students),
+            )
+        _report_grid_errors(request, report, students, assessments)
         messages.success(request, "Результаты сохранены.")
         return redirect(f"/teacher/courses/{course.id}/grades/")
 
+    grade_map = _course_grade_map(course, students)
+
     table_rows = []
     for s in students:
         cells = []
@@ -122,49 +201,18 @@ def teacher_group_grades(request, group_id: int):
         .order_by("student__first_name", "student__last_name", "student__username")
     )
     students = [enrollment.student for enrollment in enrollments]
-    grades = Grade.objects.filter(assessment__course=group, student__in=students).select_related("assessment", "student")
-    grade_map: dict[tuple[int, int], Grade] = {(grade.student_id, grade.assessment_id): grade for grade in grades}
-
     if request.method == "POST":
-        with transaction.atomic():
-            for student in students:
-                for assessment in assessments:
-                    score_key = f"grade-{student.id}-{assessment.id}"
-                    comment_key = f"comment-{student.id}-{assessment.id}"
-                    raw_score = (request.POST.get(score_key) or "").strip()
-                    raw_comment = (request.POST.get(comment_key) or "").strip()
-                    if raw_comment and exceeds_char_limit(raw_comment, TEXT_CHAR_LIMIT):
-                        student_name = get_user_display_name(student)
-                        messages.error(
-                            request,
-                            f"{char_limit_error(TEXT_CHAR_LIMIT)}: {student_name} / {assessment.title}",
-                        )
-                        continue
-
-                    score_val = None
-                    if raw_score != "":
-                        student_name = get_user_display_name(student)
-                        if not raw_score.isdigit():
-                            messages.error(request, f"Некорректный результат: {student_name} / {assessment.title}")
-                            continue
-                        try:
-                            score_int = int(raw_score)
-                        except ValueError:
-                            messages.error(request, f"Некорректный результат: {student_name} / {assessment.title}")
-                            continue
-                        if score_int < 0 or score_int > 100:
-                            messages.error(request, f"Результат вне диапазона 0–100: {student_name} / {assessment.title}")
-                            continue
-                        score_val = Decimal(score_int)
-
-                    obj, _created = Grade.objects.get_or_create(assessment=assessment, student=student)
-                    obj.score = score_val
-                    obj.comment = raw_comment
-                    obj.save()
-
+        with immediate_atomic():
+            report = save_grade_cells(
+                _grid_cells_from_post(request.POST, students, assessments),
+                grade_map=_course_grade_map(group, students),
+            )
+        _report_grid_errors(request, report, students, assessments)
         messages.success(request, "Результаты сохранены.")
         return redirect(f"/teacher/groups/{group.id}/grades/")
 
+    grade_map = _course_grade_map(group, students)
+
     table_rows = []
     for student in students:
         cells = []
@@ -184,14 +232,121 @@ def teacher_group_grades(request, group_id: int):
     )
 
 
+@role_required(Profile.Role.TEACHER, Profile.Role.ADMIN)
+def teacher_course_grades_export(request, course_id: int):
+    course = _get_grades_course_or_404(request, course_id)
+    cycle = request.GET.get("cycle") or ""
+    return _grades_export_response(
+        request,
+        lambda numeric: iter_course_grade_rows(course, cycle=cycle, numeric=numeric),
+        f"grades-course-{course.id}",
+    )
+
+
+@role_required(Profile.Role.TEACHER)
+def teacher_group_grades_export(request, group_id: int):
+    if not request.user.profile.can_access_group_teacher_flow:
+        return redirect("/teacher/class/")
+    group = get_teacher_group_or_404(request.user, group_id)
+    return _grades_export_response(
+        request,
+        lambda numeric: iter_course_grade_rows(group, numeric=numeric),
+        f"grades-group-{group.id}",
+    )
+
+
+@role_required(Profile.Role.ADMIN)
+def admin_grades_export(request):
+    return _grades_export_response(request, lambda numeric: iter_school_grade_rows(numeric=numeric), "grades-school")
+
+
+@role_required(Profile.Role.TEACHER, Profile.Role.ADMIN)
+def teacher_course_grades_import(request, course_id: int):
+    course = _get_grades_course_or_404(request, course_id)
+    session_key = f"grades_import:{course.id}"
+
+    if request.method == "POST" and request.POST.get("apply"):
+        pending = pop_import_preview(request.session.pop(session_key, None))
+        if not pending:
+            messages.error(request, "Предпросмотр устарел. Загрузите файл ещё раз.")
+            return redirect(f"/teacher/courses/{course.id}/grades/import/")
+        report = apply_grade_import(pending["payload"], course=course, assessment_type=pending["assessment_type"])
+        for error in report.errors:
+            messages.error(request, f"{error.message}: строка пропущена.")
+        messages.success(request, f"Импорт завершён: добавлено {report.created}, обновлено {report.updated}.")
+        return redirect(f"/teacher/courses/{course.id}/grades/")
+
+    form = GradeImportForm(request.POST or None, request.FILES or None)
+    plan = None
+    if request.method == "POST" and form.is_valid():
+        plan = build_grade_import_plan(
+            form.cleaned_data["file"],
+            course=course,
+            create_missing=form.cleaned_data["create_missing"],
+        )
+        discard_import_preview(request.session.pop(session_key, None))
+        if plan.payload:
+            request.session[session_key] = stash_import_preview(
+                {"payload": plan.payload, "assessment_type": form.cleaned_data["assessment_type"]}
+            )
+
+    return render(
+        request,
+        "gradebook/grades_import.html",
+        {
+            "course": course,
+            "form": form,
+            "plan": plan,
+        },
+    )
+
+
+@require_http_methods(["PATCH"])
+@role_required(Profile.Role.TEACHER, Profile.Role.ADMIN)
+def teacher_course_grades_autosave(request, course_id: int):
+    course = _get_grades_course_or_404(request, course_id)
+    cells = _parse_autosave_cells(request.body)
+    if cells is None:
+        return JsonResponse({"error": "Некорректный запрос."}, status=400)
+
+    student_ids = {cell.student_id for cell in cells}
+    assessment_ids = {cell.assessment_id for cell in cells}
+    allowed_student_ids = set(
+        Enrollment.objects.filter(course=course, student_id__in=student_ids).values_list("student_id", flat=True)
+    )
+    allowed_assessment_ids = set(
+        Assessment.objects.filter(course=course, id__in=assessment_ids).values_list("id", flat=True)
+    )
+    if student_ids - allowed_student_ids or assessment_ids - allowed_assessment_ids:
+        return JsonResponse({"error": "Нет доступа к выбранным ячейкам."}, status=403)
+
+    with immediate_atomic():
+        grade_map = {
+            (grade.student_id, grade.assessment_id): grade
+            for grade in Grade.objects.filter(
+                assessment_id__in=assessment_ids,
+                student_id__in=student_ids,
+            )
+        }
+        report = save_grade_cells(cells, grade_map=grade_map)
+
+    failed = {(error.student_id, error.assessment_id): error.message for error in report.errors}
+    saved = []
+    errors = []
+    for cell in cells:
+        key = (cell.student_id, cell.assessment_id)
+        payload = _grade_cell_payload(cell.student_id, cell.assessment_id, grade_map.get(key))
+        if key in failed:
+            errors.append({**payload, "message": failed[key]})
+        else:
+            saved.append(payload)
+    return JsonResponse({"saved": saved, "errors": errors})
+
+
 @require_POST
 @role_required(Profile.Role.TEACHER, Profile.Role.ADMIN)
 def teacher_course_grades_bulk_clear(request, course_id: int):
-    profile = request.user.profile
-    if profile.role == Profile.Role.ADMIN:
-        course = get_object_or_404(Course, id=course_id)
-    else:
-        course = get_object_or_404(Course, id=course_id, teacher=request.user)
+    course = _get_grades_course_or_404(request, course_id)
 
     cycle = request.POST.get("cycle") or ""
     redirect_url = _build_teacher_grades_url(course.id, cycle)
@@ -210,7 +365,15 @@ def teacher_course_grades_bulk_clear(request, course_id: int):
     if len(existing_ids) != len(set(selected_ids)):
         return HttpResponseForbidden("Нет доступа к очистке выбранных результатов.")
 
-    updated = Grade.objects.filter(assessment_id__in=existing_ids, assessment__course=course).update(score=None, comment="")
+    with immediate_atomic():
+        updated = Grade.objects.filter(assessment_id__in=existing_ids, assessment__course=course).update(
+            score=None,
+            comment="",
+            version=F("version") + 1,
+            updated_at=timezone.now(),
+        )
+        refresh_course_student_stats(course_ids=[course.id])
+    invalidate_student_dashboards(Enrollment.objects.filter(course=course).values_list("student_id", flat=True))
     messages.success(request, f"Очищено результатов: {updated}.")
     return redirect(redirect_url)
 
@@ -247,24 +410,15 @@ def student_course_grades(request, course_id: int):
     grades = Grade.objects.filter(assessment__in=assessments, student=student).select_related("assessment")
     grades_by_assessment_id = {g.assessment_id: g for g in grades}
 
+    # The grades are loaded for the table anyway, so the percent is exact rather than read from the stats row.
     avg_percent = compute_average_percent(assessments, grades_by_assessment_id)
+    stats = CourseStudentStats.objects.filter(course=course, student=student).first()
 
     # ---- Progress summary + trend ----
-    # If homework app doesn't have AssignmentTarget yet, this import will fail.
-    # In that case either create it or temporarily wrap this block in try/except.
-    from django.utils import timezone
-
     today = timezone.localdate()
 
     # average of non-null grade scores in this course
-    non_null_scores = [g.score for g in grades_by_assessment_id.values() if g.score is not None]
-    avg_val = None
-    if non_null_scores:
-        try:
-            avg_val = sum([float(x) for x in non_null_scores]) / len(non_null_scores)
-            avg_val = round(avg_val, 2)
-        except Exception:
-            avg_val = None
+    avg_val = round(float(stats.average_score), 2) if stats else None
 
     targets_qs = AssignmentTarget.objects.filter(student=student, assignment__course=course).select_related("assignment")
     assigned_cnt = targets_qs.count()
@@ -355,8 +509,31 @@ def teacher_student_results(request, student_id: int):
         return HttpResponseForbidden("У ученика несколько ваших курсов. Уточните курс у администратора.")
 
     assessments = list(Assessment.objects.filter(course=course).order_by("id"))
-    grades = Grade.objects.filter(assessment__in=assessments, student=student).select_related("assessment")
-    grade_map = {g.assessment_id: g for g in grades}
+    grades = Grade.objects.filter(assessment__in=assessments, student=student)
+
+    if request.method == "POST":
+        cells = [
+            GradeCell(
+                student_id=student.id,
+                assessment_id=a.id,
+                raw_score=request.POST.get(f"grade-{a.id}") or "",
+                raw_comment=request.POST.get(f"comment-{a.id}") or "",
+            )
+            for a in assessments
+        ]
+        # Same as the course grid: read the stored grades and write the changes under one write lock.
+        with immediate_atomic():
+            report = save_grade_cells(
+                cells,
+                grade_map={(student.id, grade.assessment_id): grade for grade in grades},
+            )
+        titles = {a.id: a.title for a in assessments}
+        for error in report.errors:
+            messages.error(request, f"{error.message}: {titles[error.assessment_id]}")
+        messages.success(request, "Результаты сохранены.")
+        return redirect(f"/teacher/students/{student.id}/results/")
+
+    grade_map = {g.assessment_id: g for g in grades.select_related("assessment")}
     assignment_ids = [assessment.source_assignment_id for assessment in assessments if assessment.source_assignment_id]
     target_map = {
         target.assignment_id: target
@@ -366,40 +543,6 @@ def teacher_student_results(request, student_id: int):
         )
     }
 
-    if request.method == "POST":
-        with transaction.atomic():
-            for a in assessments:
-                score_key = f"grade-{a.id}"
-                comment_key = f"comment-{a.id}"
-                raw_score = (request.POST.get(score_key) or "").strip()
-                raw_comment = (request.POST.get(comment_key) or "").strip()
-                if raw_comment and exceeds_char_limit(raw_comment, TEXT_CHAR_LIMIT):
-                    messages.error(request, f"{char_limit_error(TEXT_CHAR_LIMIT)}: {a.title}")
-                    continue
-
-                score_val = None
-                if raw_score != "":
-                    if not raw_score.isdigit():
-                        messages.error(request, f"Некорректный результат: {a.title}")
-                        continue
-                    try:
-                        score_int = int(raw_score)
-                    except ValueError:
-                        messages.error(request, f"Некорректный результат: {a.title}")
-                        continue
-                    if score_int < 0 or score_int > 100:
-                        messages.error(request, f"Результат вне диапазона 0–100: {a.title}")
-                        continue
-                    score_val = Decimal(score_int)
-
-                obj, _created = Grade.objects.get_or_create(assessment=a, student=student)
-                obj.score = score_val
-                obj.comment = raw_comment
-                obj.save()
-
-        messages.success(request, "Результаты сохранены.")
-        return redirect(f"/teacher/students/{student.id}/results/")
-
     rows = [
         {
             "assessment": a,
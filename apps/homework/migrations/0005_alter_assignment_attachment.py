@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:28
+
+import apps.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homework', '0004_assignment_attachment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='assignment',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=apps.storage.ContentAddressedStorage(), upload_to='assignments/'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-17 01:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homework', '0005_alter_assignment_attachment'),
+        ('school', '0006_hot_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['course', 'due_date'], name='assignment_course_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmenttarget',
+            index=models.Index(fields=['student', 'status'], name='assigntarget_student_stat_idx'),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.conf import settings
 from django.db import models
 
 from apps.school.models import Course
+from apps.storage import ORIGINAL_NAME_MAX_LENGTH, AttachmentField, attachment_storage
 
 
 class Assignment(models.Model):
@@ -9,7 +10,15 @@ class Assignment(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True, default="")
     due_date = models.DateField()
-    attachment = models.FileField(upload_to="assignments/", blank=True, null=True)
+    attachment = AttachmentField(
+        upload_to="assignments/",
+        storage=attachment_storage,
+        blank=True,
+        null=True,
+        name_field="attachment_name",
+    )
+    # Name of the uploaded file; the stored blob is named by its content hash.
+    attachment_name = models.CharField(max_length=ORIGINAL_NAME_MAX_LENGTH, blank=True, default="")
 
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -20,6 +29,7 @@ class Assignment(models.Model):
 
     class Meta:
         ordering = ("due_date", "id")
+        indexes = [models.Index(fields=("course", "due_date"), name="assignment_course_due_idx")]
 
     def __str__(self) -> str:
         return f"{self.course.name}: {self.title}"
@@ -47,6 +57,7 @@ class AssignmentTarget(models.Model):
 
     class Meta:
         unique_together = ("assignment", "student")
+        indexes = [models.Index(fields=("student", "status"), name="assigntarget_student_stat_idx")]
 
     def __str__(self) -> str:
         student_name = (self.student.get_full_name() or "").strip() or "Без имени"
@@ -1,32 +1,191 @@
 from django.db import transaction
+from django.db.models import Q
 
+from apps.accounts.dashboard_cache import invalidate_student_dashboards
+from apps.accounts.library_service import rebuild_library_index
+from apps.accounts.models import LibraryVideo
 from apps.gradebook.models import Assessment, Grade
 from apps.school.models import Course, Enrollment
+from apps.school.services import grant_teacher_course_access
 from .models import Assignment, AssignmentTarget
 
 
-def build_unique_assessment_title(*, course: Course, base_title: str, due_date, exclude_assessment_id=None) -> str:
-    normalized_title = (base_title or "").strip() or "Домашнее задание"
-    qs = Assessment.objects.filter(course=course)
-    if exclude_assessment_id:
-        qs = qs.exclude(id=exclude_assessment_id)
-
-    if not qs.filter(title=normalized_title).exists():
+def _pick_free_assessment_title(normalized_title: str, due_date, taken: set[str]) -> str:
+    if normalized_title not in taken:
         return normalized_title
 
     dated_title = f"{normalized_title} ({due_date:%d.%m.%Y})"
-    if not qs.filter(title=dated_title).exists():
+    if dated_title not in taken:
         return dated_title
 
     suffix = 2
-    while True:
-        candidate = f"{dated_title} #{suffix}"
-        if not qs.filter(title=candidate).exists():
-            return candidate
+    while f"{dated_title} #{suffix}" in taken:
         suffix += 1
+    return f"{dated_title} #{suffix}"
+
+
+def build_unique_assessment_titles(
+    *,
+    course: Course,
+    requests: list[tuple[str, object]],
+    exclude_assessment_id=None,
+) -> list[str]:
+    """
+    Batch form of build_unique_assessment_title for (base_title, due_date) pairs.
+    Every existing title that could collide is fetched with one prefix query and the
+    free suffixes are picked in memory, so titles are also unique within the batch.
+    """
+    normalized_titles = [(base_title or "").strip() or "Домашнее задание" for base_title, _due_date in requests]
+    if not normalized_titles:
+        return []
+
+    prefix_filter = Q()
+    for normalized_title in set(normalized_titles):
+        prefix_filter |= Q(title__startswith=normalized_title)
+    qs = Assessment.objects.filter(prefix_filter, course=course)
+    if exclude_assessment_id:
+        qs = qs.exclude(id=exclude_assessment_id)
+    taken = set(qs.values_list("title", flat=True))
+
+    titles = []
+    for normalized_title, (_base_title, due_date) in zip(normalized_titles, requests):
+        title = _pick_free_assessment_title(normalized_title, due_date, taken)
+        taken.add(title)
+        titles.append(title)
+    return titles
+
+
+def build_unique_assessment_title(*, course: Course, base_title: str, due_date, exclude_assessment_id=None) -> str:
+    (title,) = build_unique_assessment_titles(
+        course=course,
+        requests=[(base_title, due_date)],
+        exclude_assessment_id=exclude_assessment_id,
+    )
+    return title
+
+
+def fan_out_targets_and_grades(*, assessments_by_assignment: dict[int, Assessment], student_ids: list[int]) -> None:
+    """
+    Set-based fan-out for any number of assignments: existing targets and grades are read
+    with one query each, the missing ones are bulk-created (ignore_conflicts keeps it idempotent).
+    """
+    if not assessments_by_assignment or not student_ids:
+        return
+
+    assignment_ids = list(assessments_by_assignment)
+    existing_targets = set(
+        AssignmentTarget.objects.filter(assignment_id__in=assignment_ids, student_id__in=student_ids).values_list(
+            "assignment_id",
+            "student_id",
+        )
+    )
+    AssignmentTarget.objects.bulk_create(
+        [
+            AssignmentTarget(assignment_id=assignment_id, student_id=sid, status=AssignmentTarget.Status.TODO)
+            for assignment_id in assignment_ids
+            for sid in student_ids
+            if (assignment_id, sid) not in existing_targets
+        ],
+        ignore_conflicts=True,
+    )
+    # ensure status is at least TODO (if existed)
+    if existing_targets:
+        AssignmentTarget.objects.filter(
+            assignment_id__in=assignment_ids,
+            student_id__in=student_ids,
+            status="",
+        ).update(status=AssignmentTarget.Status.TODO)
+
+    assessment_ids = [assessment.id for assessment in assessments_by_assignment.values()]
+    existing_grades = set(
+        Grade.objects.filter(assessment_id__in=assessment_ids, student_id__in=student_ids).values_list(
+            "assessment_id",
+            "student_id",
+        )
+    )
+    Grade.objects.bulk_create(
+        [
+            Grade(assessment_id=assessment_id, student_id=sid, score=None, comment="")
+            for assessment_id in assessment_ids
+            for sid in student_ids
+            if (assessment_id, sid) not in existing_grades
+        ],
+        ignore_conflicts=True,
+    )
+    # bulk writes bypass the AssignmentTarget/Grade signals
+    invalidate_student_dashboards(student_ids)
+    if Assignment.objects.filter(id__in=assignment_ids).exclude(attachment="").exclude(attachment__isnull=True).exists():
+        rebuild_library_index(student_ids)
 
 
 @transaction.atomic
+def create_assignments_with_targets_and_gradebook(
+    *,
+    teacher,
+    course: Course,
+    entries: list[dict[str, str]],
+    due_date,
+    attachments: list,
+    student_ids: list[int],
+    attachment_names: list[str] | None = None,
+) -> list[Assignment]:
+    """
+    Пакетное создание заданий (по одному на композицию из entries: title/task_text):
+    - Assignment создаются одним bulk_create (attachments[i] — файл для entries[i] или None;
+      attachment_names[i] — исходное имя файла, если attachments[i] уже сохранён в хранилище)
+    - на каждый Assignment создаётся связанный Assessment (названия подбираются одним запросом)
+    - AssignmentTarget(status=TODO) и Grade(score=None) для всех заданий и учеников
+      создаются set-based через fan_out_targets_and_grades
+    Идемпотентность обеспечивается unique constraints + ignore_conflicts.
+    """
+
+    # Ensure student_ids belong to enrollments of this course
+    enrolled_ids = set(
+        Enrollment.objects.filter(course=course, student_id__in=student_ids).values_list("student_id", flat=True)
+    )
+    safe_student_ids = list(dict.fromkeys(sid for sid in student_ids if sid in enrolled_ids))
+
+    assignments = Assignment.objects.bulk_create(
+        [
+            Assignment(
+                course=course,
+                title=entry["title"],
+                description=entry.get("task_text") or "",
+                due_date=due_date,
+                attachment=attachment,
+                attachment_name=attachment_name,
+                created_by=teacher,
+            )
+            for entry, attachment, attachment_name in zip(entries, attachments, attachment_names or [""] * len(entries))
+        ]
+    )
+    if assignments:
+        # bulk_create bypasses the TeacherCourseAccess signals
+        grant_teacher_course_access([(teacher.id, course.id)])
+
+    # One Assessment per Assignment; titles for the whole batch are allocated with a single query.
+    assessment_titles = build_unique_assessment_titles(
+        course=course,
+        requests=[(assignment.title, due_date) for assignment in assignments],
+    )
+    assessments = Assessment.objects.bulk_create(
+        [
+            Assessment(
+                source_assignment=assignment,
+                course=course,
+                title=assessment_title,
+                assessment_type=Assessment.AssessmentType.HOMEWORK,
+                max_score=100,
+                weight=1,
+            )
+            for assignment, assessment_title in zip(assignments, assessment_titles)
+        ]
+    )
+    assessments_by_assignment = {assessment.source_assignment_id: assessment for assessment in assessments}
+    fan_out_targets_and_grades(assessments_by_assignment=assessments_by_assignment, student_ids=safe_student_ids)
+    return assignments
+
+
 def create_assignment_with_targets_and_gradebook(
     *,
     teacher,
@@ -40,77 +199,43 @@ def create_assignment_with_targets_and_gradebook(
     """
     При создании Assignment:
     - создаём Assignment
-    - создаём или находим связанный Assessment (OneToOne через source_assignment)
-    - для каждого выбранного студента:
-        - get_or_create AssignmentTarget(status=TODO)
-        - get_or_create Grade(score=None)
-    Идемпотентность обеспечивается get_or_create + unique constraints.
+    - создаём связанный Assessment (OneToOne через source_assignment)
+    - для выбранных студентов создаём недостающие AssignmentTarget(status=TODO) и Grade(score=None)
     """
-
-    assignment = Assignment.objects.create(
+    (assignment,) = create_assignments_with_targets_and_gradebook(
+        teacher=teacher,
         course=course,
-        title=title,
-        description=task_text or "",
+        entries=[{"title": title, "task_text": task_text}],
         due_date=due_date,
-        attachment=attachment,
-        created_by=teacher,
-    )
-
-    assessment_title = build_unique_assessment_title(course=course, base_title=assignment.title, due_date=due_date)
-
-    # One Assessment per Assignment
-    assessment, _ = Assessment.objects.get_or_create(
-        source_assignment=assignment,
-        defaults={
-            "course": course,
-            "title": assessment_title,
-            "assessment_type": Assessment.AssessmentType.HOMEWORK,
-            "max_score": 100,
-            "weight": 1,
-        },
+        attachments=[attachment],
+        student_ids=student_ids,
     )
+    return assignment
 
-    # Keep shared assessment metadata aligned without breaking the per-course title uniqueness rule.
-    fields_to_update = []
-    if assessment.course_id != course.id:
-        assessment.course = course
-        fields_to_update.append("course")
-    if assessment.assessment_type != Assessment.AssessmentType.HOMEWORK:
-        assessment.assessment_type = Assessment.AssessmentType.HOMEWORK
-        fields_to_update.append("assessment_type")
-    if assessment.max_score != 100:
-        assessment.max_score = 100
-        fields_to_update.append("max_score")
-    if assessment.weight != 1:
-        assessment.weight = 1
-        fields_to_update.append("weight")
-    if not assessment.title:
-        assessment.title = assessment_title
-        fields_to_update.append("title")
-    if fields_to_update:
-        assessment.save(update_fields=fields_to_update)
 
-    # Ensure student_ids belong to enrollments of this course
-    enrolled_ids = set(
-        Enrollment.objects.filter(course=course, student_id__in=student_ids).values_list("student_id", flat=True)
+def sync_submission_video(*, target: AssignmentTarget, video_file):
+    """Attaches the student's answer video to the target, replacing the previous one."""
+    if not video_file:
+        return None
+
+    title = f"{target.assignment.title} — ответ ученика"
+    existing_video = getattr(target, "submission_video", None)
+    if existing_video:
+        if existing_video.video and existing_video.video.name != getattr(video_file, "name", ""):
+            existing_video.video.delete(save=False)
+        existing_video.teacher = target.assignment.created_by
+        existing_video.student = target.student
+        existing_video.course = target.assignment.course
+        existing_video.title = title
+        existing_video.video = video_file
+        existing_video.save()
+        return existing_video
+
+    return LibraryVideo.objects.create(
+        teacher=target.assignment.created_by,
+        student=target.student,
+        course=target.assignment.course,
+        assignment_target=target,
+        title=title,
+        video=video_file,
     )
-    safe_student_ids = [sid for sid in student_ids if sid in enrolled_ids]
-
-    for sid in safe_student_ids:
-        target, _ = AssignmentTarget.objects.get_or_create(
-            assignment=assignment,
-            student_id=sid,
-            defaults={"status": AssignmentTarget.Status.TODO},
-        )
-        # ensure status is at least TODO (if existed)
-        if not target.status:
-            target.status = AssignmentTarget.Status.TODO
-            target.save()
-
-        Grade.objects.get_or_create(
-            assessment=assessment,
-            student_id=sid,
-            defaults={"score": None, "comment": ""},
-        )
-
-    return assignment
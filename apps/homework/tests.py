@@ -6,7 +6,9 @@ from pathlib import Path
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from apps.accounts.models import LibraryVideo, Profile
 from apps.gradebook.models import Assessment, Grade
@@ -14,7 +16,13 @@ from apps.goals.models import Goal
 from apps.school.models import Course, CourseType, Enrollment, ParentChild
 
 from .models import Assignment, AssignmentTarget
-from .services import create_assignment_with_targets_and_gradebook
+from .views import _create_assignments
+from .services import (
+    build_unique_assessment_titles,
+    create_assignment_with_targets_and_gradebook,
+    create_assignments_with_targets_and_gradebook,
+    fan_out_targets_and_grades,
+)
 
 
 class HomeworkFlowTests(TestCase):
@@ -269,3 +277,117 @@ class HomeworkFlowTests(TestCase):
         assignment = Assignment.objects.get(title="Проверка для 4Б")
         target_student_ids = set(AssignmentTarget.objects.filter(assignment=assignment).values_list("student_id", flat=True))
         self.assertEqual(target_student_ids, {self.student.id})
+
+    def test_batch_assignment_fan_out_query_count_does_not_depend_on_students(self):
+        extra_students = [self._create_user(f"student_homework_batch_{index}", Profile.Role.STUDENT) for index in range(5)]
+        for extra_student in extra_students:
+            Enrollment.objects.create(course=self.course, student=extra_student)
+
+        def create_for(student_ids, prefix):
+            entries = [{"title": f"{prefix} {index}", "task_text": "Выучить"} for index in range(3)]
+            with CaptureQueriesContext(connection) as queries:
+                assignments = create_assignments_with_targets_and_gradebook(
+                    teacher=self.teacher,
+                    course=self.course,
+                    entries=entries,
+                    due_date=date(2026, 5, 4),
+                    attachments=[None] * len(entries),
+                    student_ids=student_ids,
+                )
+            return assignments, len(queries)
+
+        _assignments, single_student_queries = create_for([self.student.id], "Этюд")
+        assignments, all_students_queries = create_for(
+            [self.student.id, self.second_student.id] + [student.id for student in extra_students],
+            "Пьеса",
+        )
+
+        self.assertEqual(single_student_queries, all_students_queries)
+        self.assertEqual(AssignmentTarget.objects.filter(assignment__in=assignments).count(), 3 * 7)
+        self.assertEqual(Grade.objects.filter(assessment__source_assignment__in=assignments).count(), 3 * 7)
+
+        fan_out_targets_and_grades(
+            assessments_by_assignment={assignment.id: assignment.assessment for assignment in assignments},
+            student_ids=[self.student.id],
+        )
+        self.assertEqual(AssignmentTarget.objects.filter(assignment__in=assignments).count(), 3 * 7)
+
+    def test_unique_assessment_titles_are_allocated_with_one_query(self):
+        due_date = date(2026, 5, 4)
+        Assessment.objects.create(course=self.course, title="Гамма")
+        Assessment.objects.create(course=self.course, title="Гамма (04.05.2026)")
+        Assessment.objects.create(course=self.course, title="Гамма (04.05.2026) #2")
+        Assessment.objects.create(course=self.course, title="Гамма (04.05.2026) #4")
+
+        with self.assertNumQueries(1):
+            titles = build_unique_assessment_titles(
+                course=self.course,
+                requests=[("Гамма", due_date), ("  Гамма ", due_date), ("Этюд", due_date), ("Этюд", due_date), ("", due_date)],
+            )
+
+        self.assertEqual(
+            titles,
+            [
+                "Гамма (04.05.2026) #3",
+                "Гамма (04.05.2026) #5",
+                "Этюд",
+                "Этюд (04.05.2026)",
+                "Домашнее задание",
+            ],
+        )
+
+    def test_batch_assignments_with_same_title_get_distinct_assessments(self):
+        assignments = create_assignments_with_targets_and_gradebook(
+            teacher=self.teacher,
+            course=self.course,
+            entries=[{"title": "Гамма", "task_text": ""}, {"title": "Гамма", "task_text": ""}],
+            due_date=date(2026, 5, 4),
+            attachments=[None, None],
+            student_ids=[self.student.id],
+        )
+
+        self.assertEqual(
+            [Assessment.objects.get(source_assignment=assignment).title for assignment in assignments],
+            ["Гамма", "Гамма (04.05.2026)"],
+        )
+
+    def test_attachment_shared_by_compositions_is_stored_once_by_content(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            created_count = _create_assignments(
+                teacher=self.teacher,
+                course=self.course,
+                composition_entries=[{"title": "Этюд", "task_text": "Выучить"}, {"title": "Пьеса", "task_text": "Выучить"}],
+                due_date=date(2026, 5, 4),
+                attachment=SimpleUploadedFile("Ноты.PDF", b"%PDF-notes", content_type="application/pdf"),
+                student_ids=[self.student.id],
+            )
+            copied = create_assignment_with_targets_and_gradebook(
+                teacher=self.teacher,
+                course=self.course,
+                title="Гамма",
+                task_text="Выучить",
+                due_date=date(2026, 5, 4),
+                attachment=SimpleUploadedFile("copy.pdf", b"%PDF-notes", content_type="application/pdf"),
+                student_ids=[self.student.id],
+            )
+            other = create_assignment_with_targets_and_gradebook(
+                teacher=self.teacher,
+                course=self.course,
+                title="Арпеджио",
+                task_text="Выучить",
+                due_date=date(2026, 5, 4),
+                attachment=SimpleUploadedFile("other.pdf", b"%PDF-other", content_type="application/pdf"),
+                student_ids=[self.student.id],
+            )
+
+            names = set(Assignment.objects.filter(title__in=["Этюд", "Пьеса"]).values_list("attachment", flat=True))
+            self.assertEqual(created_count, 2)
+            self.assertEqual(len(names), 1)
+            shared_name = names.pop()
+            self.assertRegex(shared_name, r"^assignments/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$")
+            self.assertEqual(copied.attachment.name, shared_name)
+            self.assertNotEqual(other.attachment.name, shared_name)
+            stored_files = [path for path in Path(self.media_root, "assignments").rglob("*") if path.is_file()]
+            self.assertEqual(len(stored_files), 2)
+            self.assertEqual(Path(self.media_root, shared_name).read_bytes(), b"%PDF-notes")
+            self.assertFalse(list(Path(self.media_root).glob(".upload-*")))
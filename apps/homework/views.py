@@ -3,7 +3,6 @@ from datetime import date
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.files.base import ContentFile
 from django.db import transaction
 from django.http import HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
@@ -11,7 +10,7 @@ from django.views.decorators.http import require_POST
 from urllib.parse import urlencode
 
 from apps.accounts.decorators import role_required
-from apps.accounts.models import LibraryVideo, Profile
+from apps.accounts.models import Profile
 from apps.gradebook.models import Assessment
 from apps.goals.models import Goal
 from apps.school.models import Course, ParentChild
@@ -23,6 +22,7 @@ from apps.school.utils import (
     resolve_course_scope,
     resolve_teacher_course_for_student,
 )
+from apps.storage import store_field_file, uploaded_file_name
 from apps.text_limits import TEXT_CHAR_LIMIT, char_limit_error, exceeds_char_limit
 from .forms import (
     AssignmentCreateForm,
@@ -32,7 +32,12 @@ from .forms import (
     StudentAssignmentEditForm,
 )
 from .models import Assignment, AssignmentTarget
-from .services import build_unique_assessment_title, create_assignment_with_targets_and_gradebook
+from .services import (
+    build_unique_assessment_title,
+    create_assignment_with_targets_and_gradebook,
+    create_assignments_with_targets_and_gradebook,
+    sync_submission_video,
+)
 
 HALF_YEAR_I = "H1"
 HALF_YEAR_II = "H2"
@@ -204,33 +209,6 @@ def _get_half_year_plan_titles(*, student, selected_half_year: str) -> list[str]
     return _merge_unique_titles(goals.values_list("title", flat=True))
 
 
-def _sync_submission_video(*, target: AssignmentTarget, video_file):
-    if not video_file:
-        return None
-
-    title = f"{target.assignment.title} — ответ ученика"
-    existing_video = getattr(target, "submission_video", None)
-    if existing_video:
-        if existing_video.video and existing_video.video.name != getattr(video_file, "name", ""):
-            existing_video.video.delete(save=False)
-        existing_video.teacher = target.assignment.created_by
-        existing_video.student = target.student
-        existing_video.course = target.assignment.course
-        existing_video.title = title
-        existing_video.video = video_file
-        existing_video.save()
-        return existing_video
-
-    return LibraryVideo.objects.create(
-        teacher=target.assignment.created_by,
-        student=target.student,
-        course=target.assignment.course,
-        assignment_target=target,
-        title=title,
-        video=video_file,
-    )
-
-
 def _create_assignments(
     *,
     teacher,
@@ -240,29 +218,21 @@ def _create_assignments(
     attachment,
     student_ids: list[int],
 ) -> int:
-    copied_attachment_bytes = None
-    copied_attachment_name = ""
+    shared_attachment = attachment
     if attachment and len(composition_entries) > 1:
-        copied_attachment_bytes = attachment.read()
-        copied_attachment_name = attachment.name
-
-    created_count = 0
-    for entry in composition_entries:
-        prepared_attachment = attachment
-        if copied_attachment_bytes is not None:
-            prepared_attachment = ContentFile(copied_attachment_bytes, name=copied_attachment_name)
-
-        create_assignment_with_targets_and_gradebook(
-            teacher=teacher,
-            course=course,
-            title=entry["title"],
-            task_text=entry["task_text"],
-            due_date=due_date,
-            attachment=prepared_attachment,
-            student_ids=student_ids,
-        )
-        created_count += 1
-    return created_count
+        # Content-addressed storage: the upload is streamed to disk once and every assignment references that blob.
+        shared_attachment = store_field_file(Assignment, "attachment", attachment)
+
+    assignments = create_assignments_with_targets_and_gradebook(
+        teacher=teacher,
+        course=course,
+        entries=composition_entries,
+        due_date=due_date,
+        attachments=[shared_attachment] * len(composition_entries),
+        attachment_names=[uploaded_file_name(attachment)] * len(composition_entries),
+        student_ids=student_ids,
+    )
+    return len(assignments)
 
 
 def _validate_composition_entries(composition_entries: list[dict[str, str]], *, has_missing_title: bool = False) -> list[str]:
@@ -746,7 +716,7 @@ def assignment_edit_for_student(request, student_id: int, assignment_id: int):
             update_fields = ["title", "description", "due_date"]
             if attachment:
                 assignment.attachment = attachment
-                update_fields.append("attachment")
+                update_fields += ["attachment", "attachment_name"]
             assignment.save(update_fields=update_fields)
             _sync_assignment_assessment_title(assignment)
             messages.success(request, "Задание обновлено.")
@@ -798,7 +768,7 @@ def mark_done(request, target_id: int):
         student=request.user,
     )
     target.status = AssignmentTarget.Status.DONE
-    target.save()
+    target.save(update_fields=["status", "updated_at"])
 
     messages.success(request, "Отмечено как DONE (результат выставляется преподавателем отдельно).")
     return redirect("/assignments/")
@@ -823,7 +793,7 @@ def submit_assignment(request, target_id: int):
         target.student_comment = (form.cleaned_data.get("student_comment") or "").strip()
         target.status = AssignmentTarget.Status.DONE
         target.save(update_fields=["student_comment", "status", "updated_at"])
-        _sync_submission_video(target=target, video_file=form.cleaned_data.get("video"))
+        sync_submission_video(target=target, video_file=form.cleaned_data.get("video"))
 
     messages.success(request, "Ответ по заданию сохранён.")
     return redirect("/assignments/")
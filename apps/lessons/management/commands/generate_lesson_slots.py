@@ -0,0 +1,35 @@
+# apps/lessons/management/commands/generate_lesson_slots.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.lessons.models import StudentSchedule
+from apps.lessons.services import SLOT_GENERATION_DAYS, generate_slots
+
+
+class Command(BaseCommand):
+    help = (
+        "Keep a rolling horizon of planned lesson slots for all active schedules. "
+        "Run nightly (cron) or as a worker with --interval."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=SLOT_GENERATION_DAYS, help="Horizon in days from today.")
+        parser.add_argument("--teacher", type=int, action="append", dest="teacher_ids", help="Only this teacher id.")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Repeat every N seconds instead of running once (worker mode).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            schedules = StudentSchedule.objects.filter(active=True)
+            if options["teacher_ids"]:
+                schedules = schedules.filter(teacher_id__in=options["teacher_ids"])
+            created = generate_slots(schedules, days=options["days"])
+            self.stdout.write(self.style.SUCCESS(f"Lesson slots generated: {created}."))
+            if options["interval"] <= 0:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:28
+
+import apps.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0005_alter_lessonslot_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lesson',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=apps.storage.ContentAddressedStorage(), upload_to='lessons/'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-17 01:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0006_alter_lesson_attachment'),
+        ('school', '0006_hot_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['course', 'date'], name='lesson_course_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonslot',
+            index=models.Index(fields=['teacher', 'scheduled_date'], name='lessonslot_teacher_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonslot',
+            index=models.Index(fields=['student', 'scheduled_date'], name='lessonslot_student_date_idx'),
+        ),
+    ]
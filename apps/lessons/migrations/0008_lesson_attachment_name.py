@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-17 02:24
+
+import apps.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0007_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='attachment_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='attachment',
+            field=apps.storage.AttachmentField(blank=True, name_field='attachment_name', null=True, storage=apps.storage.ContentAddressedStorage(), upload_to='lessons/'),
+        ),
+    ]
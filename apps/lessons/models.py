@@ -2,6 +2,7 @@ from django.conf import settings
 from django.db import models
 
 from apps.school.models import Course
+from apps.storage import ORIGINAL_NAME_MAX_LENGTH, AttachmentField, attachment_storage
 
 
 class Lesson(models.Model):
@@ -9,10 +10,19 @@ class Lesson(models.Model):
     date = models.DateField()
     topic = models.CharField(max_length=200)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="created_lessons")
-    attachment = models.FileField(upload_to="lessons/", blank=True, null=True)
+    attachment = AttachmentField(
+        upload_to="lessons/",
+        storage=attachment_storage,
+        blank=True,
+        null=True,
+        name_field="attachment_name",
+    )
+    # Name of the uploaded file; the stored blob is named by its content hash.
+    attachment_name = models.CharField(max_length=ORIGINAL_NAME_MAX_LENGTH, blank=True, default="")
 
     class Meta:
         ordering = ("-date", "-id")
+        indexes = [models.Index(fields=("course", "date"), name="lesson_course_date_idx")]
 
     def __str__(self) -> str:
         return f"{self.course.name} {self.date}: {self.topic}"
@@ -163,6 +173,9 @@ class LessonSlot(models.Model):
                 fields=("schedule", "rescheduled_from_date", "rescheduled_from_time"),
                 name="lessonslot_resch_src_idx",
             ),
+            # Calendar week and attendance journal: one teacher's or one student's slots in a date range.
+            models.Index(fields=("teacher", "scheduled_date"), name="lessonslot_teacher_date_idx"),
+            models.Index(fields=("student", "scheduled_date"), name="lessonslot_student_date_idx"),
         ]
 
     def __str__(self) -> str:
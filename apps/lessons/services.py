@@ -10,6 +10,7 @@ from .models import LessonSlot, StudentSchedule
 
 SLOT_GENERATION_DAYS = 60
 FIXED_LESSON_DURATION_MINUTES = 40
+SLOT_BULK_CREATE_BATCH_SIZE = 500
 
 
 def delete_future_planned_slots_for_schedule(
@@ -40,53 +41,83 @@ def deactivate_schedule(
     return deleted_count
 
 
-def generate_slots_for_schedule(
-    schedule: StudentSchedule,
+def generate_slots(
+    schedules=None,
     *,
     start_date=None,
     days: int = SLOT_GENERATION_DAYS,
 ) -> int:
-    if not schedule.active:
+    """
+    Set-based generation of planned LessonSlot rows for active schedules over
+    [start_date, start_date + days]. Existing slots and rescheduled source dates are read
+    with one query each, the missing (teacher, student, date, time) tuples are computed
+    in Python and inserted with bulk_create; the query count does not depend on the horizon.
+    """
+    if schedules is None:
+        schedules = StudentSchedule.objects.filter(active=True)
+    schedules = [schedule for schedule in schedules if schedule.active]
+    if not schedules:
         return 0
 
-    created_count = 0
     today = start_date or timezone.localdate()
     end_date = today + timedelta(days=days)
-    skipped_source_pairs = set(
+    schedule_ids = [schedule.id for schedule in schedules]
+    teacher_ids = {schedule.teacher_id for schedule in schedules}
+    student_ids = {schedule.student_id for schedule in schedules}
+
+    existing_slots = set(
+        LessonSlot.objects.filter(
+            teacher_id__in=teacher_ids,
+            student_id__in=student_ids,
+            scheduled_date__gte=today,
+            scheduled_date__lte=end_date,
+        ).values_list("teacher_id", "student_id", "scheduled_date", "start_time")
+    )
+    skipped_sources = set(
         LessonSlot.objects.filter(
-            schedule=schedule,
+            schedule_id__in=schedule_ids,
             rescheduled_from_date__isnull=False,
             rescheduled_from_time__isnull=False,
             rescheduled_from_date__gte=today,
             rescheduled_from_date__lte=end_date,
-        ).values_list("rescheduled_from_date", "rescheduled_from_time")
+        ).values_list("schedule_id", "rescheduled_from_date", "rescheduled_from_time")
     )
 
-    for offset in range(days + 1):
-        slot_date = today + timedelta(days=offset)
-        if slot_date > end_date or slot_date.weekday() != schedule.weekday:
-            continue
-        if (slot_date, schedule.start_time) in skipped_source_pairs:
-            continue
-        _, created = LessonSlot.objects.get_or_create(
-            teacher=schedule.teacher,
-            student=schedule.student,
-            scheduled_date=slot_date,
-            start_time=schedule.start_time,
-            defaults={
-                "course": schedule.course,
-                "schedule": schedule,
-                "duration_minutes": FIXED_LESSON_DURATION_MINUTES,
-            },
-        )
-        if created:
-            created_count += 1
-    return created_count
+    new_slots = []
+    for schedule in schedules:
+        first_date = today + timedelta(days=(schedule.weekday - today.weekday()) % 7)
+        slot_date = first_date
+        while slot_date <= end_date:
+            slot_key = (schedule.teacher_id, schedule.student_id, slot_date, schedule.start_time)
+            if slot_key not in existing_slots and (schedule.id, slot_date, schedule.start_time) not in skipped_sources:
+                existing_slots.add(slot_key)
+                new_slots.append(
+                    LessonSlot(
+                        teacher_id=schedule.teacher_id,
+                        student_id=schedule.student_id,
+                        course_id=schedule.course_id,
+                        schedule=schedule,
+                        scheduled_date=slot_date,
+                        start_time=schedule.start_time,
+                        duration_minutes=FIXED_LESSON_DURATION_MINUTES,
+                    )
+                )
+            slot_date += timedelta(days=7)
+
+    # No TeacherCourseAccess grant needed: every slot repeats the (teacher, course) of its schedule.
+    # ignore_conflicts keeps concurrent runs (command + schedule edit) from failing on the unique key.
+    LessonSlot.objects.bulk_create(new_slots, batch_size=SLOT_BULK_CREATE_BATCH_SIZE, ignore_conflicts=True)
+    return len(new_slots)
+
+
+def generate_slots_for_schedule(
+    schedule: StudentSchedule,
+    *,
+    start_date=None,
+    days: int = SLOT_GENERATION_DAYS,
+) -> int:
+    return generate_slots([schedule], start_date=start_date, days=days)
 
 
 def generate_slots_for_teacher(teacher, *, days: int = SLOT_GENERATION_DAYS) -> int:
-    schedules = StudentSchedule.objects.filter(teacher=teacher, active=True).select_related("student", "course")
-    created_count = 0
-    for schedule in schedules:
-        created_count += generate_slots_for_schedule(schedule, days=days)
-    return created_count
+    return generate_slots(StudentSchedule.objects.filter(teacher=teacher, active=True), days=days)
@@ -1,11 +1,16 @@
+from datetime import date, time
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
 
 from apps.accounts.models import Profile
 from apps.school.models import Course, CourseInternalGroup, CourseType, Enrollment
 
-from .models import Lesson, LessonStudent
+from .models import Lesson, LessonSlot, LessonStudent, StudentSchedule
+from .services import generate_slots
 
 
 class GroupAttendanceTests(TestCase):
@@ -77,3 +82,71 @@ class GroupAttendanceTests(TestCase):
         lesson = Lesson.objects.get(course=self.group, topic="Ритм подгруппы")
         entries = list(LessonStudent.objects.filter(lesson=lesson).values_list("student_id", "attended"))
         self.assertEqual(entries, [(self.student_a.id, True)])
+
+
+class SlotGenerationTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.teacher = user_model.objects.create_user(username="slots_teacher", password="pass12345")
+        Profile.objects.create(user=self.teacher, role=Profile.Role.TEACHER)
+        self.students = []
+        for index in range(3):
+            student = user_model.objects.create_user(username=f"slots_student_{index}", password="pass12345")
+            Profile.objects.create(user=student, role=Profile.Role.STUDENT)
+            self.students.append(student)
+        self.course = Course.objects.create(
+            name="Фортепиано",
+            course_type=CourseType.objects.create(name="Фортепиано"),
+            teacher=self.teacher,
+        )
+        # 2026-04-20 is a Monday.
+        self.start_date = date(2026, 4, 20)
+
+    def _schedule(self, student, weekday, start_time=time(15, 0)):
+        return StudentSchedule.objects.create(
+            teacher=self.teacher,
+            student=student,
+            course=self.course,
+            weekday=weekday,
+            start_time=start_time,
+        )
+
+    def test_generation_is_set_based_and_idempotent(self):
+        schedules = [self._schedule(student, weekday) for weekday, student in enumerate(self.students)]
+        inactive = self._schedule(self.students[0], 4)
+        inactive.active = False
+        inactive.save(update_fields=["active"])
+
+        # schedules + existing slots + rescheduled sources + one bulk insert, whatever the horizon
+        with self.assertNumQueries(4):
+            created = generate_slots(start_date=self.start_date, days=27)
+
+        self.assertEqual(created, 12)
+        self.assertEqual(
+            sorted(LessonSlot.objects.filter(schedule=schedules[1]).values_list("scheduled_date", flat=True)),
+            [date(2026, 4, 21), date(2026, 4, 28), date(2026, 5, 5), date(2026, 5, 12)],
+        )
+        self.assertFalse(LessonSlot.objects.filter(schedule=inactive).exists())
+        self.assertEqual(generate_slots(start_date=self.start_date, days=27), 0)
+
+    def test_rescheduled_source_date_is_not_regenerated(self):
+        schedule = self._schedule(self.students[0], 0)
+        generate_slots([schedule], start_date=self.start_date, days=7)
+        slot = LessonSlot.objects.get(schedule=schedule, scheduled_date=self.start_date)
+        slot.rescheduled_from_date = slot.scheduled_date
+        slot.rescheduled_from_time = slot.start_time
+        slot.scheduled_date = date(2026, 4, 22)
+        slot.save()
+
+        self.assertEqual(generate_slots([schedule], start_date=self.start_date, days=7), 0)
+        self.assertEqual(LessonSlot.objects.filter(schedule=schedule).count(), 2)
+
+    def test_calendar_only_reads_and_command_fills_horizon(self):
+        self._schedule(self.students[0], 0)
+        self.client.force_login(self.teacher)
+
+        self.assertEqual(self.client.get("/calendar/").status_code, 200)
+        self.assertFalse(LessonSlot.objects.exists())
+
+        call_command("generate_lesson_slots", days=13, stdout=StringIO())
+        self.assertEqual(LessonSlot.objects.count(), 2)
@@ -2,7 +2,6 @@ from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponseForbidden
-from django.db import transaction
 from django.db.models import Count, Q
 from django.views.decorators.http import require_POST
 from django.shortcuts import get_object_or_404, redirect, render
@@ -13,9 +12,11 @@ from urllib.parse import urlencode
 import json
 
 from apps.accounts.decorators import role_required
+from apps.accounts.library_service import rebuild_library_index
 from apps.accounts.models import Profile
 from apps.school.models import Course, Enrollment, ParentChild
 from apps.school.utils import get_user_single_class
+from apps.sqlite_tuning import immediate_atomic
 from .forms import (
     GroupAttendanceSessionForm,
     LessonCreateForm,
@@ -498,7 +499,7 @@ def group_attendance(request, group_id: int):
             if not students:
                 messages.error(request, "В группе пока нет учеников.")
             else:
-                with transaction.atomic():
+                with immediate_atomic():
                     lesson = selected_lesson
                     if lesson is None:
                         lesson = Lesson.objects.create(
@@ -515,7 +516,7 @@ def group_attendance(request, group_id: int):
                         attachment = form.cleaned_data.get("attachment")
                         if attachment:
                             lesson.attachment = attachment
-                            update_fields.append("attachment")
+                            update_fields += ["attachment", "attachment_name"]
                         lesson.save(update_fields=update_fields)
 
                     for student in students:
@@ -634,6 +635,9 @@ def lesson_create(request):
                     for enrollment in enrollments
                 ]
             )
+            if lesson.attachment:
+                # bulk_create bypasses the library index signals
+                rebuild_library_index([enrollment.student_id for enrollment in enrollments])
 
             media = (form.cleaned_data.get("media_url") or "").strip()
             if media:
@@ -934,7 +938,7 @@ def slot_reschedule(request, slot_id: int):
                 if has_conflict:
                     form.add_error(None, "На выбранные дату и время у ученика уже есть урок.")
                 else:
-                    with transaction.atomic():
+                    with immediate_atomic():
                         locked_slot = LessonSlot.objects.select_for_update().get(id=slot.id)
                         if locked_slot.status != LessonSlot.Status.PLANNED:
                             form.add_error(None, "Урок уже нельзя перенести: статус был изменён.")
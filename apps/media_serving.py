@@ -0,0 +1,199 @@
+# apps/media_serving.py
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from apps.accounts.models import LibraryVideo, Profile
+from apps.homework.models import Assignment
+from apps.lessons.models import Lesson
+from apps.school.models import ParentChild
+from apps.school.utils import get_user_courses
+
+
+MEDIA_STREAM_BLOCK_SIZE = 256 * 1024
+MEDIA_OFFLOAD_ACCEL = "x-accel"
+MEDIA_OFFLOAD_SENDFILE = "x-sendfile"
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _student_ids_for_user(user) -> list[int]:
+    role = user.profile.role
+    if role == Profile.Role.STUDENT:
+        return [user.id]
+    if role == Profile.Role.PARENT:
+        return list(ParentChild.objects.filter(parent=user).values_list("child_id", flat=True))
+    return []
+
+
+def user_can_access_media(user, name: str) -> bool:
+    """
+    Same visibility as the pages that link the file: library videos and their posters for the student,
+    the student's parents and the course teachers; assignment and lesson materials for the students
+    of that assignment or course.
+    Content-addressed blobs are shared between rows, so any visible row referencing the name grants access.
+    """
+    profile = getattr(user, "profile", None)
+    if profile is None:
+        return False
+    if profile.role == Profile.Role.ADMIN:
+        return True
+
+    if name.startswith("library/"):
+        videos = LibraryVideo.objects.filter(Q(video=name) | Q(thumbnail=name))
+        if profile.role == Profile.Role.TEACHER:
+            return videos.filter(teacher=user).exists() or videos.filter(
+                course__in=get_user_courses(user).values("id")
+            ).exists()
+        return videos.filter(student_id__in=_student_ids_for_user(user)).exists()
+
+    if name.startswith("assignments/"):
+        assignments = Assignment.objects.filter(attachment=name)
+        if profile.role == Profile.Role.TEACHER:
+            return assignments.filter(created_by=user).exists() or assignments.filter(
+                course__in=get_user_courses(user).values("id")
+            ).exists()
+        return assignments.filter(targets__student_id__in=_student_ids_for_user(user)).exists()
+
+    if name.startswith("lessons/"):
+        lessons = Lesson.objects.filter(attachment=name)
+        if profile.role == Profile.Role.TEACHER:
+            return lessons.filter(created_by=user).exists() or lessons.filter(
+                course__in=get_user_courses(user).values("id")
+            ).exists()
+        return lessons.filter(course__enrollments__student_id__in=_student_ids_for_user(user)).exists()
+
+    return False
+
+
+def original_file_name(name: str) -> str:
+    """
+    Uploaded name of an assignment or lesson attachment, "" when unknown. Blobs are named by content hash
+    and may be shared by rows; the rows were given the same upload, so any of them has the right name.
+    """
+    if name.startswith("assignments/"):
+        rows = Assignment.objects.filter(attachment=name)
+    elif name.startswith("lessons/"):
+        rows = Lesson.objects.filter(attachment=name)
+    else:
+        return ""
+    return rows.exclude(attachment_name="").values_list("attachment_name", flat=True).first() or ""
+
+
+def _parse_range(header: str, size: int):
+    """(start, end) of a single "bytes=" range, None to serve the whole file, "invalid" for a 416."""
+    match = _RANGE_RE.match((header or "").strip())
+    if not match or match.group(1) == match.group(2) == "":
+        # Multiple or malformed ranges: a full 200 response is always allowed.
+        return None
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        if length == 0:
+            return "invalid"
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "invalid"
+    return start, end
+
+
+def _iter_file_range(path: str, start: int, length: int):
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            block = file.read(min(MEDIA_STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _offload_response(name: str, full_path: str, content_type: str):
+    # Both servers URL-decode the header; a raw non-ASCII value would be MIME-encoded by Django instead.
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_OFFLOAD == MEDIA_OFFLOAD_ACCEL:
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(name, safe="/")
+    else:
+        response["X-Sendfile"] = quote(full_path, safe="/")
+    return response
+
+
+@require_safe
+@login_required
+def serve_media(request, path):
+    """
+    MEDIA_URL view with the access checks of user_can_access_media. The bytes are sent by nginx
+    (X-Accel-Redirect) or Apache/lighttpd (X-Sendfile) when MEDIA_OFFLOAD is set, otherwise streamed here
+    with ETag/Last-Modified revalidation and single byte-range (206) support so that video seeking works.
+    """
+    if not settings.DEBUG and not settings.SERVE_MEDIA:
+        raise Http404()
+    name = path.replace("\\", "/").lstrip("/")
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404() from None
+    if not os.path.isfile(full_path) or not user_can_access_media(request.user, name):
+        raise Http404()
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or "application/octet-stream"
+    filename = original_file_name(name)
+    if settings.MEDIA_OFFLOAD in (MEDIA_OFFLOAD_ACCEL, MEDIA_OFFLOAD_SENDFILE):
+        response = _offload_response(name, full_path, content_type)
+        if filename:
+            response["Content-Disposition"] = content_disposition_header(False, filename)
+        return response
+
+    stat = os.stat(full_path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = int(stat.st_mtime)
+    validators = HttpResponse()
+    validators["ETag"] = etag
+    validators["Last-Modified"] = http_date(last_modified)
+    validators["Cache-Control"] = "private, max-age=0, must-revalidate"
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified, response=validators)
+    if not_modified is not validators:
+        return not_modified
+
+    byte_range = _parse_range(request.headers.get("Range", ""), stat.st_size)
+    if_range = request.headers.get("If-Range", "").strip()
+    if byte_range is not None and if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        # The client's partial copy is stale: send the whole file again.
+        byte_range = None
+    if byte_range == "invalid":
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        return response
+
+    start, end = byte_range or (0, stat.st_size - 1)
+    length = max(0, end - start + 1)
+    response = StreamingHttpResponse(
+        _iter_file_range(full_path, start, length),
+        status=206 if byte_range else 200,
+        content_type=content_type,
+    )
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    if encoding:
+        response["Content-Encoding"] = encoding
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    if filename:
+        # Opened in the browser as before, saved under the uploaded name instead of the hash.
+        response["Content-Disposition"] = content_disposition_header(False, filename)
+    for header in ("ETag", "Last-Modified", "Cache-Control"):
+        response[header] = validators[header]
+    return response
@@ -6,15 +6,16 @@ from django.http import HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
 
 from apps.accounts.models import Profile
-from apps.school.models import Course, Enrollment, ParentChild
+from apps.school.access import get_teacher_access
+from apps.school.models import Course, ParentChild
 from apps.homework.models import AssignmentTarget
-from apps.gradebook.models import Grade
+from apps.gradebook.models import CourseStudentStats, Grade
 from apps.lessons.models import LessonReport
 from .models import Achievement, MediaLink
 
 
 def _teacher_can_view_student(teacher_user, student_id: int) -> bool:
-    return Enrollment.objects.filter(course__teacher=teacher_user, student_id=student_id).exists()
+    return student_id in get_teacher_access(teacher_user).taught_student_ids
 
 
 def my_portfolio(request):
@@ -96,12 +97,19 @@ def student_profile(request, student_id: int):
     grade_labels = [f"{g.assessment.course.name}: {g.assessment.title}" for g in grade_series]
     grade_scores = [float(g.score) for g in grade_series]
 
-    course_totals: dict[str, list[float]] = defaultdict(list)
-    for grade in grade_series:
-        course_totals[grade.assessment.course.name].append(float(grade.score))
+    course_totals: dict[str, list] = defaultdict(lambda: [0, 0])
+    course_stats = (
+        CourseStudentStats.objects.filter(student_id=student_id, graded_count__gt=0)
+        .select_related("course")
+        .order_by("course__name", "course_id")
+    )
+    for stats in course_stats:
+        totals = course_totals[stats.course.name]
+        totals[0] += stats.score_sum
+        totals[1] += stats.graded_count
     course_avg_labels = list(course_totals.keys())
     course_avg_scores = [
-        round(sum(scores) / len(scores), 2) for scores in course_totals.values()
+        round(float(score_sum) / graded_count, 2) for score_sum, graded_count in course_totals.values()
     ]
 
     chart_payload = {
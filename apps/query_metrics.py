@@ -0,0 +1,241 @@
+# apps/query_metrics.py
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.urls import Resolver404, resolve
+
+
+logger = logging.getLogger("apps.query_metrics")
+
+_SQL_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+_SQL_IN_LIST_RE = re.compile(r"\((?:\?, )+\?\)")
+
+# Upper bounds (ms) of the latency histogram buckets; slower requests land in the last, open bucket.
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Metrics of the request being served; None outside QueryMetricsMiddleware and query_budget blocks.
+_current_metrics: ContextVar[Optional["RequestMetrics"]] = ContextVar("query_metrics", default=None)
+
+_view_windows: dict[str, deque] = {}
+_view_totals: Counter = Counter()
+_view_lock = threading.Lock()
+
+
+def sql_signature(sql: str) -> str:
+    """The statement with literals, placeholders and IN lists folded, so per-row repeats of one query match."""
+    return _SQL_IN_LIST_RE.sub("(…)", _SQL_LITERAL_RE.sub("?", sql))
+
+
+class RequestMetrics:
+    """SQL and template timings of one request; also the execute_wrapper that collects the SQL part."""
+
+    def __init__(self):
+        self.query_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.signatures: Counter = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.query_count += 1
+            self.signatures[sql_signature(sql)] += 1
+
+    def duplicates(self, limit: int = 5) -> list[tuple[str, int]]:
+        """The most repeated signatures that ran more than once: the usual shape of an N+1 loop."""
+        return [(signature, count) for signature, count in self.signatures.most_common(limit) if count > 1]
+
+    @property
+    def max_repeats(self) -> int:
+        return max(self.signatures.values(), default=0)
+
+
+@contextmanager
+def collect_metrics(metrics: RequestMetrics):
+    """Counts the queries of every database alias and the template renders of the block into metrics."""
+    token = _current_metrics.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(metrics))
+            yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates whose templates add their render time to the current request's metrics."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _record_view(view_name: str, total_ms: float, sql_ms: float, queries: int) -> None:
+    with _view_lock:
+        window = _view_windows.get(view_name)
+        if window is None:
+            window = _view_windows[view_name] = deque(maxlen=settings.QUERY_METRICS_WINDOW)
+        window.append((total_ms, sql_ms, queries))
+        _view_totals[view_name] += 1
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def view_metrics_snapshot() -> dict[str, dict]:
+    """
+    {view name: stats} over the last QUERY_METRICS_WINDOW requests of each view in this process:
+    latency percentiles, SQL time and query counts, and a latency histogram keyed by bucket upper bound.
+    """
+    with _view_lock:
+        windows = {view_name: list(window) for view_name, window in _view_windows.items()}
+        totals = dict(_view_totals)
+
+    snapshot = {}
+    for view_name, samples in sorted(windows.items()):
+        latencies = sorted(total_ms for total_ms, _sql_ms, _queries in samples)
+        queries = [count for _total_ms, _sql_ms, count in samples]
+        histogram = {f"le_{bound}": 0 for bound in LATENCY_BUCKETS_MS}
+        histogram["inf"] = 0
+        for latency in latencies:
+            bucket = next((f"le_{bound}" for bound in LATENCY_BUCKETS_MS if latency <= bound), "inf")
+            histogram[bucket] += 1
+        snapshot[view_name] = {
+            "requests": totals[view_name],
+            "window": len(samples),
+            "p50_ms": round(_percentile(latencies, 0.5), 2),
+            "p95_ms": round(_percentile(latencies, 0.95), 2),
+            "max_ms": round(latencies[-1], 2),
+            "sql_ms_mean": round(sum(sql_ms for _total_ms, sql_ms, _queries in samples) / len(samples), 2),
+            "queries_mean": round(sum(queries) / len(queries), 1),
+            "queries_max": max(queries),
+            "histogram": histogram,
+        }
+    return snapshot
+
+
+def reset_view_metrics() -> None:
+    with _view_lock:
+        _view_windows.clear()
+        _view_totals.clear()
+
+
+class QueryMetricsMiddleware:
+    """
+    Logs one JSON line per request (view name, status, query count, SQL/template/total ms and the most
+    repeated query signatures) to the apps.query_metrics logger and keeps rolling per-view histograms.
+    A request that repeats one signature QUERY_METRICS_REPEAT_WARNING times or more is logged as a warning.
+    Enabled by QUERY_METRICS_ENABLED; keep it first in MIDDLEWARE so the latency covers the whole stack.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        started = time.perf_counter()
+        with collect_metrics(metrics):
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        resolver_match = getattr(request, "resolver_match", None)
+        view_name = (resolver_match.view_name if resolver_match else "") or "<unresolved>"
+        sql_ms = metrics.sql_seconds * 1000
+        _record_view(view_name, total_ms, sql_ms, metrics.query_count)
+
+        level = logging.WARNING if metrics.max_repeats >= settings.QUERY_METRICS_REPEAT_WARNING else logging.INFO
+        if logger.isEnabledFor(level):
+            line = {
+                "view": view_name,
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "queries": metrics.query_count,
+                "sql_ms": round(sql_ms, 2),
+                "template_ms": round(metrics.template_seconds * 1000, 2),
+                "total_ms": round(total_ms, 2),
+                "duplicates": [{"sql": signature[:200], "count": count} for signature, count in metrics.duplicates(3)],
+            }
+            logger.log(level, json.dumps(line, ensure_ascii=False))
+        return response
+
+
+@contextmanager
+def query_budget(testcase, view_name: str, max_queries: int, *, max_repeats: Optional[int] = None):
+    """
+    Test helper: fails testcase when the requests made in the block resolve to another view, run more than
+    max_queries queries, or repeat one query signature more than max_repeats times (an N+1 loop).
+
+        with query_budget(self, "teacher_group_detail", max_queries=20, max_repeats=2):
+            response = self.client.get(url)
+    """
+    metrics = RequestMetrics()
+    resolved: list[str] = []
+
+    def remember_view(sender, environ=None, **kwargs):
+        try:
+            name = resolve(environ["PATH_INFO"]).view_name
+        except (Resolver404, KeyError, TypeError):
+            name = "<unresolved>"
+        if name not in resolved:
+            resolved.append(name)
+
+    request_started.connect(remember_view)
+    try:
+        with collect_metrics(metrics):
+            yield metrics
+    finally:
+        request_started.disconnect(remember_view)
+
+    if resolved:
+        testcase.assertIn(view_name, resolved, f"Expected a request to {view_name}, got {resolved}")
+    details = "\n".join(f"  {count}x {signature[:300]}" for signature, count in metrics.duplicates())
+    testcase.assertLessEqual(
+        metrics.query_count,
+        max_queries,
+        f"{view_name} ran {metrics.query_count} queries, budget {max_queries}. Most repeated:\n{details}",
+    )
+    if max_repeats is not None:
+        testcase.assertLessEqual(
+            metrics.max_repeats,
+            max_repeats,
+            f"{view_name} repeated one query {metrics.max_repeats} times, budget {max_repeats}:\n{details}",
+        )
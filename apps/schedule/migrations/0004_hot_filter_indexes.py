@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-17 01:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0003_alter_event_event_type'),
+        ('school', '0006_hot_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start_datetime', 'event_type'], name='event_start_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['course', 'start_datetime'], name='event_course_start_idx'),
+        ),
+    ]
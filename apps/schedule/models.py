@@ -38,6 +38,10 @@ class Event(models.Model):
 
     class Meta:
         ordering = ("start_datetime",)
+        indexes = [
+            models.Index(fields=("start_datetime", "event_type"), name="event_start_type_idx"),
+            models.Index(fields=("course", "start_datetime"), name="event_course_start_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title} ({self.get_event_type_display()})"
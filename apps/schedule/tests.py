@@ -1,4 +1,4 @@
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 
 from django.contrib.auth import get_user_model
 from django.test import TestCase
@@ -181,3 +181,29 @@ class TeacherEventCreateTests(TestCase):
         outsider_response = self.client.get("/calendar/")
         self.assertEqual(outsider_response.status_code, 200)
         self.assertNotContains(outsider_response, "Виден в календаре")
+
+    def test_calendar_week_uses_local_midnight_bounds(self):
+        local_tz = timezone.get_current_timezone()
+        today = timezone.localdate()
+        week_start = today - timedelta(days=today.weekday())
+        for title, day, hour in (
+            ("Сразу после полуночи", week_start, 0),
+            ("Поздно в воскресенье", week_start + timedelta(days=6), 23),
+            ("Следующий понедельник", week_start + timedelta(days=7), 0),
+        ):
+            start = timezone.make_aware(datetime.combine(day, time(hour=hour, minute=30)), local_tz)
+            Event.objects.create(
+                title=title,
+                event_type=Event.EventType.CONCERT,
+                start_datetime=start,
+                end_datetime=start + timedelta(minutes=20),
+                course=self.course,
+                created_by=self.teacher,
+            )
+
+        self.client.force_login(self.teacher)
+        response = self.client.get("/calendar/")
+
+        self.assertContains(response, "Сразу после полуночи")
+        self.assertContains(response, "Поздно в воскресенье")
+        self.assertNotContains(response, "Следующий понедельник")
@@ -10,7 +10,6 @@ from django.utils import timezone
 from apps.accounts.decorators import role_required
 from apps.accounts.models import Profile
 from apps.lessons.models import LessonSlot
-from apps.lessons.services import generate_slots_for_teacher
 from apps.school.models import Course, Enrollment, ParentChild
 from .forms import TeacherEventCreateForm
 from .models import Event
@@ -122,8 +121,11 @@ def _events_for_role(request, qs):
 
 def _serialize_week_events(events_qs, *, week_start, week_end):
     events_by_day = {}
+    # Local-midnight bounds instead of start_datetime__date: a plain range can use the start_datetime index.
+    range_start = timezone.make_aware(datetime.combine(week_start, time.min))
+    range_end = timezone.make_aware(datetime.combine(week_end, time.min))
     week_events = (
-        events_qs.filter(start_datetime__date__gte=week_start, start_datetime__date__lt=week_end)
+        events_qs.filter(start_datetime__gte=range_start, start_datetime__lt=range_end)
         .select_related("course")
         .order_by("start_datetime", "id")
     )
@@ -171,7 +173,6 @@ def calendar_list(request):
         mode = role_mode
         if profile.role == Profile.Role.TEACHER:
             mode = "teacher"
-            generate_slots_for_teacher(request.user)
             slot_qs = LessonSlot.objects.filter(
                 teacher=request.user,
                 scheduled_date__gte=week_start,
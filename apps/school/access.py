@@ -0,0 +1,114 @@
+# apps/school/access.py
+from __future__ import annotations
+
+from contextvars import ContextVar
+from functools import cached_property
+from typing import Optional
+
+from django.utils.functional import SimpleLazyObject
+
+from apps.accounts.models import Profile
+
+from .models import Course, Enrollment
+
+
+# {teacher id: TeacherAccessContext} of the request being served; None outside TeacherAccessMiddleware.
+_request_contexts: ContextVar[Optional[dict]] = ContextVar("teacher_access_contexts", default=None)
+
+
+class TeacherAccessContext:
+    """
+    What one teacher can see, read once and reused by every scoping helper:
+    the TeacherCourseAccess courses, their enrolled students with cycles and the courses the teacher leads.
+    """
+
+    def __init__(self, teacher):
+        self.teacher_id = teacher.id
+
+    @cached_property
+    def courses(self) -> list[Course]:
+        return list(Course.objects.filter(teacher_accesses__teacher_id=self.teacher_id).order_by("name", "id"))
+
+    @cached_property
+    def course_ids(self) -> list[int]:
+        return [course.id for course in self.courses]
+
+    @cached_property
+    def taught_course_ids(self) -> set[int]:
+        return {course.id for course in self.courses if course.teacher_id == self.teacher_id}
+
+    @cached_property
+    def _enrollments(self) -> list[tuple[int, int, Optional[str], Optional[str]]]:
+        return list(
+            Enrollment.objects.filter(course_id__in=self.course_ids).values_list(
+                "student_id",
+                "course_id",
+                "student__profile__role",
+                "student__profile__cycle",
+            )
+        )
+
+    @cached_property
+    def student_cycles(self) -> dict[int, str]:
+        """{student id: cycle} of the students (role STUDENT) enrolled in any accessible course."""
+        return {
+            student_id: cycle
+            for student_id, _course_id, role, cycle in self._enrollments
+            if role == Profile.Role.STUDENT
+        }
+
+    @cached_property
+    def student_course_ids(self) -> dict[int, set[int]]:
+        result: dict[int, set[int]] = {}
+        for student_id, course_id, _role, _cycle in self._enrollments:
+            result.setdefault(student_id, set()).add(course_id)
+        return result
+
+    @cached_property
+    def taught_student_ids(self) -> set[int]:
+        """Users enrolled in the courses the teacher leads (Course.teacher), whatever their role."""
+        return {
+            student_id
+            for student_id, course_id, _role, _cycle in self._enrollments
+            if course_id in self.taught_course_ids
+        }
+
+    def student_ids(self, *, cycle: str = "") -> list[int]:
+        return [
+            student_id
+            for student_id, student_cycle in self.student_cycles.items()
+            if not cycle or student_cycle == cycle
+        ]
+
+
+def get_teacher_access(teacher) -> TeacherAccessContext:
+    """The request's context for the teacher; a fresh one outside a request (commands, shell, tests)."""
+    contexts = _request_contexts.get()
+    if contexts is None:
+        return TeacherAccessContext(teacher)
+    context = contexts.get(teacher.id)
+    if context is None:
+        context = contexts[teacher.id] = TeacherAccessContext(teacher)
+    return context
+
+
+def reset_teacher_access() -> None:
+    """Forgets the contexts of the current request after a write that changes course access or enrollments."""
+    contexts = _request_contexts.get()
+    if contexts:
+        contexts.clear()
+
+
+class TeacherAccessMiddleware:
+    """Scopes TeacherAccessContext to one request and exposes the user's as request.teacher_access."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request_contexts.set({})
+        request.teacher_access = SimpleLazyObject(lambda: get_teacher_access(request.user))
+        try:
+            return self.get_response(request)
+        finally:
+            _request_contexts.reset(token)
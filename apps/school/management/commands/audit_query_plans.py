@@ -0,0 +1,502 @@
+# apps/school/management/commands/audit_query_plans.py
+import json
+import random
+import re
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from datetime import time as dt_time
+from decimal import Decimal
+from pathlib import Path
+from typing import NamedTuple
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.library_service import rebuild_library_index
+from apps.accounts.models import Profile
+from apps.goals.models import Goal
+from apps.gradebook.models import Assessment, Grade
+from apps.gradebook.services import refresh_course_student_stats
+from apps.homework.models import Assignment, AssignmentTarget
+from apps.lessons.models import Lesson, LessonSlot, LessonStudent, StudentSchedule
+from apps.query_metrics import sql_signature
+from apps.schedule.models import Event
+from apps.school.models import Course, CourseInternalGroup, CourseType, Enrollment, ParentChild
+from apps.school.services import rebuild_teacher_course_access
+
+
+# SQLite: a full table scan or an extra sort; PostgreSQL: a sequential scan or an explicit Sort node.
+_SQLITE_FLAG_RE = re.compile(r"^SCAN (?!.*USING (COVERING )?INDEX)|USE TEMP B-TREE")
+_POSTGRES_FLAG_RE = re.compile(r"Seq Scan on|^\s*(->\s*)?Sort ")
+
+
+class AuditedView(NamedTuple):
+    name: str
+    role: str
+    url: str
+
+
+def _bulk_users(prefix: str, count: int, role: str, rng, **profile_fields) -> list:
+    users = User.objects.bulk_create(
+        [
+            User(username=f"{prefix}{index}", first_name=f"Имя{index}", last_name=f"{prefix.title()}{rng.randint(1, 999)}")
+            for index in range(count)
+        ]
+    )
+    Profile.objects.bulk_create([Profile(user=user, role=role, **profile_fields) for user in users])
+    return users
+
+
+def _seed_scaled_dataset(scale: int, rng) -> dict:
+    """
+    A school of 10·scale teachers and 200·scale students: two courses per student, a weekly lesson per
+    enrollment from 20 weeks back to 20 weeks ahead, homework, grades, events and monthly goals.
+    Everything goes through bulk_create, then the derived tables are rebuilt as after a data load.
+    """
+    today = timezone.localdate()
+    teachers = _bulk_users("audit_teacher", 10 * scale, Profile.Role.TEACHER, rng, teacher_mode=Profile.TeacherMode.BOTH)
+    students = _bulk_users("audit_student", 200 * scale, Profile.Role.STUDENT, rng)
+    for student in students:
+        student.profile.cycle = rng.choice(Profile.Cycle.values)
+    Profile.objects.bulk_update([student.profile for student in students], ["cycle"])
+    parents = _bulk_users("audit_parent", 100 * scale, Profile.Role.PARENT, rng)
+    admin = _bulk_users("audit_admin", 1, Profile.Role.ADMIN, rng)[0]
+    ParentChild.objects.bulk_create(
+        [ParentChild(parent=parent, child=students[2 * index]) for index, parent in enumerate(parents)]
+        + [ParentChild(parent=parent, child=students[2 * index + 1]) for index, parent in enumerate(parents)]
+    )
+
+    course_types = CourseType.objects.bulk_create([CourseType(name=name) for name in ("Инструмент", "Ансамбль", "Теория")])
+    courses = Course.objects.bulk_create(
+        [
+            Course(name=f"{course_type.name} {teacher.username}", course_type=course_type, teacher=teacher)
+            for teacher in teachers
+            for course_type in course_types
+        ]
+    )
+    enrollments = Enrollment.objects.bulk_create(
+        [Enrollment(course=course, student=student) for student in students for course in rng.sample(courses, 2)]
+    )
+    students_by_course: dict[int, list] = {}
+    for enrollment in enrollments:
+        students_by_course.setdefault(enrollment.course_id, []).append(enrollment.student)
+
+    groups = CourseInternalGroup.objects.bulk_create(
+        [CourseInternalGroup(course=course, name="Основная") for course in courses if students_by_course.get(course.id)]
+    )
+    CourseInternalGroup.students.through.objects.bulk_create(
+        [
+            CourseInternalGroup.students.through(courseinternalgroup_id=group.id, user_id=student.id)
+            for group in groups
+            for student in students_by_course[group.course_id]
+        ]
+    )
+
+    # (weekday, hour) differs between the two enrollments of a student, so the unique keys never clash.
+    schedules = StudentSchedule.objects.bulk_create(
+        [
+            StudentSchedule(
+                teacher=enrollment.course.teacher,
+                student=enrollment.student,
+                course=enrollment.course,
+                weekday=index % 6,
+                start_time=dt_time(8 + (index // 6) % 10, 0),
+            )
+            for index, enrollment in enumerate(enrollments)
+        ]
+    )
+    monday = today - timedelta(days=today.weekday())
+    slots = []
+    for schedule in schedules:
+        for week in range(-20, 21):
+            scheduled_date = monday + timedelta(weeks=week, days=schedule.weekday)
+            past = scheduled_date < today
+            slots.append(
+                LessonSlot(
+                    teacher_id=schedule.teacher_id,
+                    student_id=schedule.student_id,
+                    course_id=schedule.course_id,
+                    schedule=schedule,
+                    scheduled_date=scheduled_date,
+                    start_time=schedule.start_time,
+                    status=rng.choice((LessonSlot.Status.DONE, LessonSlot.Status.MISSED)) if past else LessonSlot.Status.PLANNED,
+                    attendance_status=rng.choice(LessonSlot.AttendanceStatus.values),
+                )
+            )
+    LessonSlot.objects.bulk_create(slots, batch_size=2000)
+
+    lessons = Lesson.objects.bulk_create(
+        [
+            Lesson(course=course, date=today - timedelta(days=7 * week), topic=f"Тема {week}", created_by=course.teacher)
+            for course in courses
+            for week in range(20)
+        ]
+    )
+    LessonStudent.objects.bulk_create(
+        [
+            LessonStudent(lesson=lesson, student=student, attended=rng.random() > 0.1)
+            for lesson in lessons
+            for student in students_by_course.get(lesson.course_id, ())
+        ],
+        batch_size=2000,
+    )
+
+    assignments = Assignment.objects.bulk_create(
+        [
+            Assignment(
+                course=course,
+                title=f"Задание {index}",
+                due_date=today + timedelta(days=7 * index - 120),
+                created_by=course.teacher,
+            )
+            for course in courses
+            for index in range(24)
+        ]
+    )
+    AssignmentTarget.objects.bulk_create(
+        [
+            AssignmentTarget(
+                assignment=assignment,
+                student=student,
+                status=AssignmentTarget.Status.DONE if assignment.due_date < today and rng.random() > 0.2 else AssignmentTarget.Status.TODO,
+            )
+            for assignment in assignments
+            for student in students_by_course.get(assignment.course_id, ())
+        ],
+        batch_size=2000,
+    )
+    assessments = Assessment.objects.bulk_create(
+        [
+            Assessment(course=course, title=f"Оценка {index}", assessment_type=rng.choice(Assessment.AssessmentType.values))
+            for course in courses
+            for index in range(12)
+        ]
+    )
+    Grade.objects.bulk_create(
+        [
+            Grade(assessment=assessment, student=student, score=Decimal(rng.randint(40, 100)), version=1)
+            for assessment in assessments
+            for student in students_by_course.get(assessment.course_id, ())
+            if rng.random() < 0.8
+        ],
+        batch_size=2000,
+    )
+
+    now = timezone.now()
+    starts = [now + timedelta(days=rng.randint(-180, 180), hours=rng.randint(0, 10)) for _ in range(500 * scale)]
+    events = Event.objects.bulk_create(
+        [
+            Event(
+                title=f"Событие {index}",
+                event_type=rng.choice(Event.EventType.values),
+                start_datetime=start,
+                end_datetime=start + timedelta(hours=1),
+                course=rng.choice(courses),
+                created_by=rng.choice(teachers),
+            )
+            for index, start in enumerate(starts)
+        ]
+    )
+    Event.participants.through.objects.bulk_create(
+        [
+            Event.participants.through(event_id=event.id, user_id=student.id)
+            for event in events
+            for student in rng.sample(students, 5)
+        ]
+    )
+    Goal.objects.bulk_create(
+        [
+            Goal(student=student, teacher=rng.choice(teachers), month=(today - timedelta(days=30 * month)).replace(day=1), title=f"Цель {month}")
+            for student in students
+            for month in range(6)
+        ]
+    )
+
+    rebuild_teacher_course_access()
+    refresh_course_student_stats(course_ids=[course.id for course in courses])
+    rebuild_library_index()
+
+    course = next(course for course in courses if students_by_course.get(course.id))
+    student = students_by_course[course.id][0]
+    return {
+        "teacher": course.teacher,
+        "student": student,
+        "parent": ParentChild.objects.get(child=student).parent,
+        "admin": admin,
+        "course": course,
+        "group": next(group for group in groups if group.course_id == course.id),
+    }
+
+
+def _audited_views(sample: dict) -> list[AuditedView]:
+    course_id, student_id, group_id = sample["course"].id, sample["student"].id, sample["group"].id
+    teacher_pages = [
+        ("dashboard", ()),
+        ("teacher_class_list", ()),
+        ("teacher_group_list", ()),
+        ("teacher_group_detail", (group_id,)),
+        ("teacher_group_grades", (group_id,)),
+        ("teacher_student_workspace", (student_id,)),
+        ("teacher_student_results", (student_id,)),
+        ("teacher_course_grades", (course_id,)),
+        ("lesson_list", ()),
+        ("attendance_journal", ()),
+        ("calendar_list", ()),
+        ("assignment_list", ()),
+        ("goal_list", ()),
+        ("library", ()),
+        ("course_detail", (course_id,)),
+        ("student_profile", (student_id,)),
+    ]
+    student_pages = [
+        ("dashboard", ()),
+        ("assignment_list", ()),
+        ("calendar_list", ()),
+        ("student_profile", (student_id,)),
+        ("student_course_grades", (course_id,)),
+        ("goal_list", ()),
+        ("lesson_list", ()),
+        ("library", ()),
+    ]
+    parent_pages = [("dashboard", ()), ("assignment_list", ()), ("calendar_list", ())]
+    admin_pages = [("dashboard", ()), ("admin_analytics", ()), ("course_list", ())]
+    views = []
+    for role, pages in (("teacher", teacher_pages), ("student", student_pages), ("parent", parent_pages), ("admin", admin_pages)):
+        views += [AuditedView(name, role, reverse(name, args=args)) for name, args in pages]
+    return views
+
+
+def _explain(sql: str) -> list[str]:
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute(f"EXPLAIN {sql}")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _is_flagged(plan_line: str) -> bool:
+    pattern = _SQLITE_FLAG_RE if connection.vendor == "sqlite" else _POSTGRES_FLAG_RE
+    return bool(pattern.search(plan_line))
+
+
+def _backend_label() -> str:
+    if connection.vendor == "sqlite":
+        return f"SQLite {connection.Database.sqlite_version}"
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW server_version")
+        return f"{connection.display_name} {cursor.fetchone()[0]}"
+
+
+def _analyze() -> None:
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+class _SqlTimer:
+    """execute_wrapper summing SQL time with perf_counter precision (captured "time" is rounded to ms)."""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+def _audit_view(client: Client, view: AuditedView, repeat: int) -> dict:
+    """Captures the view's queries and their plans, then times `repeat` requests with a cold cache."""
+    cache.clear()
+    # The log is a bounded deque: once full, CaptureQueriesContext would count zero new queries.
+    connection.queries_log.clear()
+    with CaptureQueriesContext(connection) as captured:
+        status = client.get(view.url).status_code
+    timings, sql_timings = [], []
+    for _ in range(repeat):
+        cache.clear()
+        sql_timer = _SqlTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(sql_timer):
+            client.get(view.url)
+        timings.append((time.perf_counter() - started) * 1000)
+        sql_timings.append(sql_timer.seconds * 1000)
+
+    plans = []
+    seen = set()
+    for query in captured.captured_queries:
+        sql = query["sql"]
+        signature = sql_signature(sql)
+        if signature in seen or not sql.lstrip().upper().startswith("SELECT"):
+            continue
+        seen.add(signature)
+        plan = _explain(sql)
+        # Select lists are long and add nothing to a plan review: keep the start of the statement only.
+        short_sql = sql if len(sql) <= 300 else sql[:300] + "…"
+        plans.append({"sql": short_sql, "plan": plan, "flagged": [line for line in plan if _is_flagged(line)]})
+    return {
+        "view": view.name,
+        "role": view.role,
+        "url": view.url,
+        "status": status,
+        "queries": len(captured.captured_queries),
+        "median_ms": round(statistics.median(timings), 2),
+        "sql_median_ms": round(statistics.median(sql_timings), 2),
+        "flagged_queries": sum(1 for plan in plans if plan["flagged"]),
+        "plans": plans,
+    }
+
+
+def _audit_all(clients: dict, views: list[AuditedView], repeat: int) -> list[dict]:
+    return [_audit_view(clients[view.role], view, repeat) for view in views]
+
+
+def _render_markdown(report: dict) -> str:
+    lines = [
+        "# Index audit",
+        "",
+        f"`{report['command']}` on {report['backend']}.",
+        "",
+        "Rows: " + ", ".join(f"{table} {count}" for table, count in report["rows"].items()) + ".",
+        "",
+        f"Medians of {report['repeat']} requests with a cleared cache, ms: the whole request and its SQL. "
+        "Flagged: distinct SELECTs whose plan has a full table scan or a temporary sort.",
+        "",
+    ]
+    after = {(row["role"], row["view"]): row for row in report["after"]}
+    before = {(row["role"], row["view"]): row for row in report.get("before", [])}
+    if before:
+        lines += [
+            "| View | Role | Queries | Request before | Request after | SQL before | SQL after | Flagged before | Flagged after |",
+            "|---|---|---|---|---|---|---|---|---|",
+        ]
+        for key, row in after.items():
+            old = before[key]
+            lines.append(
+                f"| {row['view']} | {row['role']} | {row['queries']} | {old['median_ms']} | {row['median_ms']} "
+                f"| {old['sql_median_ms']} | {row['sql_median_ms']} | {old['flagged_queries']} | {row['flagged_queries']} |"
+            )
+    else:
+        lines += ["| View | Role | Queries | Request | SQL | Flagged |", "|---|---|---|---|---|---|"]
+        for row in after.values():
+            lines.append(
+                f"| {row['view']} | {row['role']} | {row['queries']} | {row['median_ms']} | {row['sql_median_ms']} "
+                f"| {row['flagged_queries']} |"
+            )
+
+    lines += ["", "## Flagged plans", ""]
+    for row in after.values():
+        flagged = [plan for plan in row["plans"] if plan["flagged"]]
+        if not flagged:
+            continue
+        lines += [f"### {row['view']} ({row['role']})", ""]
+        for plan in flagged:
+            lines += ["```sql", plan["sql"], "```", ""] + [f"- `{line}`" for line in plan["flagged"]] + [""]
+    return "\n".join(lines).rstrip() + "\n"
+
+
+class Command(BaseCommand):
+    help = (
+        "Build a scaled dataset in a throwaway test database, request the main pages as each role and record "
+        "the EXPLAIN plan of every SELECT plus median timings, optionally before and after given migrations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=int, default=1, help="Dataset multiplier (1 = 10 teachers, 200 students).")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed requests per view.")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed of the dataset.")
+        parser.add_argument(
+            "--before",
+            action="append",
+            default=[],
+            metavar="APP=MIGRATION",
+            help="Also measure with these apps migrated back (e.g. lessons=0006); repeatable.",
+        )
+        parser.add_argument("--output", default="perf/index_audit.md", help="Markdown report path.")
+        parser.add_argument("--json", dest="json_output", help="Also write every plan and timing as JSON here.")
+
+    def handle(self, *args, **options):
+        before_targets = []
+        for value in options["before"]:
+            app_label, _, migration = value.partition("=")
+            if not app_label or not migration:
+                raise CommandError(f"--before expects APP=MIGRATION, got {value!r}")
+            before_targets.append((app_label, migration))
+
+        test_settings = connection.settings_dict.setdefault("TEST", {})
+        temp_dir = None
+        if connection.vendor == "sqlite":
+            # A file, not the default in-memory test database: timings should include real page reads.
+            temp_dir = tempfile.TemporaryDirectory()
+            test_settings["NAME"] = str(Path(temp_dir.name) / "audit.sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        setup_test_environment()
+        try:
+            report = self._run(options, before_targets)
+        finally:
+            teardown_test_environment()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if temp_dir is not None:
+                temp_dir.cleanup()
+
+        output = Path(options["output"])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(_render_markdown(report), encoding="utf-8")
+        if options["json_output"]:
+            Path(options["json_output"]).write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        slow = sorted(report["after"], key=lambda row: row["median_ms"], reverse=True)[:5]
+        for row in slow:
+            self.stdout.write(
+                f"{row['role']:8} {row['view']:28} {row['queries']:4} queries {row['median_ms']:9.2f} ms "
+                f"(SQL {row['sql_median_ms']:.2f} ms)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Index audit written to {output}"))
+
+    def _run(self, options, before_targets) -> dict:
+        self.stdout.write(f"Seeding scale {options['scale']}...")
+        sample = _seed_scaled_dataset(options["scale"], random.Random(options["seed"]))
+        clients = {}
+        for role in ("teacher", "student", "parent", "admin"):
+            clients[role] = Client()
+            clients[role].force_login(sample[role])
+        views = _audited_views(sample)
+
+        report = {
+            "command": "python manage.py audit_query_plans "
+            + " ".join(
+                [f"--scale {options['scale']}", f"--repeat {options['repeat']}", f"--seed {options['seed']}"]
+                + [f"--before {app}={migration}" for app, migration in before_targets]
+            ),
+            "backend": _backend_label(),
+            "generated_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+            "repeat": options["repeat"],
+            "rows": {
+                model._meta.db_table: model.objects.count()
+                for model in (User, Enrollment, LessonSlot, LessonStudent, AssignmentTarget, Grade, Event, Goal)
+            },
+        }
+        if before_targets:
+            for app_label, migration in before_targets:
+                call_command("migrate", app_label, migration, verbosity=0)
+            _analyze()
+            self.stdout.write("Measuring before...")
+            report["before"] = _audit_all(clients, views, options["repeat"])
+            call_command("migrate", verbosity=0)
+        _analyze()
+        self.stdout.write("Measuring...")
+        report["after"] = _audit_all(clients, views, options["repeat"])
+        bad = [row for row in report["after"] if row["status"] != 200]
+        if bad:
+            raise CommandError("Non-200 responses: " + ", ".join(f"{row['role']} {row['url']} {row['status']}" for row in bad))
+        return report
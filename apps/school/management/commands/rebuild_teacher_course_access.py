@@ -0,0 +1,15 @@
+# apps/school/management/commands/rebuild_teacher_course_access.py
+from django.core.management.base import BaseCommand
+
+from apps.school.services import rebuild_teacher_course_access
+
+
+class Command(BaseCommand):
+    help = "Re-materialize the teacher -> course access table (TeacherCourseAccess) for all or selected teachers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teacher", type=int, action="append", dest="teacher_ids", help="Teacher user id.")
+
+    def handle(self, *args, **options):
+        count = rebuild_teacher_course_access(teacher_ids=options["teacher_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Teacher course access rebuilt: {count} rows."))
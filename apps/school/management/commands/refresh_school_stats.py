@@ -0,0 +1,12 @@
+# apps/school/management/commands/refresh_school_stats.py
+from django.core.management.base import BaseCommand
+
+from apps.school.services import refresh_school_stats_snapshot
+
+
+class Command(BaseCommand):
+    help = "Recompute the admin dashboard counters (SchoolStatsSnapshot). Run from cron every few minutes."
+
+    def handle(self, *args, **options):
+        snapshot = refresh_school_stats_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"School stats refreshed at {snapshot.refreshed_at:%Y-%m-%d %H:%M:%S}."))
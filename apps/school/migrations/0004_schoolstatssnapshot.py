@@ -0,0 +1,32 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0003_courseinternalgroup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolStatsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Первый день месяца, к которому относятся месячные показатели.')),
+                ('teachers_count', models.PositiveIntegerField(default=0)),
+                ('students_count', models.PositiveIntegerField(default=0)),
+                ('courses_count', models.PositiveIntegerField(default=0)),
+                ('events_this_month', models.PositiveIntegerField(default=0)),
+                ('pending_homework', models.PositiveIntegerField(default=0)),
+                ('lessons_done_this_month', models.PositiveIntegerField(default=0)),
+                ('lessons_missed_this_month', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'сводка по школе',
+                'verbose_name_plural': 'сводки по школе',
+            },
+        ),
+    ]
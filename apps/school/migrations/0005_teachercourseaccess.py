@@ -0,0 +1,54 @@
+# Generated by Django 5.1.15 on 2026-10-17 01:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_teacher_course_access(apps, schema_editor):
+    sources = (
+        (apps.get_model("school", "Course"), "teacher_id", "id"),
+        (apps.get_model("lessons", "StudentSchedule"), "teacher_id", "course_id"),
+        (apps.get_model("lessons", "LessonSlot"), "teacher_id", "course_id"),
+        (apps.get_model("lessons", "Lesson"), "created_by_id", "course_id"),
+        (apps.get_model("homework", "Assignment"), "created_by_id", "course_id"),
+        (apps.get_model("accounts", "StudentInvitation"), "teacher_id", "course_id"),
+    )
+    pairs = set()
+    for model, teacher_field, course_field in sources:
+        pairs.update(
+            model.objects.filter(**{f"{teacher_field}__isnull": False})
+            .values_list(teacher_field, course_field)
+            .distinct()
+        )
+    TeacherCourseAccess = apps.get_model("school", "TeacherCourseAccess")
+    TeacherCourseAccess.objects.bulk_create(
+        [TeacherCourseAccess(teacher_id=teacher_id, course_id=course_id) for teacher_id, course_id in pairs],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_video_processing'),
+        ('homework', '0005_alter_assignment_attachment'),
+        ('lessons', '0006_alter_lesson_attachment'),
+        ('school', '0004_schoolstatssnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeacherCourseAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='teacher_accesses', to='school.course')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_accesses', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('teacher', 'course')},
+            },
+        ),
+        migrations.RunPython(backfill_teacher_course_access, migrations.RunPython.noop),
+    ]
@@ -34,12 +34,31 @@ class Enrollment(models.Model):
 
     class Meta:
         unique_together = ("course", "student")
+        # The unique index leads with course; this one serves "courses of a student" as a covering index.
+        indexes = [models.Index(fields=("student", "course"), name="enrollment_student_course_idx")]
 
     def __str__(self) -> str:
         student_name = (self.student.get_full_name() or "").strip() or "Без имени"
         return f"{student_name} -> {self.course.name}"
 
 
+class TeacherCourseAccess(models.Model):
+    """
+    Denormalized "teacher can work with course" relation: the course is taught by the teacher or has one of
+    their schedules, slots, lessons, assignments or invitations. Maintained by apps.accounts.signals,
+    rebuilt with manage.py rebuild_teacher_course_access.
+    """
+
+    teacher = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="course_accesses")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="teacher_accesses")
+
+    class Meta:
+        unique_together = ("teacher", "course")
+
+    def __str__(self) -> str:
+        return f"{self.teacher_id} -> {self.course_id}"
+
+
 class CourseInternalGroup(models.Model):
     class GroupType(models.TextChoices):
         SPLIT = "SPLIT", "Подгруппа"
@@ -73,3 +92,31 @@ class ParentChild(models.Model):
         parent_name = (self.parent.get_full_name() or "").strip() or "Без имени"
         child_name = (self.child.get_full_name() or "").strip() or "Без имени"
         return f"{parent_name} -> {child_name}"
+
+
+class SchoolStatsSnapshot(models.Model):
+    """Single-row aggregate read by the admin dashboard; see apps.school.services.get_school_stats_snapshot."""
+
+    month = models.DateField(help_text="Первый день месяца, к которому относятся месячные показатели.")
+    teachers_count = models.PositiveIntegerField(default=0)
+    students_count = models.PositiveIntegerField(default=0)
+    courses_count = models.PositiveIntegerField(default=0)
+    events_this_month = models.PositiveIntegerField(default=0)
+    pending_homework = models.PositiveIntegerField(default=0)
+    lessons_done_this_month = models.PositiveIntegerField(default=0)
+    lessons_missed_this_month = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "сводка по школе"
+        verbose_name_plural = "сводки по школе"
+
+    def __str__(self) -> str:
+        return f"{self.month:%m.%Y} ({self.refreshed_at:%d.%m.%Y %H:%M})"
+
+    @property
+    def attendance_rate(self):
+        held = self.lessons_done_this_month + self.lessons_missed_this_month
+        if not held:
+            return None
+        return round(self.lessons_done_this_month * 100 / held, 1)
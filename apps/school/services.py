@@ -0,0 +1,143 @@
+# apps/school/services.py
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.accounts.models import Profile, StudentInvitation
+from apps.homework.models import Assignment, AssignmentTarget
+from apps.lessons.models import Lesson, LessonSlot, StudentSchedule
+from apps.schedule.models import Event
+
+from .access import reset_teacher_access
+from .models import Course, SchoolStatsSnapshot, TeacherCourseAccess
+
+
+SCHOOL_STATS_SNAPSHOT_ID = 1
+# Rows that give a teacher access to a course: model -> (teacher field, course field).
+# Cheapest lookups first, revoke_unused_teacher_course_access stops at the first hit.
+TEACHER_COURSE_ACCESS_SOURCES = {
+    Course: ("teacher_id", "id"),
+    StudentSchedule: ("teacher_id", "course_id"),
+    StudentInvitation: ("teacher_id", "course_id"),
+    Assignment: ("created_by_id", "course_id"),
+    Lesson: ("created_by_id", "course_id"),
+    LessonSlot: ("teacher_id", "course_id"),
+}
+TEACHER_COURSE_ACCESS_BATCH_SIZE = 500
+
+
+def _month_bounds(today):
+    month_start = today.replace(day=1)
+    next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+    return month_start, next_month_start
+
+
+def refresh_school_stats_snapshot(*, today=None) -> SchoolStatsSnapshot:
+    """
+    Recomputes the admin counters with one aggregate query per table and stores them in the single
+    SchoolStatsSnapshot row. Monthly counters use [month start, next month start) ranges,
+    so they are bound to the current year and can use the date indexes.
+    """
+    today = today or timezone.localdate()
+    month_start, next_month_start = _month_bounds(today)
+    local_tz = timezone.get_current_timezone()
+    period_start = timezone.make_aware(datetime.combine(month_start, time.min), local_tz)
+    period_end = timezone.make_aware(datetime.combine(next_month_start, time.min), local_tz)
+
+    users = get_user_model().objects.aggregate(
+        teachers=Count("id", filter=Q(profile__role=Profile.Role.TEACHER)),
+        students=Count("id", filter=Q(profile__role=Profile.Role.STUDENT)),
+    )
+    slots = LessonSlot.objects.filter(scheduled_date__gte=month_start, scheduled_date__lt=next_month_start).aggregate(
+        done=Count("id", filter=Q(status=LessonSlot.Status.DONE)),
+        missed=Count("id", filter=Q(status=LessonSlot.Status.MISSED)),
+    )
+    snapshot, _ = SchoolStatsSnapshot.objects.update_or_create(
+        id=SCHOOL_STATS_SNAPSHOT_ID,
+        defaults={
+            "month": month_start,
+            "teachers_count": users["teachers"],
+            "students_count": users["students"],
+            "courses_count": Course.objects.count(),
+            "events_this_month": Event.objects.filter(
+                start_datetime__gte=period_start,
+                start_datetime__lt=period_end,
+            ).count(),
+            "pending_homework": AssignmentTarget.objects.filter(
+                status=AssignmentTarget.Status.TODO,
+                assignment__due_date__lte=today,
+            ).count(),
+            "lessons_done_this_month": slots["done"],
+            "lessons_missed_this_month": slots["missed"],
+            "refreshed_at": timezone.now(),
+        },
+    )
+    return snapshot
+
+
+def get_school_stats_snapshot() -> SchoolStatsSnapshot:
+    """Stored snapshot, refreshed first when missing, older than SCHOOL_STATS_MAX_AGE or from a previous month."""
+    snapshot = SchoolStatsSnapshot.objects.filter(id=SCHOOL_STATS_SNAPSHOT_ID).first()
+    today = timezone.localdate()
+    if (
+        snapshot is None
+        or snapshot.month != today.replace(day=1)
+        or timezone.now() - snapshot.refreshed_at > timedelta(seconds=settings.SCHOOL_STATS_MAX_AGE)
+    ):
+        snapshot = refresh_school_stats_snapshot(today=today)
+    return snapshot
+
+
+def grant_teacher_course_access(pairs) -> None:
+    """Records (teacher_id, course_id) pairs; existing ones and pairs without a teacher are skipped."""
+    rows = {(teacher_id, course_id) for teacher_id, course_id in pairs if teacher_id and course_id}
+    TeacherCourseAccess.objects.bulk_create(
+        [TeacherCourseAccess(teacher_id=teacher_id, course_id=course_id) for teacher_id, course_id in rows],
+        batch_size=TEACHER_COURSE_ACCESS_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    reset_teacher_access()
+
+
+def _has_teacher_course_source(teacher_id, course_id) -> bool:
+    return any(
+        model.objects.filter(**{teacher_field: teacher_id, course_field: course_id}).exists()
+        for model, (teacher_field, course_field) in TEACHER_COURSE_ACCESS_SOURCES.items()
+    )
+
+
+def revoke_unused_teacher_course_access(pairs) -> None:
+    """Drops the given pairs that no source row backs any more (after a delete or a reassignment)."""
+    for teacher_id, course_id in {(teacher_id, course_id) for teacher_id, course_id in pairs if teacher_id}:
+        if not _has_teacher_course_source(teacher_id, course_id):
+            TeacherCourseAccess.objects.filter(teacher_id=teacher_id, course_id=course_id).delete()
+            reset_teacher_access()
+
+
+def rebuild_teacher_course_access(*, teacher_ids=None) -> int:
+    """
+    Recomputes TeacherCourseAccess from the source tables (all teachers, or only teacher_ids)
+    with one distinct values_list query per source. Returns the number of stored rows.
+    """
+    pairs = set()
+    for model, (teacher_field, course_field) in TEACHER_COURSE_ACCESS_SOURCES.items():
+        rows = model.objects.filter(**{f"{teacher_field}__isnull": False})
+        if teacher_ids is not None:
+            rows = rows.filter(**{f"{teacher_field}__in": teacher_ids})
+        pairs.update(rows.values_list(teacher_field, course_field).distinct())
+
+    existing = TeacherCourseAccess.objects.all()
+    if teacher_ids is not None:
+        existing = existing.filter(teacher_id__in=teacher_ids)
+    with transaction.atomic():
+        existing.delete()
+        TeacherCourseAccess.objects.bulk_create(
+            [TeacherCourseAccess(teacher_id=teacher_id, course_id=course_id) for teacher_id, course_id in pairs],
+            batch_size=TEACHER_COURSE_ACCESS_BATCH_SIZE,
+        )
+    reset_teacher_access()
+    return len(pairs)
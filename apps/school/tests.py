@@ -1,16 +1,32 @@
-from datetime import timedelta
+import json
+from datetime import date, datetime, time, timedelta
+from io import StringIO
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db.models import Q
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
-from apps.accounts.models import Profile
+from apps.accounts.models import Profile, StudentInvitation
 from apps.gradebook.models import Assessment, Grade
-from apps.lessons.models import Lesson
+from apps.homework.models import Assignment, AssignmentTarget
+from apps.lessons.models import Lesson, LessonSlot, StudentSchedule
+from apps.lessons.services import generate_slots
+from apps.query_metrics import query_budget, reset_view_metrics, view_metrics_snapshot
 from apps.schedule.models import Event
 
-from .models import Course, CourseInternalGroup, CourseType, Enrollment
+from .access import TeacherAccessMiddleware
+from .models import Course, CourseInternalGroup, CourseType, Enrollment, SchoolStatsSnapshot, TeacherCourseAccess
+from .services import get_school_stats_snapshot, refresh_school_stats_snapshot
+from .utils import (
+    get_teacher_student_or_404,
+    get_teacher_students,
+    get_user_courses,
+    get_user_single_class,
+    resolve_teacher_course_for_student,
+)
 
 
 class TeacherStudentWorkspaceTests(TestCase):
@@ -195,3 +211,261 @@ class TeacherGroupFlowTests(TestCase):
         internal_group = CourseInternalGroup.objects.get(course=self.group)
         self.assertEqual(internal_group.name, "Нужна поддержка")
         self.assertEqual(set(internal_group.students.values_list("id", flat=True)), {self.student.id})
+
+    def test_group_detail_stays_within_query_budget(self):
+        students = [self.student] + [self._create_user(f"student_budget_{index}", Profile.Role.STUDENT) for index in range(6)]
+        for student in students[1:]:
+            Enrollment.objects.create(course=self.group, student=student)
+        internal_group = CourseInternalGroup.objects.create(course=self.group, name="Хор")
+        internal_group.students.set(students[:3])
+        for index in range(3):
+            assignment = Assignment.objects.create(
+                course=self.group,
+                title=f"Задание {index}",
+                description="",
+                due_date=date.today() + timedelta(days=index),
+                created_by=self.group_teacher,
+            )
+            for student in students:
+                AssignmentTarget.objects.create(assignment=assignment, student=student)
+            Lesson.objects.create(
+                course=self.group,
+                date=date.today() - timedelta(days=index),
+                topic=f"Тема {index}",
+                created_by=self.group_teacher,
+            )
+        self.client.force_login(self.group_teacher)
+
+        # One query per student or per assignment is an N+1 loop: the page must not grow with the group.
+        with query_budget(self, "teacher_group_detail", max_queries=20, max_repeats=2):
+            response = self.client.get(reverse("teacher_group_detail", args=[self.group.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, students[-1].get_full_name())
+
+    @override_settings(QUERY_METRICS_ENABLED=True)
+    def test_query_metrics_middleware_logs_requests_and_keeps_view_histograms(self):
+        reset_view_metrics()
+        client = Client()
+        client.force_login(self.group_teacher)
+        url = reverse("teacher_group_detail", args=[self.group.id])
+
+        with self.assertLogs("apps.query_metrics", level="INFO") as logs:
+            client.get(url)
+            client.get(url)
+
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line["view"], "teacher_group_detail")
+        self.assertEqual(line["status"], 200)
+        self.assertGreater(line["queries"], 0)
+        self.assertGreater(line["template_ms"], 0)
+        self.assertGreaterEqual(line["total_ms"], line["sql_ms"])
+        stats = view_metrics_snapshot()["teacher_group_detail"]
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(sum(stats["histogram"].values()), 2)
+        self.assertEqual(stats["queries_max"], line["queries"])
+        reset_view_metrics()
+
+
+class SchoolStatsSnapshotTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.admin = user_model.objects.create_user(username="stats_admin", password="pass12345")
+        Profile.objects.create(user=self.admin, role=Profile.Role.ADMIN)
+        self.teacher = user_model.objects.create_user(username="stats_teacher", password="pass12345")
+        Profile.objects.create(user=self.teacher, role=Profile.Role.TEACHER)
+        self.students = []
+        for index in range(2):
+            student = user_model.objects.create_user(username=f"stats_student_{index}", password="pass12345")
+            Profile.objects.create(user=student, role=Profile.Role.STUDENT)
+            self.students.append(student)
+        self.course = Course.objects.create(
+            name="Фортепиано",
+            course_type=CourseType.objects.create(name="Фортепиано"),
+            teacher=self.teacher,
+        )
+
+    def _event(self, starts):
+        return Event.objects.create(
+            title="Концерт",
+            event_type=Event.EventType.CONCERT,
+            start_datetime=starts,
+            end_datetime=starts + timedelta(hours=1),
+            created_by=self.teacher,
+        )
+
+    def _slot(self, student, scheduled_date, status):
+        return LessonSlot.objects.create(
+            teacher=self.teacher,
+            student=student,
+            course=self.course,
+            scheduled_date=scheduled_date,
+            start_time=time(15, 0),
+            status=status,
+        )
+
+    def test_refresh_counts_only_the_current_month_of_the_current_year(self):
+        today = date(2026, 4, 15)
+        local_tz = timezone.get_current_timezone()
+        self._event(timezone.make_aware(datetime(2026, 4, 1, 0, 30), local_tz))
+        self._event(timezone.make_aware(datetime(2026, 4, 30, 23, 0), local_tz))
+        self._event(timezone.make_aware(datetime(2025, 4, 10, 12, 0), local_tz))
+        self._event(timezone.make_aware(datetime(2026, 5, 1, 0, 0), local_tz))
+        assignment = Assignment.objects.create(
+            course=self.course,
+            title="Этюд",
+            due_date=today,
+            created_by=self.teacher,
+        )
+        AssignmentTarget.objects.create(assignment=assignment, student=self.students[0])
+        AssignmentTarget.objects.create(
+            assignment=assignment,
+            student=self.students[1],
+            status=AssignmentTarget.Status.DONE,
+        )
+        self._slot(self.students[0], date(2026, 4, 6), LessonSlot.Status.DONE)
+        self._slot(self.students[0], date(2026, 4, 13), LessonSlot.Status.DONE)
+        self._slot(self.students[1], date(2026, 4, 13), LessonSlot.Status.MISSED)
+        self._slot(self.students[1], date(2026, 3, 30), LessonSlot.Status.MISSED)
+
+        snapshot = refresh_school_stats_snapshot(today=today)
+
+        self.assertEqual(snapshot.month, date(2026, 4, 1))
+        self.assertEqual((snapshot.teachers_count, snapshot.students_count, snapshot.courses_count), (1, 2, 1))
+        self.assertEqual(snapshot.events_this_month, 2)
+        self.assertEqual(snapshot.pending_homework, 1)
+        self.assertEqual(snapshot.attendance_rate, 66.7)
+        self.assertEqual(SchoolStatsSnapshot.objects.count(), 1)
+
+    def test_admin_dashboard_reads_snapshot_until_it_is_stale(self):
+        get_school_stats_snapshot()
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(5):
+            # session, user, profile, snapshot, announcements
+            response = self.client.get("/dashboard")
+        self.assertContains(response, "Аналитика")
+
+        SchoolStatsSnapshot.objects.update(refreshed_at=timezone.now() - timedelta(hours=1), students_count=99)
+        self.assertEqual(get_school_stats_snapshot().students_count, 2)
+
+    def test_analytics_page_is_admin_only_and_can_refresh(self):
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get("/analytics/").status_code, 403)
+
+        self.client.force_login(self.admin)
+        response = self.client.get("/analytics/")
+        self.assertContains(response, "Посещаемость (месяц)")
+        refreshed = self.client.post("/analytics/")
+        self.assertRedirects(refreshed, "/analytics/")
+
+
+class TeacherCourseAccessTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.teacher = user_model.objects.create_user(username="access_teacher", password="pass12345")
+        Profile.objects.create(user=self.teacher, role=Profile.Role.TEACHER)
+        self.other_teacher = user_model.objects.create_user(username="access_other", password="pass12345")
+        Profile.objects.create(user=self.other_teacher, role=Profile.Role.TEACHER)
+        self.student = user_model.objects.create_user(username="access_student", password="pass12345")
+        Profile.objects.create(user=self.student, role=Profile.Role.STUDENT)
+        course_type = CourseType.objects.create(name="Сольфеджио")
+        self.own = Course.objects.create(name="А", course_type=course_type, teacher=self.teacher)
+        self.schedule_course = Course.objects.create(name="Б", course_type=course_type, teacher=self.other_teacher)
+        self.lesson_course = Course.objects.create(name="В", course_type=course_type)
+        self.foreign = Course.objects.create(name="Г", course_type=course_type, teacher=self.other_teacher)
+        for course in (self.own, self.schedule_course, self.lesson_course, self.foreign):
+            Enrollment.objects.create(course=course, student=self.student)
+
+    def _legacy_courses(self, user):
+        # The six-way OR join that TeacherCourseAccess replaces.
+        return list(
+            Course.objects.filter(
+                Q(teacher=user)
+                | Q(student_schedules__teacher=user)
+                | Q(lesson_slots__teacher=user)
+                | Q(lessons__created_by=user)
+                | Q(assignments__created_by=user)
+                | Q(student_invitations__teacher=user)
+            )
+            .distinct()
+            .order_by("name", "id")
+        )
+
+    def _assert_same_as_legacy(self):
+        for user in (self.teacher, self.other_teacher):
+            self.assertEqual(list(get_user_courses(user)), self._legacy_courses(user))
+
+    def test_access_follows_every_source_and_is_revoked_with_the_last_one(self):
+        schedule = StudentSchedule.objects.create(
+            teacher=self.teacher,
+            student=self.student,
+            course=self.schedule_course,
+            weekday=date.today().weekday(),
+            start_time=time(16, 0),
+        )
+        generate_slots([schedule], days=14)
+        lesson = Lesson.objects.create(
+            course=self.lesson_course,
+            date=date.today(),
+            topic="Интервалы",
+            created_by=self.teacher,
+        )
+        StudentInvitation.objects.create(
+            teacher=self.teacher,
+            course=self.foreign,
+            first_name="Анна",
+            last_name="Иванова",
+            token="access-token",
+        )
+        self._assert_same_as_legacy()
+        self.assertEqual(
+            list(get_user_courses(self.teacher)),
+            [self.own, self.schedule_course, self.lesson_course, self.foreign],
+        )
+        self.assertEqual(list(get_teacher_students(self.teacher)), [self.student])
+
+        # Slots still grant the course after the schedule is gone; the last slot revokes it.
+        schedule.delete()
+        self.assertIn(self.schedule_course, get_user_courses(self.teacher))
+        LessonSlot.objects.filter(teacher=self.teacher).delete()
+        self.assertNotIn(self.schedule_course, get_user_courses(self.teacher))
+
+        lesson.course = self.own
+        lesson.save()
+        StudentInvitation.objects.filter(teacher=self.teacher).get().delete()
+        self.own.teacher = self.other_teacher
+        self.own.save()
+        self._assert_same_as_legacy()
+        self.assertEqual(list(get_user_courses(self.teacher)), [self.own])
+        self.assertEqual(list(get_user_courses(self.other_teacher)), [self.own, self.schedule_course, self.foreign])
+
+    def test_rebuild_command_restores_rows_written_past_the_signals(self):
+        Assignment.objects.create(course=self.foreign, title="Диктант", due_date=date.today(), created_by=self.teacher)
+        TeacherCourseAccess.objects.all().delete()
+        Course.objects.filter(id=self.lesson_course.id).update(teacher=self.teacher)
+
+        call_command("rebuild_teacher_course_access", stdout=StringIO())
+
+        self._assert_same_as_legacy()
+        self.assertEqual(TeacherCourseAccess.objects.count(), 5)
+
+    def test_scoping_helpers_share_one_context_per_request(self):
+        request = RequestFactory().get("/")
+        request.user = self.teacher
+
+        def view(request):
+            with self.assertNumQueries(3):
+                # courses, enrollments, then the students themselves
+                self.assertEqual(list(get_teacher_students(self.teacher)), [self.student])
+            with self.assertNumQueries(1):
+                get_teacher_student_or_404(self.teacher, self.student.id)
+            with self.assertNumQueries(0):
+                self.assertEqual(resolve_teacher_course_for_student(self.teacher, self.student), (self.own, "single"))
+                self.assertEqual(get_user_single_class(self.teacher).course, self.own)
+                self.assertEqual(request.teacher_access.course_ids, [self.own.id])
+
+            Lesson.objects.create(course=self.foreign, date=date.today(), topic="Ритм", created_by=self.teacher)
+            self.assertEqual(get_user_single_class(self.teacher).status, "multiple")
+            return None
+
+        TeacherAccessMiddleware(view)(request)
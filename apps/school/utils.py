@@ -8,6 +8,7 @@ from django.db.models import Count, Q
 
 from apps.accounts.models import Profile
 
+from .access import get_teacher_access
 from .models import Course, CourseInternalGroup, ParentChild
 
 
@@ -54,18 +55,9 @@ def extract_school_grade_number(value: str) -> str:
 
 
 def _teacher_courses_queryset(user):
-    return (
-        Course.objects.filter(
-            Q(teacher=user)
-            | Q(student_schedules__teacher=user)
-            | Q(lesson_slots__teacher=user)
-            | Q(lessons__created_by=user)
-            | Q(assignments__created_by=user)
-            | Q(student_invitations__teacher=user)
-        )
-        .distinct()
-        .order_by("name", "id")
-    )
+    # TeacherCourseAccess holds one row per (teacher, course) for the course teacher and every teacher
+    # with schedules, slots, lessons, assignments or invitations in the course; the ids are read once per request.
+    return Course.objects.filter(id__in=get_teacher_access(user).course_ids).order_by("name", "id")
 
 
 def get_teacher_group_courses(user):
@@ -101,7 +93,10 @@ def get_user_courses(user, *, include_admin: bool = False):
 
 
 def get_user_single_class(user, *, include_admin: bool = False) -> SingleClassResolution:
-    courses = list(get_user_courses(user, include_admin=include_admin)[:2])
+    if user.profile.role == Profile.Role.TEACHER:
+        courses = get_teacher_access(user).courses[:2]
+    else:
+        courses = list(get_user_courses(user, include_admin=include_admin)[:2])
     if not courses:
         return SingleClassResolution(status="none", course=None)
     if len(courses) == 1:
@@ -111,24 +106,25 @@ def get_user_single_class(user, *, include_admin: bool = False) -> SingleClassRe
 
 def get_teacher_students(user, *, cycle: str = ""):
     user_model = get_user_model()
-    students = (
-        user_model.objects.filter(
-            enrollments__course__in=_teacher_courses_queryset(user),
-            profile__role=Profile.Role.STUDENT,
-        )
+    student_ids = get_teacher_access(user).student_ids(cycle=_normalize_cycle(cycle))
+    return (
+        user_model.objects.filter(id__in=student_ids)
         .select_related("profile")
-        .distinct()
         .order_by("first_name", "last_name", "username")
     )
-    if cycle:
-        students = students.filter(profile__cycle=_normalize_cycle(cycle))
-    return students
 
 
 def get_teacher_student_or_404(teacher, student_id: int):
+    from django.http import Http404
     from django.shortcuts import get_object_or_404
 
-    return get_object_or_404(get_teacher_students(teacher), id=student_id)
+    try:
+        student_id = int(student_id)
+    except (TypeError, ValueError):
+        raise Http404 from None
+    if student_id not in get_teacher_access(teacher).student_cycles:
+        raise Http404
+    return get_object_or_404(get_user_model().objects.select_related("profile"), id=student_id)
 
 
 def get_teacher_group_or_404(teacher, group_id: int):
@@ -228,13 +224,15 @@ def get_teacher_group_student_or_404(teacher, course: Course, student_id: int):
 
 
 def resolve_teacher_course_for_student(teacher, student):
-    base_qs = _teacher_courses_queryset(teacher).filter(enrollments__student=student)
-    courses = list(base_qs[:2])
+    access = get_teacher_access(teacher)
+    student_course_ids = access.student_course_ids.get(student.id, set())
+    courses = [course for course in access.courses if course.id in student_course_ids]
     if not courses:
         return None, "none"
     if len(courses) == 1:
         return courses[0], "single"
 
+    base_qs = Course.objects.filter(id__in=[course.id for course in courses]).order_by("name", "id")
     preferred_course = (
         base_qs.filter(student_schedules__teacher=teacher, student_schedules__student=student).first()
         or base_qs.filter(lesson_slots__teacher=teacher, lesson_slots__student=student).first()
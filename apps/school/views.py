@@ -2,13 +2,13 @@ from django.contrib import messages
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponseForbidden
-from django.db.models import Avg, Count, Q
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from urllib.parse import urlencode
 
 from apps.accounts.forms import TeacherStudentCycleForm
 from apps.accounts.models import Profile
-from apps.gradebook.models import Grade
+from apps.gradebook.models import CourseStudentStats, Grade
 from apps.goals.models import Goal
 from apps.homework.models import AssignmentTarget
 from apps.lessons.models import LessonReport, LessonStudent
@@ -253,11 +253,11 @@ def teacher_class_list(request):
         course_map.setdefault(enrollment.student_id, []).append(enrollment.course)
 
     grade_rows = (
-        Grade.objects.filter(student_id__in=student_ids, assessment__course__teacher=request.user, score__isnull=False)
+        CourseStudentStats.objects.filter(student_id__in=student_ids, course__teacher=request.user)
         .values("student_id")
-        .annotate(avg_score=Avg("score"))
+        .annotate(score_sum=Sum("score_sum"), graded_count=Sum("graded_count"))
     )
-    grade_map = {row["student_id"]: row["avg_score"] for row in grade_rows}
+    grade_map = {row["student_id"]: row["score_sum"] / row["graded_count"] for row in grade_rows if row["graded_count"]}
 
     attendance_rows = (
         LessonStudent.objects.filter(student_id__in=student_ids, lesson__course__teacher=request.user)
@@ -389,33 +389,28 @@ def teacher_group_detail(request, group_id: int):
             messages.success(request, "Внутренняя группа сохранена.")
             return redirect(f"/teacher/groups/{group.id}/?scope=internal:{internal_group.id}")
 
-    recent_assignment_rows = []
+    target_filter = Q(targets__student_id__in=student_ids) if student_ids else Q()
+    done_filter = target_filter & Q(targets__status=AssignmentTarget.Status.DONE)
     assignments = list(
-        group.assignments.all()
-        .prefetch_related("targets")
-        .order_by("-due_date", "-id")[:5]
+        group.assignments.annotate(
+            total_targets=Count("targets", filter=target_filter),
+            done_targets=Count("targets", filter=done_filter),
+        ).order_by("-due_date", "-id")[:5]
     )
-    for assignment in assignments:
-        targets_qs = assignment.targets.all()
-        if student_ids:
-            targets_qs = targets_qs.filter(student_id__in=student_ids)
-        total = targets_qs.count()
-        done = targets_qs.filter(status=AssignmentTarget.Status.DONE).count()
-        recent_assignment_rows.append(
-            {
-                "assignment": assignment,
-                "done_targets": done,
-                "total_targets": total,
-            }
-        )
+    recent_assignment_rows = [
+        {
+            "assignment": assignment,
+            "done_targets": assignment.done_targets,
+            "total_targets": assignment.total_targets,
+        }
+        for assignment in assignments
+    ]
     recent_lessons = list(group.lessons.order_by("-date", "-id")[:5])
     recent_materials = [lesson for lesson in recent_lessons if lesson.attachment][:3]
-    grade_rows = (
-        Grade.objects.filter(student_id__in=student_ids, assessment__course=group, score__isnull=False)
-        .values("student_id")
-        .annotate(avg_score=Avg("score"))
-    )
-    grade_map = {row["student_id"]: row["avg_score"] for row in grade_rows}
+    grade_map = {
+        stats.student_id: stats.average_score
+        for stats in CourseStudentStats.objects.filter(student_id__in=student_ids, course=group)
+    }
 
     student_rows = []
     internal_groups = list(group.internal_groups.prefetch_related("students").order_by("name", "id"))
@@ -424,19 +419,23 @@ def teacher_group_detail(request, group_id: int):
         for student in internal_group.students.all():
             internal_group_map.setdefault(student.id, []).append(internal_group)
 
+    target_counts = {
+        row["student_id"]: row
+        for row in AssignmentTarget.objects.filter(student_id__in=student_ids, assignment__course=group)
+        .values("student_id")
+        .annotate(total=Count("id"), done=Count("id", filter=Q(status=AssignmentTarget.Status.DONE)))
+    }
     for enrollment in enrollments:
         if enrollment.student_id not in student_id_set:
             continue
         student = enrollment.student
-        targets_qs = AssignmentTarget.objects.filter(student=student, assignment__course=group)
-        total_targets = targets_qs.count()
-        done_targets = targets_qs.filter(status=AssignmentTarget.Status.DONE).count()
+        counts = target_counts.get(student.id, {})
         student_rows.append(
             {
                 "student": student,
                 "avg_score": grade_map.get(student.id),
-                "done_targets": done_targets,
-                "total_targets": total_targets,
+                "done_targets": counts.get("done", 0),
+                "total_targets": counts.get("total", 0),
                 "school_grade": normalize_school_grade_label(student.profile.school_grade),
                 "internal_groups": internal_group_map.get(student.id, []),
             }
@@ -0,0 +1,60 @@
+# apps/sqlite_tuning.py
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+_PRAGMA_VALUE_RE = re.compile(r"^-?[A-Za-z0-9_]+$")
+
+
+def apply_sqlite_pragmas(connection, pragmas=None) -> None:
+    """
+    Runs settings.SQLITE_PRAGMAS (journal_mode, synchronous, busy_timeout, mmap_size, cache_size)
+    on a freshly opened DB-API connection. journal_mode=WAL lets readers work during a write,
+    busy_timeout makes a blocked writer wait instead of failing with "database is locked".
+    """
+    pragmas = settings.SQLITE_PRAGMAS if pragmas is None else pragmas
+    for name, value in pragmas.items():
+        if value in (None, ""):
+            continue
+        value = str(value)
+        if not _PRAGMA_VALUE_RE.match(name) or not _PRAGMA_VALUE_RE.match(value):
+            raise ValueError(f"Invalid SQLite pragma {name}={value}")
+        connection.execute(f"PRAGMA {name} = {value}")
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """connection_created receiver; a no-op for other backends."""
+    if connection.vendor != "sqlite":
+        return
+    apply_sqlite_pragmas(connection.connection)
+
+
+@contextmanager
+def immediate_atomic(using=None):
+    """
+    transaction.atomic() that takes the SQLite write lock at BEGIN (BEGIN IMMEDIATE).
+    A deferred transaction that reads first and writes later cannot wait for the lock and fails
+    with "database is locked" when another writer got in between; an immediate one waits
+    up to busy_timeout. Nested blocks, other backends and Django < 5.1 use plain atomic().
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    if connection.vendor == "sqlite" and not connection.in_atomic_block:
+        # Connect first: opening the connection (re)sets transaction_mode from OPTIONS.
+        connection.ensure_connection()
+    if connection.vendor != "sqlite" or connection.in_atomic_block or not hasattr(connection, "transaction_mode"):
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    previous_mode = connection.transaction_mode
+    connection.transaction_mode = "IMMEDIATE"
+    try:
+        with transaction.atomic(using=using):
+            # BEGIN IMMEDIATE has been sent by now; savepoints and later transactions keep the configured mode.
+            connection.transaction_mode = previous_mode
+            yield
+    finally:
+        connection.transaction_mode = previous_mode
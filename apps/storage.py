@@ -0,0 +1,104 @@
+# apps/storage.py
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils.deconstruct import deconstructible
+
+
+HASH_ALGORITHM = "sha256"
+# Keeps "<upload_to>/ab/<64 hex chars><ext>" within FileField's default max_length of 100.
+MAX_EXTENSION_LENGTH = 10
+ORIGINAL_NAME_MAX_LENGTH = 255
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names every blob by the hash of its content:
+    "<upload_to>/ab/abcdef….pdf". The upload is hashed while its chunks are streamed
+    to a temporary file next to MEDIA_ROOT, so memory stays flat for large files.
+    Identical uploads resolve to the same name and are stored once; rows share the blob by reference,
+    which is why a blob must not be deleted through a single row.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content hash in _save, an existing file means "already stored".
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        if len(extension) > MAX_EXTENSION_LENGTH:
+            extension = ""
+        os.makedirs(self.location, exist_ok=True)
+
+        digest = hashlib.new(HASH_ALGORITHM)
+        fd, temp_path = tempfile.mkstemp(dir=self.location, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            content_hash = digest.hexdigest()
+            blob_name = os.path.join(directory, content_hash[:2], f"{content_hash}{extension}")
+            blob_path = self.path(blob_name)
+            if os.path.exists(blob_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                # mkstemp creates 0600 files; blobs must stay readable by the web server.
+                os.chmod(temp_path, self.file_permissions_mode if self.file_permissions_mode is not None else 0o644)
+                os.replace(temp_path, blob_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return blob_name.replace("\\", "/")
+
+
+attachment_storage = ContentAddressedStorage()
+
+
+def uploaded_file_name(upload) -> str:
+    """The name the file had on the uploader's disk; "" for files already in storage."""
+    if not upload or getattr(upload, "_committed", False) or isinstance(upload, str):
+        return ""
+    return os.path.basename((upload.name or "").replace("\\", "/"))[:ORIGINAL_NAME_MAX_LENGTH]
+
+
+class AttachmentField(models.FileField):
+    """
+    FileField for ContentAddressedStorage that copies the uploaded file's own name into name_field
+    when a new upload is committed, since the blob name is only a content hash.
+    Declare name_field after this field: fields are prepared for INSERT/UPDATE in declaration order,
+    for save() and bulk_create alike. save(update_fields=...) must list name_field too.
+    """
+
+    def __init__(self, *args, name_field: str = "", **kwargs):
+        self.name_field = name_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.name_field:
+            kwargs["name_field"] = self.name_field
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        original_name = uploaded_file_name(getattr(model_instance, self.attname))
+        if self.name_field and original_name:
+            setattr(model_instance, self.name_field, original_name)
+        return super().pre_save(model_instance, add)
+
+
+def store_field_file(model, field_name: str, upload) -> str:
+    """Saves an upload once through the field's storage and returns the name to share between rows."""
+    field = model._meta.get_field(field_name)
+    name = field.generate_filename(None, upload.name)
+    return field.storage.save(name, upload, max_length=field.max_length)
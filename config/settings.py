@@ -2,6 +2,8 @@
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 try:
@@ -59,23 +61,26 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    "apps.query_metrics.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "apps.school.access.TeacherAccessMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 if HAS_WHITENOISE:
-    MIDDLEWARE.insert(1, "whitenoise.middleware.WhiteNoiseMiddleware")
+    MIDDLEWARE.insert(2, "whitenoise.middleware.WhiteNoiseMiddleware")
 
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates that reports render time to apps.query_metrics.
+        "BACKEND": "apps.query_metrics.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -92,12 +97,58 @@ TEMPLATES = [
 WSGI_APPLICATION = "config.wsgi.application"
 ASGI_APPLICATION = "config.asgi.application"
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": Path(os.getenv("DJANGO_SQLITE_PATH", BASE_DIR / "db.sqlite3")),
+DB_ENGINE = os.getenv("DJANGO_DB_ENGINE", "sqlite").strip().lower()
+
+if DB_ENGINE in ("postgres", "postgresql"):
+    # The psycopg pool and persistent connections exclude each other: with the pool on,
+    # every request borrows a pooled connection and CONN_MAX_AGE stays 0.
+    _postgres_pool = _env_bool("DJANGO_POSTGRES_POOL", False)
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("DJANGO_POSTGRES_DB", "gradebook"),
+            "USER": os.getenv("DJANGO_POSTGRES_USER", "gradebook"),
+            "PASSWORD": os.getenv("DJANGO_POSTGRES_PASSWORD", ""),
+            "HOST": os.getenv("DJANGO_POSTGRES_HOST", "localhost"),
+            "PORT": os.getenv("DJANGO_POSTGRES_PORT", "5432"),
+            "CONN_MAX_AGE": 0 if _postgres_pool else int(os.getenv("DJANGO_DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": (
+                {
+                    "pool": {
+                        "min_size": int(os.getenv("DJANGO_POSTGRES_POOL_MIN_SIZE", "2")),
+                        "max_size": int(os.getenv("DJANGO_POSTGRES_POOL_MAX_SIZE", "10")),
+                        "timeout": float(os.getenv("DJANGO_POSTGRES_POOL_TIMEOUT", "10")),
+                    }
+                }
+                if _postgres_pool
+                else {}
+            ),
+        }
     }
-}
+elif DB_ENGINE == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": Path(os.getenv("DJANGO_SQLITE_PATH", BASE_DIR / "db.sqlite3")),
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown DJANGO_DB_ENGINE: {DB_ENGINE!r} (expected sqlite or postgres)")
+
+# Applied to every new SQLite connection by apps.sqlite_tuning; DJANGO_SQLITE_TUNING=0 keeps SQLite defaults.
+SQLITE_PRAGMAS = (
+    {
+        "journal_mode": os.getenv("DJANGO_SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("DJANGO_SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(os.getenv("DJANGO_SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "mmap_size": int(os.getenv("DJANGO_SQLITE_MMAP_SIZE", str(128 * 1024 * 1024))),
+        # Negative values are KiB: 64 MiB of page cache per connection.
+        "cache_size": int(os.getenv("DJANGO_SQLITE_CACHE_SIZE", "-65536")),
+    }
+    if _env_bool("DJANGO_SQLITE_TUNING", True)
+    else {}
+)
 
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -117,6 +168,14 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 SERVE_MEDIA = _env_bool("DJANGO_SERVE_MEDIA", DEBUG)
+# "x-accel" (nginx) or "x-sendfile" (Apache/lighttpd): Django checks access, the web server sends the bytes.
+MEDIA_OFFLOAD = os.getenv("DJANGO_MEDIA_OFFLOAD", "").strip().lower()
+# nginx "internal" location aliased to MEDIA_ROOT.
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("DJANGO_MEDIA_ACCEL_PREFIX", "/protected-media/")
+# Chunks of unfinished video uploads; keep it on the same volume as MEDIA_ROOT so completion is a rename.
+VIDEO_UPLOAD_STAGING_ROOT = Path(os.getenv("DJANGO_UPLOAD_STAGING_ROOT", BASE_DIR / "upload_staging"))
+# Previewed grade imports wait here until confirmed; on disk so that any worker can apply them.
+GRADE_IMPORT_STAGING_ROOT = VIDEO_UPLOAD_STAGING_ROOT / "grade-imports"
 
 # Use plain static paths for live source-mounted development, fingerprinted assets otherwise.
 live_static = _env_bool("DJANGO_LIVE_STATIC", False)
@@ -137,6 +196,43 @@ if HAS_WHITENOISE:
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# The cache has to be shared by every process that writes, or dashboard invalidation only reaches the worker
+# that made the write and the others serve stale entries for up to DASHBOARD_CACHE_TIMEOUT seconds:
+# DJANGO_REDIS_URL selects Redis, DJANGO_CACHE_DIR a file cache on a directory all processes mount
+# (docker-compose puts it next to the database). Without either, a per-process memory cache (one-process dev).
+redis_url = os.getenv("DJANGO_REDIS_URL", "")
+cache_dir = os.getenv("DJANGO_CACHE_DIR", "")
+if redis_url:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": redis_url}}
+elif cache_dir:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": cache_dir}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+# Short TTL: bounds staleness for changes that bypass signals and for other processes' local caches.
+DASHBOARD_CACHE_TIMEOUT = int(os.getenv("DJANGO_DASHBOARD_CACHE_TIMEOUT", "60"))
+# Admin counters (SchoolStatsSnapshot) are recomputed on read once they are older than this.
+SCHOOL_STATS_MAX_AGE = int(os.getenv("DJANGO_SCHOOL_STATS_MAX_AGE", "300"))
+
+# Per-request query count, SQL/template/total time and repeated queries, logged as JSON lines
+# by apps.query_metrics.QueryMetricsMiddleware, plus per-view latency histograms of the last WINDOW requests.
+QUERY_METRICS_ENABLED = _env_bool("DJANGO_QUERY_METRICS", False)
+QUERY_METRICS_WINDOW = int(os.getenv("DJANGO_QUERY_METRICS_WINDOW", "500"))
+# A request that runs one query signature this many times (an N+1 loop) is logged as a warning.
+QUERY_METRICS_REPEAT_WARNING = int(os.getenv("DJANGO_QUERY_METRICS_REPEAT_WARNING", "10"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "apps.query_metrics": {
+            "handlers": ["console"],
+            "level": os.getenv("DJANGO_QUERY_METRICS_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
+
 LOGIN_URL = "/login"
 LOGIN_REDIRECT_URL = "/dashboard"
 LOGOUT_REDIRECT_URL = "/login"
@@ -157,8 +253,10 @@ if DEBUG:
 CSRF_TRUSTED_ORIGINS = _env_list("DJANGO_CSRF_TRUSTED_ORIGINS", default_csrf_trusted_origins)
 CSRF_COOKIE_SAMESITE = "Lax"
 SESSION_COOKIE_SAMESITE = "Lax"
-CSRF_COOKIE_SECURE = not DEBUG
-SESSION_COOKIE_SECURE = not DEBUG
+# DJANGO_SECURE_COOKIES=0 allows logging in over plain HTTP with DEBUG off (local load tests).
+secure_cookies = _env_bool("DJANGO_SECURE_COOKIES", not DEBUG)
+CSRF_COOKIE_SECURE = secure_cookies
+SESSION_COOKIE_SECURE = secure_cookies
 CSRF_COOKIE_HTTPONLY = False
 CSRF_FAILURE_VIEW = "config.views.csrf_failure"
 
@@ -3,22 +3,16 @@ from urllib.parse import urlsplit
 
 from django.conf import settings
 from django.contrib import admin
-from django.http import Http404
 from django.urls import path, include, re_path
 from django.shortcuts import redirect
-from django.views.static import serve as serve_static_file
+
+from apps.media_serving import serve_media
 
 
 def root_redirect(_request):
     return redirect("/dashboard")
 
 
-def serve_media(request, path):
-    if not settings.DEBUG and not settings.SERVE_MEDIA:
-        raise Http404()
-    return serve_static_file(request, path, document_root=settings.MEDIA_ROOT, show_indexes=False)
-
-
 urlpatterns = [
     path("", root_redirect),
     path("admin/", admin.site.urls),
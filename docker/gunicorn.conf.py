@@ -0,0 +1,57 @@
+# docker/gunicorn.conf.py
+# Production server settings for docker/start-web.sh (DJANGO_SERVER=gunicorn); every value can be
+# overridden from the environment without rebuilding the image.
+import multiprocessing
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    return int(raw) if raw else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "on"}
+
+
+wsgi_app = "config.wsgi:application"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Processes x threads: threads keep a worker responsive while another request streams a video,
+# while a few processes are enough for SQLite, which serializes writes anyway.
+workers = _env_int("GUNICORN_WORKERS", min(multiprocessing.cpu_count() * 2 + 1, 4))
+threads = _env_int("GUNICORN_THREADS", 4)
+worker_class = "gthread" if threads > 1 else "sync"
+
+# A worker that does not answer the arbiter for `timeout` seconds is killed and replaced;
+# on SIGHUP / SIGTERM running requests get `graceful_timeout` seconds to finish.
+timeout = _env_int("GUNICORN_TIMEOUT", 60)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+# Recycle workers now and then so a slow leak never takes the site down.
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+
+# Import Django once in the arbiter and fork the workers from it (faster start, shared memory).
+# Database connections are only opened inside requests, so nothing is shared across the fork.
+preload_app = _env_bool("GUNICORN_PRELOAD", True)
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+# Behind a reverse proxy (nginx for MEDIA_OFFLOAD) the client address comes from X-Forwarded-For.
+forwarded_allow_ips = os.getenv("GUNICORN_FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+def when_ready(server):
+    # Dashboard cache invalidation only reaches the worker that handled the write without a shared cache.
+    if workers > 1 and not (os.getenv("DJANGO_REDIS_URL") or os.getenv("DJANGO_CACHE_DIR")):
+        server.log.warning(
+            "%s workers share no cache: dashboards may be up to DJANGO_DASHBOARD_CACHE_TIMEOUT seconds stale "
+            "after a write. Set DJANGO_CACHE_DIR, DJANGO_REDIS_URL or GUNICORN_WORKERS=1.",
+            workers,
+        )
@@ -1,6 +1,16 @@
 #!/bin/sh
 set -eu
 
+# The database used to be a single file in the project root. Starting without it would let migrate
+# create an empty database at DJANGO_SQLITE_PATH, so refuse until the file is moved. An empty file
+# counts as missing: a worker that connected first may have created it.
+legacy_db="${DJANGO_LEGACY_SQLITE_PATH:-}"
+if [ -n "$legacy_db" ] && [ -f "$legacy_db" ] && [ -n "${DJANGO_SQLITE_PATH:-}" ] && [ ! -s "$DJANGO_SQLITE_PATH" ]; then
+  echo "Found the old database $legacy_db but $DJANGO_SQLITE_PATH is missing or empty." >&2
+  echo "Stop the containers and move it first: mkdir -p data && mv db.sqlite3 data/" >&2
+  exit 1
+fi
+
 if [ "${DJANGO_COLLECTSTATIC:-1}" = "1" ]; then
   python manage.py collectstatic --noinput
 fi
@@ -9,10 +19,19 @@ if [ "${DJANGO_MIGRATE:-1}" = "1" ]; then
   python manage.py migrate --noinput
 fi
 
+if [ "${DJANGO_REBUILD_LIBRARY_INDEX:-1}" = "1" ]; then
+  python manage.py rebuild_library_index
+fi
+
 if [ "${DJANGO_SEED_DEMO:-0}" = "1" ]; then
   python manage.py seed_demo
 fi
 
+if [ "${DJANGO_SERVER:-runserver}" = "gunicorn" ]; then
+  # exec keeps gunicorn as PID 1: SIGHUP reloads the workers gracefully, SIGTERM drains them.
+  exec gunicorn --config docker/gunicorn.conf.py
+fi
+
 set -- python manage.py runserver 0.0.0.0:8000
 
 if [ "${DJANGO_LIVE_STATIC:-0}" = "1" ]; then
@@ -15,7 +15,7 @@ class LoginUser(HttpUser):
 
     def login(self):
         # Step 1: load login page
-        response = self.client.get("/login/")
+        response = self.client.get("/login")
 
         csrf_token = self.get_csrf_token(response)
 
@@ -27,12 +27,12 @@ class LoginUser(HttpUser):
         }
 
         headers = {
-            "Referer": f"{self.host}/login/"
+            "Referer": f"{self.host}/login"
         }
 
-        self.client.post("/login/", data=login_data, headers=headers)
+        self.client.post("/login", data=login_data, headers=headers)
 
     @task
     def visit_dashboard(self):
         # simulate activity after login
-        self.client.get("/dashboard/")
\ No newline at end of file
+        self.client.get("/dashboard")
\ No newline at end of file